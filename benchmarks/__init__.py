@@ -0,0 +1,3 @@
+"""
+Offline benchmarks for the client-side hot paths. Run `python -m benchmarks --help`.
+"""
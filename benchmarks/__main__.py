@@ -0,0 +1,261 @@
+"""
+Run the offline benchmarks and print a table of results:
+
+    python -m benchmarks [--quick] [--json results.json]
+
+Nothing here touches the real API. Decode and date-conversion costs are measured on
+in-memory payloads; pagination runs against a local stub server (see stub_server.py) with the
+client's rate limiter opened up, so the numbers are the client's own overhead.
+"""
+import argparse
+import copy
+import datetime as dt
+import gc
+import json
+import math
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import mediacloud.api
+from benchmarks import payloads
+from benchmarks.stub_server import StubServer
+from mediacloud import dates
+from mediacloud.batch import StoryBatch
+from mediacloud.jsondecode import BACKENDS, get_decoder
+from mediacloud.metrics import Metrics
+from mediacloud.ratelimit import RateLimiter
+
+PAGE_SIZE = 1000
+START, END = dt.date(2023, 1, 1), dt.date(2023, 12, 31)
+
+
+def _timed(fn: Callable[..., Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """
+    Best and median wall time of `repeat` calls; `setup` runs untimed before each call and its
+    result is passed in
+    """
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        gc.collect()
+        start = time.perf_counter()
+        fn(arg) if setup is not None else fn()
+        times.append(time.perf_counter() - start)
+    return dict(best_secs=min(times), median_secs=statistics.median(times))
+
+
+def _response(body: bytes) -> SimpleNamespace:
+    # the two attributes BaseApi._parse_response reads
+    return SimpleNamespace(status_code=200, content=body)
+
+
+def bench_startup(repeat: int) -> List[Dict[str, Any]]:
+    """
+    Wall time of fresh interpreters importing the package (and building a client), less that
+    of one doing nothing
+    """
+    def run(code: str) -> float:
+        best = math.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.DEVNULL)
+            best = min(best, time.perf_counter() - start)
+        return best
+    baseline = run("pass")
+    snippets = {
+        'import mediacloud': "import mediacloud",
+        'import mediacloud.api': "import mediacloud.api",
+        'import mediacloud.api, build SearchApi': "import mediacloud.api; mediacloud.api.SearchApi('t')",
+        'python -m mediacloud --help': "import sys; sys.argv = ['mediacloud', '--help']\n"
+                                       "import runpy\n"
+                                       "try: runpy.run_module('mediacloud', run_name='__main__')\n"
+                                       "except SystemExit: pass",
+    }
+    return [dict(name=f"startup: {name}", best_secs=max(0.0, run(code) - baseline)) for name, code in snippets.items()]
+
+
+def bench_decode(repeat: int) -> List[Dict[str, Any]]:
+    bodies = {
+        'story-list page (1000 stories)': payloads.story_page(PAGE_SIZE),
+        'story-list page, expanded (1000 stories)': payloads.story_page(PAGE_SIZE, expanded=True),
+        'count-over-time (3 years)': payloads.count_over_time(),
+        'sources page (1000 sources)': payloads.source_page(PAGE_SIZE, PAGE_SIZE, 0),
+    }
+    results = []
+    for backend in BACKENDS:
+        try:
+            loads = get_decoder(backend)
+        except ImportError:
+            continue
+        for name, body in bodies.items():
+            r = _response(body)
+            timing = _timed(lambda: mediacloud.api.BaseApi._parse_response(r, None, loads), repeat)
+            results.append(dict(name=f"_parse_response [{backend}]: {name}", bytes=len(body),
+                                mb_per_sec=len(body) / timing['best_secs'] / 1e6, **timing))
+    return results
+
+
+def bench_dates(search: mediacloud.api.SearchApi, repeat: int) -> List[Dict[str, Any]]:
+    stories = payloads.stories(10 * PAGE_SIZE)
+
+    def cold_copy() -> List[Dict[str, Any]]:
+        # start each repeat with empty date caches, so every one pays for parsing
+        dates.parse_date.cache_clear()
+        dates.date_epoch.cache_clear()
+        return copy.deepcopy(stories)
+    timing = _timed(search._dates_str2objects, repeat, setup=cold_copy)
+    return [dict(name="_dates_str2objects (10k stories)", stories_per_sec=len(stories) / timing['best_secs'],
+                 **timing)]
+
+
+def _drain(iterator) -> int:
+    count = 0
+    for item in iterator:
+        count += len(item) if isinstance(item, StoryBatch) else 1
+    return count
+
+
+class _Uncompressed(mediacloud.api.SearchApi):
+    ACCEPT_ENCODING = 'identity'
+
+
+def bench_paging(search: mediacloud.api.SearchApi, directory: mediacloud.api.DirectoryApi, n_pages: int,
+                 n_sources: int, repeat: int) -> List[Dict[str, Any]]:
+    uncompressed = _Uncompressed("benchmark-token", rate_limiter=search._rate_limiter, instruments=search._instruments)
+    uncompressed.BASE_API_URL = search.BASE_API_URL
+    runs = {
+        'iter_stories': lambda: search.iter_stories("q", START, END, [1], page_size=PAGE_SIZE),
+        'iter_stories, expanded': lambda: search.iter_stories("q", START, END, [1], page_size=PAGE_SIZE, expanded=True),
+        'iter_stories, expanded, uncompressed': lambda: uncompressed.iter_stories(
+            "q", START, END, [1], page_size=PAGE_SIZE, expanded=True),
+        'iter_stories, prefetch=4': lambda: search.iter_stories("q", START, END, [1], page_size=PAGE_SIZE, prefetch=4),
+        'iter_stories, stream=True': lambda: search.iter_stories("q", START, END, [1], page_size=PAGE_SIZE, stream=True),
+        'iter_story_batches': lambda: search.iter_story_batches("q", START, END, [1], page_size=PAGE_SIZE),
+        'iter_sources': lambda: directory.iter_sources(page_size=PAGE_SIZE),
+    }
+    results = []
+    for name, make in runs.items():
+        counts = []
+        timing = _timed(lambda: counts.append(_drain(make())), repeat)
+        items = counts[-1]
+        expected = n_sources if name == 'iter_sources' else n_pages * PAGE_SIZE
+        if items != expected:
+            raise RuntimeError(f"{name} returned {items} items, expected {expected}")
+        results.append(dict(name=f"{name} ({items:,} items)", items_per_sec=items / timing['best_secs'], **timing))
+    return results
+
+
+def _peak_bytes(fn: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = fn()  # noqa: F841 - held until the peak has been read
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(search: mediacloud.api.SearchApi) -> List[Dict[str, Any]]:
+    pages = [payloads.story_page(PAGE_SIZE)] * 10
+    expanded_pages = [payloads.story_page(PAGE_SIZE, expanded=True)] * 10
+
+    def as_dicts(bodies: List[bytes], intern: bool = False) -> Callable[[], Any]:
+        def run():
+            search.INTERN_STRINGS = intern
+            search._batch_strings = None
+            stories: list = []
+            for body in bodies:
+                page = json.loads(body)['stories']
+                search._prepare_stories(page)
+                stories.extend(page)
+            del search.INTERN_STRINGS
+            return stories
+        return run
+
+    def as_batch(bodies: List[bytes]) -> Callable[[], Any]:
+        def run():
+            batch = StoryBatch()
+            for body in bodies:
+                batch.extend(json.loads(body)['stories'])
+            return batch
+        return run
+
+    runs = {
+        'list of dicts': as_dicts(pages),
+        'list of dicts, interned strings': as_dicts(pages, intern=True),
+        'StoryBatch': as_batch(pages),
+        'list of dicts, expanded': as_dicts(expanded_pages),
+        'StoryBatch, expanded': as_batch(expanded_pages),
+    }
+    return [dict(name=f"peak memory per 10k stories: {name}", peak_mb=_peak_bytes(run) / 1e6)
+            for name, run in runs.items()]
+
+
+def transfer_rows(metrics: Metrics) -> List[Dict[str, Any]]:
+    return [dict(name=f"bytes on the wire: {endpoint}", **totals) for endpoint, totals in sorted(metrics.transfer().items())]
+
+
+def _row(result: Dict[str, Any]) -> str:
+    parts = []
+    if 'best_secs' in result:
+        parts.append(f"best {result['best_secs'] * 1e3:9.2f} ms")
+    if 'median_secs' in result:
+        parts.append(f"median {result['median_secs'] * 1e3:9.2f} ms")
+    if 'mb_per_sec' in result:
+        parts.append(f"{result['mb_per_sec']:8.1f} MB/s ({result['bytes'] / 1e6:.2f} MB)")
+    for key, label in (('stories_per_sec', 'stories/s'), ('items_per_sec', 'items/s')):
+        if key in result:
+            parts.append(f"{result[key]:12,.0f} {label}")
+    if 'wire_bytes' in result:
+        parts.append(f"{result['wire_bytes'] / 1e6:9.1f} MB of {result['decoded_bytes'] / 1e6:9.1f} MB "
+                     f"({result['ratio']:.0%})")
+    if 'peak_mb' in result:
+        parts.append(f"{result['peak_mb']:9.1f} MB")
+    return f"{result['name']:<68} " + "  ".join(parts)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="fewer pages and repeats, for CI smoke runs")
+    parser.add_argument('--json', default=None, help="also write the results to this file")
+    args = parser.parse_args(argv)
+    repeat = 3 if args.quick else 7
+    n_pages = 3 if args.quick else 10
+    n_sources = 3000 if args.quick else 10000
+
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    with StubServer(page_size=PAGE_SIZE, n_pages=n_pages, n_sources=n_sources) as server:
+        # opened-up limiter: pace nothing, but keep the plain requests.Session the limiter path uses
+        limiter = RateLimiter(per_minute=1e9)
+        metrics = Metrics()
+        search = mediacloud.api.SearchApi("benchmark-token", rate_limiter=limiter, instruments=[metrics])
+        directory = mediacloud.api.DirectoryApi("benchmark-token", rate_limiter=limiter, instruments=[metrics])
+        search.BASE_API_URL = directory.BASE_API_URL = server.base_url
+
+        results['startup'] = bench_startup(repeat)
+        results['decode'] = bench_decode(repeat)
+        results['dates'] = bench_dates(search, repeat)
+        results['paging'] = bench_paging(search, directory, n_pages, n_sources, repeat)
+        results['memory'] = bench_memory(search)
+        results['transfer'] = transfer_rows(metrics)
+
+    for group, rows in results.items():
+        print(f"\n== {group} ==")
+        for row in rows:
+            print(_row(row))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict(python=sys.version.split()[0], platform=platform.platform(), mediacloud=mediacloud.api.VERSION,
+                           quick=args.quick, results=results), f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
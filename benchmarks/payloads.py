@@ -0,0 +1,97 @@
+"""
+Synthetic, realistically sized API responses.
+
+Field names, formats and sizes follow what the production search and directory endpoints
+return (64-hex story ids, ~80 character titles, ~100 character URLs, a few KB of text on
+expanded pages), with a few hundred distinct sources per page. Everything is seeded, so runs
+are comparable.
+"""
+import datetime as dt
+import hashlib
+import json
+import random
+from typing import Any, Dict, List, Tuple
+
+WORDS = ("the of and to in a is that for it as was with be by on not he this are or his from at which but have an they "
+         "you were her she there been one all we their has would when if so no will can more other who what about "
+         "government election climate market police report health school court energy minister city people").split()
+
+N_SOURCES = 500
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words)).capitalize()
+
+
+def stories(n: int, expanded: bool = False, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    start = dt.datetime(2023, 1, 1)
+    out = []
+    for i in range(n):
+        source = rng.randrange(N_SOURCES)
+        domain = f"news-source-{source}.com"
+        published = start + dt.timedelta(days=rng.randrange(365), seconds=rng.randrange(86400))
+        story = {
+            'id': hashlib.sha256(f"{seed}-{i}".encode()).hexdigest(),
+            'media_name': domain,
+            'media_url': domain,
+            'title': _sentence(rng, rng.randint(8, 16)),
+            'publish_date': published.strftime("%Y-%m-%d %H:%M:%S"),
+            'indexed_date': (published + dt.timedelta(hours=rng.randint(1, 48))).isoformat(timespec='microseconds'),
+            'url': f"https://www.{domain}/{published:%Y/%m/%d}/" + "-".join(rng.choice(WORDS) for _ in range(10)),
+            'language': rng.choice(('en', 'en', 'en', 'es', 'fr', 'de')),
+        }
+        if expanded:
+            story['text'] = " ".join(_sentence(rng, 20) + "." for _ in range(rng.randint(20, 40)))
+        out.append(story)
+    return out
+
+
+def story_page_parts(page_size: int, expanded: bool = False) -> Tuple[bytes, bytes]:
+    """
+    A story-list page body split around the pagination token, so a server can splice in a
+    different token per page without re-encoding the stories
+    """
+    body = json.dumps({'stories': stories(page_size, expanded), 'pagination_token': "TOKEN"}).encode('utf-8')
+    head, tail = body.split(b'"TOKEN"')
+    return head, tail
+
+
+def story_page(page_size: int, expanded: bool = False, token: str = "next") -> bytes:
+    head, tail = story_page_parts(page_size, expanded)
+    return head + json.dumps(token).encode('utf-8') + tail
+
+
+def count_over_time(days: int = 3 * 365) -> bytes:
+    rng = random.Random(1)
+    start = dt.date(2021, 1, 1)
+    counts = []
+    for d in range(days):
+        total = rng.randint(50000, 120000)
+        count = rng.randint(0, 2000)
+        counts.append({'date': f"{start + dt.timedelta(days=d)} 00:00:00", 'count': count, 'total_count': total,
+                       'ratio': count / total})
+    return json.dumps({'count_over_time': {'counts': counts}}).encode('utf-8')
+
+
+def sources(n: int, offset: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(2)
+    out = []
+    for i in range(offset, offset + n):
+        domain = f"news-source-{i}.com"
+        out.append({
+            'id': i + 1, 'name': domain, 'label': domain.split('.')[0].replace('-', ' ').title(),
+            'homepage': f"https://www.{domain}/", 'platform': 'online_news', 'url_search_string': None,
+            'notes': None, 'media_type': rng.choice(('digital_native', 'print_native', 'audio_broadcast')),
+            'pub_country': rng.choice(('USA', 'GBR', 'IND', None)), 'pub_state': None,
+            'primary_language': 'en', 'collection_count': rng.randint(0, 30), 'stories_per_week': rng.randint(0, 900),
+            'first_story': None, 'modified_at': "2024-01-01T00:00:00Z", 'created_at': "2020-01-01T00:00:00Z",
+        })
+    return out
+
+
+def source_page(total: int, limit: int, offset: int) -> bytes:
+    results = sources(max(0, min(limit, total - offset)), offset)
+    return json.dumps({'count': total, 'previous': None,
+                       'next': f"/api/sources/sources/?offset={offset + limit}" if offset + limit < total else None,
+                       'results': results}).encode('utf-8')
@@ -0,0 +1,100 @@
+"""
+Local HTTP server that answers the handful of endpoints the benchmarks call with pre-encoded
+synthetic payloads, so timings measure the client, not payload generation.
+
+It runs in its own process so the server's work doesn't compete with the client for the GIL.
+Responses are gzipped for clients that accept that, so compression costs and savings show up
+in the client's timings.
+"""
+import gzip
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Hashable, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks import payloads
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    # headers and body go out in separate writes; without TCP_NODELAY a small body waits out
+    # the client's delayed ACK
+    disable_nagle_algorithm = True
+    pages: Dict[bool, Tuple[bytes, bytes]] = {}
+    counts: bytes = b''
+    source_pages: Dict[Tuple[int, int], bytes] = {}
+    n_pages = 1
+    n_sources = 0
+
+    def log_message(self, *args):
+        pass
+
+    gzipped: Dict[Hashable, bytes] = {}
+
+    def _send(self, body: bytes, status: int = 200, key: Optional[Hashable] = None) -> None:
+        """
+        Send a JSON body, gzipped if the client accepts that; `key` identifies the body so its
+        compressed form is only computed once
+        """
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if key is not None and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            if key not in self.gzipped:
+                self.gzipped[key] = gzip.compress(body, compresslevel=6)
+            body = self.gzipped[key]
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path.endswith('/search/story-list'):
+            page = int(query.get('pagination_token', 0))
+            expanded = query.get('expanded') == '1'
+            head, tail = self.pages[expanded]
+            token = b'"%d"' % (page + 1) if page + 1 < self.n_pages else b'null'
+            self._send(head + token + tail, key=('story-list', expanded, page))
+        elif url.path.endswith('/search/count-over-time'):
+            self._send(self.counts, key='count-over-time')
+        elif url.path.endswith('/sources/sources/'):
+            limit, offset = int(query.get('limit') or 100), int(query.get('offset') or 0)
+            body = self.source_pages.get((limit, offset))
+            if body is None:
+                body = self.source_pages[(limit, offset)] = payloads.source_page(self.n_sources, limit, offset)
+            self._send(body, key=('sources', limit, offset))
+        else:
+            self._send(b'{"note": "not found"}', 404)
+
+
+def _serve(port_queue, page_size: int, n_pages: int, n_sources: int) -> None:
+    _Handler.pages = {False: payloads.story_page_parts(page_size), True: payloads.story_page_parts(page_size, True)}
+    _Handler.counts = payloads.count_over_time()
+    _Handler.n_pages = n_pages
+    _Handler.n_sources = n_sources
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class StubServer:
+    """
+    Context manager running the stub server in a child process; `base_url` is the API root
+    to give a client
+    """
+
+    def __init__(self, page_size: int = 1000, n_pages: int = 10, n_sources: int = 5000):
+        self._args = (page_size, n_pages, n_sources)
+        self.base_url = ''
+
+    def __enter__(self) -> "StubServer":
+        ports: multiprocessing.Queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve, args=(ports,) + self._args, daemon=True)
+        self._process.start()
+        self.base_url = f"http://127.0.0.1:{ports.get(timeout=60)}/api/"
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._process.terminate()
+        self._process.join()
@@ -0,0 +1,5 @@
+import sys
+
+from mediacloud.cli import main
+
+sys.exit(main())
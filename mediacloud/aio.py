@@ -0,0 +1,469 @@
+"""
+asyncio versions of the API clients.
+
+Each class mirrors its blocking counterpart in mediacloud.api / mediacloud.mgmt method for
+method, but every call is a coroutine. One client object holds a pooled httpx.AsyncClient
+and a shared RateLimiter, so a single event loop can keep many queries in flight:
+
+    async with AsyncSearchApi(MY_TOKEN) as search:
+        counts = await asyncio.gather(*[search.story_count(q, start, end, collection_ids=[cid])
+                                        for q in queries])
+
+Requires the optional httpx dependency (`pip install mediacloud[async]`).
+"""
+import asyncio
+import datetime as dt
+import logging
+import time
+from typing import (TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable,
+                    Dict, Iterable, List, Optional, Tuple, Union, cast)
+
+try:
+    import httpx
+except ImportError as e:  # pragma: no cover - depends on environment
+    raise ImportError("mediacloud.aio requires httpx; install with `pip install mediacloud[async]`") from e
+
+import mediacloud.error
+from mediacloud.api import (BaseApi, DirectoryApi, QuerySpecLike,
+                            _dedupe_specs, _MetricsMixin, _SearchMixin)
+from mediacloud.cache import ResponseCache
+from mediacloud.dates import parse_date
+from mediacloud.jsondecode import Decoder, get_decoder
+from mediacloud.metrics import Instrument
+from mediacloud.mgmt import _ManagementMixin
+from mediacloud.paging import iter_offset_pages_async, prefetch_pages_async
+from mediacloud.ratelimit import RateLimiter, retry_after_secs
+from mediacloud.retry import RetryPolicy
+from mediacloud.types import (BatchResult, Collection, CountOverTimePoint,
+                              JSONObj, LanguageCount, OffsetPage,
+                              PaginationToken, QuerySpec, RequestMetrics,
+                              Source, SourceCount, SourceIntervalAttention,
+                              SourceWeekAttention, Story, StoryCount,
+                              VersionInfo)
+
+if TYPE_CHECKING:
+    from mediacloud.transport import Transport
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBaseApi(_MetricsMixin):
+
+    TIMEOUT_SECS = BaseApi.TIMEOUT_SECS
+
+    RATE_LIMIT_PER_MINUTE = BaseApi.RATE_LIMIT_PER_MINUTE
+
+    # Size of the connection pool shared by all requests made through one client object
+    MAX_CONNECTIONS = 100
+    MAX_KEEPALIVE_CONNECTIONS = 20
+
+    BASE_API_URL = BaseApi.BASE_API_URL
+
+    USER_AGENT_STRING = BaseApi.USER_AGENT_STRING
+
+    # None offers every encoding httpx can decode; see BaseApi.ACCEPT_ENCODING
+    ACCEPT_ENCODING = BaseApi.ACCEPT_ENCODING
+
+    def __init__(self, auth_token: Optional[str] = None, cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None, retry_policy: Optional[RetryPolicy] = None,
+                 instruments: Optional[Iterable[Instrument]] = None, json_decoder: Optional[Decoder] = None,
+                 transport: Optional["Transport"] = None):
+        if not auth_token:
+            raise mediacloud.error.MCException("No api key set - nothing will work without this")
+        self._auth_token = auth_token
+        self._cache = cache
+        # a Transport's per-key limiter is shared with the blocking clients built from it; the
+        # httpx pool below stays this object's own
+        if rate_limiter is None and transport is not None:
+            rate_limiter = transport.limiter(auth_token)
+        self._limiter = rate_limiter or RateLimiter(per_minute=self.RATE_LIMIT_PER_MINUTE)
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._instruments = list(instruments or [])
+        self._json_decoder = json_decoder
+        self._client = httpx.AsyncClient(
+            headers={'Authorization': f'Token {self._auth_token}',
+                     'Accept': 'application/json',
+                     'User-Agent': self.USER_AGENT_STRING},
+            limits=httpx.Limits(max_connections=self.MAX_CONNECTIONS,
+                                max_keepalive_connections=self.MAX_KEEPALIVE_CONNECTIONS),
+            timeout=self.TIMEOUT_SECS,
+        )
+        if self.ACCEPT_ENCODING is not None:
+            self._client.headers['Accept-Encoding'] = self.ACCEPT_ENCODING
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled connections; the object can't be used after this
+        """
+        await self._client.aclose()
+
+    async def user_profile(self) -> JSONObj:
+        return await self._query('auth/profile')
+
+    async def version(self) -> VersionInfo:
+        return cast(VersionInfo, await self._query('version'))
+
+    async def _query(self, endpoint: str, params: Optional[Dict] = None, method: str = 'GET') -> JSONObj:
+        """
+        Async twin of BaseApi._query: same request shapes, same error handling
+        """
+        metrics, started = self._start_metrics(method, endpoint)
+        try:
+            cache = self._cache
+            if cache is not None and not (method == 'GET' and cache.cacheable(endpoint)):
+                cache = None
+            if cache is not None:
+                cached = cache.get(endpoint, params)
+                if cached is not None:
+                    if metrics is not None:
+                        metrics['cached'] = True
+                    return cached
+            endpoint_url = self.BASE_API_URL + endpoint
+            if method in ('GET', 'DELETE'):
+                if params:
+                    # requests silently drops None values, httpx would send them as empty strings
+                    params = {k: v for k, v in params.items() if v is not None}
+                request_kwargs: Dict[str, Any] = dict(params=params)
+            elif method in ('POST', 'PATCH'):
+                request_kwargs = dict(json=params)
+            else:
+                raise RuntimeError(f"Unsupported method of '{method}'")
+            r = await self._send(method, endpoint_url, request_kwargs, metrics)
+            decode_started = time.perf_counter()
+            try:
+                results = BaseApi._parse_response(r, params, self._json_decoder or get_decoder())
+            finally:
+                if metrics is not None:
+                    metrics['decode_secs'] = time.perf_counter() - decode_started
+            if cache is not None:
+                cache.set(endpoint, params, results)
+            return results
+        except Exception as e:
+            if metrics is not None:
+                metrics['error'] = type(e).__name__
+            raise
+        finally:
+            self._finish_metrics(metrics, started)
+
+    async def _send(self, method: str, endpoint_url: str, request_kwargs: Dict[str, Any],
+                    metrics: Optional[RequestMetrics] = None) -> httpx.Response:
+        """
+        Async twin of BaseApi._send. httpx reads the body before returning, so its time is
+        counted in server_secs and download_secs is left as None.
+        """
+        policy = self._retry_policy
+        policy.budget.deposit()
+        attempt = 0
+        while True:
+            waiting = time.perf_counter()
+            await self._limiter.acquire_async()
+            if metrics is not None:
+                metrics['attempts'] += 1
+                metrics['limiter_wait_secs'] += time.perf_counter() - waiting
+            sending = time.perf_counter()
+            try:
+                r = await self._client.request(method, endpoint_url, **request_kwargs)
+            except Exception as e:
+                if not policy.should_retry_exception(method, e, attempt, (httpx.TransportError,)):
+                    raise
+                delay = policy.backoff(attempt)
+                logger.warning(f"{method} {endpoint_url} failed ({e!r}), retry {attempt + 1} in {delay:.1f}s")
+            else:
+                if metrics is not None:
+                    metrics.update({'status': r.status_code, 'response_bytes': len(r.content),
+                                    'server_secs': time.perf_counter() - sending, 'download_secs': None,
+                                    'wire_bytes': r.num_bytes_downloaded,
+                                    'content_encoding': r.headers.get('Content-Encoding', 'identity')})
+                self._limiter.update(r.status_code, r.headers)
+                if not policy.should_retry_status(method, r.status_code, attempt):
+                    return r
+                delay = policy.backoff(attempt, retry_after_secs(r.headers))
+                logger.warning(f"{method} {endpoint_url} returned {r.status_code}, "
+                               f"retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            if metrics is not None:
+                metrics['retry_wait_secs'] += delay
+            attempt += 1
+
+
+class AsyncDirectoryApi(AsyncBaseApi):
+
+    PLATFORM_ONLINE_NEWS = DirectoryApi.PLATFORM_ONLINE_NEWS
+    PLATFORM_YOUTUBE = DirectoryApi.PLATFORM_YOUTUBE
+    PLATFORM_TWITTER = DirectoryApi.PLATFORM_TWITTER
+    PLATFORM_REDDIT = DirectoryApi.PLATFORM_REDDIT
+
+    async def collection(self, collection_id: int) -> Collection:
+        return cast(Collection, await self._query(f'sources/collections/{collection_id}/', None))
+
+    async def collection_list(self, platform: Optional[str] = None, name: Optional[str] = None,
+                              limit: Optional[int] = 0, offset: Optional[int] = 0,
+                              source_id: Optional[int] = None) -> OffsetPage:
+        params: Dict[Any, Any] = dict(limit=limit, offset=offset)
+        if name:
+            params['name'] = name
+        if platform:
+            params['platform'] = platform
+        if source_id:
+            params['source_id'] = source_id
+        return cast(OffsetPage, await self._query('sources/collections/', params))
+
+    async def source(self, source_id: int) -> Source:
+        return cast(Source, await self._query(f'sources/sources/{source_id}/', None))
+
+    async def source_list(self, platform: Optional[str] = None, name: Optional[str] = None,
+                          collection_id: Optional[int] = None,
+                          limit: Optional[int] = 0, offset: Optional[int] = 0) -> OffsetPage:
+        params: Dict[Any, Any] = dict(limit=limit, offset=offset)
+        if collection_id:
+            params['collection_id'] = collection_id
+        if name:
+            params['name'] = name
+        if platform:
+            params['platform'] = platform
+        return cast(OffsetPage, await self._query('sources/sources/', params))
+
+    async def feed_list(self, source_id: Optional[int] = None,
+                        modified_since: Optional[Union[dt.datetime, int, float]] = None,
+                        modified_before: Optional[Union[dt.datetime, int, float]] = None,
+                        limit: Optional[int] = 0, offset: Optional[int] = 0,
+                        return_details: bool = False) -> JSONObj:
+        params: Dict[Any, Any] = dict(limit=limit, offset=offset)
+        if source_id:
+            params['source_id'] = source_id
+        for t, param in ((modified_since, 'modified_since'), (modified_before, 'modified_before')):
+            if t is None:
+                continue
+            if isinstance(t, dt.datetime):
+                params[param] = t.timestamp()
+            elif isinstance(t, (int, float)):
+                params[param] = t
+            else:
+                raise ValueError(param)
+        if return_details:
+            return {'results': (await self._query('sources/feeds/details/', params))['feeds']}
+        return await self._query('sources/feeds/', params)
+
+
+class AsyncSearchApi(_SearchMixin, AsyncBaseApi):
+
+    async def story_count(self, query: str, start_date: dt.date, end_date: dt.date,
+                          collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                          platform: Optional[str] = None) -> StoryCount:
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        results = await self._query('search/total-count', params)
+        return results['count']
+
+    async def story_count_over_time(self, query: str, start_date: dt.date, end_date: dt.date,
+                                    collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                                    platform: Optional[str] = None) -> List[CountOverTimePoint]:
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        results = await self._query('search/count-over-time', params)
+        for d in results['count_over_time']['counts']:
+            d['date'] = parse_date(d['date'])
+        return results['count_over_time']['counts']
+
+    async def story_count_many(self, specs: Iterable[QuerySpecLike],
+                               max_workers: Optional[int] = None) -> List[BatchResult]:
+        return await self._run_many(self.story_count, specs, max_workers)
+
+    async def story_count_over_time_many(self, specs: Iterable[QuerySpecLike],
+                                         max_workers: Optional[int] = None) -> List[BatchResult]:
+        return await self._run_many(self.story_count_over_time, specs, max_workers)
+
+    async def _run_many(self, method: Callable[..., Awaitable[Any]], specs: Iterable[QuerySpecLike],
+                        max_workers: Optional[int]) -> List[BatchResult]:
+        # same contract as SearchApi._run_many, with at most max_workers calls awaiting at once
+        normalized, keys, unique = _dedupe_specs(specs)
+        slots = asyncio.Semaphore(max_workers or self.BATCH_MAX_WORKERS)
+
+        async def run(spec: QuerySpec) -> Tuple[Any, Optional[Exception]]:
+            async with slots:
+                try:
+                    return await method(**spec), None
+                except Exception as e:
+                    return None, e
+        outcomes = dict(zip(unique, await asyncio.gather(*[run(spec) for spec in unique.values()])))
+        return [BatchResult(spec=spec, result=outcomes[key][0], error=outcomes[key][1])
+                for spec, key in zip(normalized, keys)]
+
+    async def stories_by_source_week(self, query: str, start_date: dt.date, end_date: dt.date,
+                                     collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                                     platform: Optional[str] = None) -> List[SourceWeekAttention]:
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        results = await self._query('search/count-by-source-week', params)
+        return results['source-week-attention']
+
+    async def stories_by_source_over_interval(self, query: str, start_date: dt.date, end_date: dt.date,
+                                              collection_ids: Optional[List[int]] = [],
+                                              source_ids: Optional[List[int]] = [],
+                                              platform: Optional[str] = None,
+                                              interval: Optional[str] = None) -> List[SourceIntervalAttention]:
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        if interval:
+            params['interval'] = interval
+        results = await self._query('search/count-by-source-over-interval', params)
+        return results['source-interval-attention']
+
+    async def story_list(self, query: str, start_date: dt.date, end_date: dt.date,
+                         collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                         platform: Optional[str] = None, expanded: bool = False,
+                         pagination_token: Optional[str] = None, sort_order: Optional[str] = None,
+                         page_size: Optional[int] = None,
+                         randomized: bool = False) -> tuple[List[Story], PaginationToken]:
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        if expanded:
+            params['expanded'] = 1
+        if randomized:
+            params['randomize'] = 1
+        if pagination_token:
+            params['pagination_token'] = pagination_token
+        if sort_order:
+            params['sort_order'] = sort_order
+        if page_size:
+            params['page_size'] = page_size
+        results = await self._query('search/story-list', params)
+        self._prepare_stories(results['stories'])
+        return results['stories'], results['pagination_token']
+
+    async def iter_stories(self, query: str, start_date: dt.date, end_date: dt.date,
+                           collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                           platform: Optional[str] = None, expanded: bool = False,
+                           pagination_token: Optional[str] = None, sort_order: Optional[str] = None,
+                           page_size: Optional[int] = None, randomized: bool = False,
+                           prefetch: int = 1) -> AsyncIterator[Story]:
+        """
+        Async generator over every matching story; see SearchApi.iter_stories
+        """
+        async def fetch_page(token: Optional[str]) -> tuple[List[Story], PaginationToken]:
+            return await self.story_list(query, start_date, end_date, collection_ids, source_ids, platform,
+                                         expanded=expanded, pagination_token=token, sort_order=sort_order,
+                                         page_size=page_size, randomized=randomized)
+        async for stories, _ in prefetch_pages_async(fetch_page, pagination_token, prefetch):
+            for story in stories:
+                yield story
+
+    async def story_sample(self, query: str, start_date: dt.date, end_date: dt.date,
+                           collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                           platform: Optional[str] = None, limit: Optional[int] = None,
+                           expanded=False) -> List[Story]:
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        if limit:
+            params['limit'] = limit
+        fields = ['indexed_date', 'publish_date', 'id', 'language', 'media_name', 'media_url', 'title', 'url']
+        if expanded:
+            fields.append('text')
+        params['fields'] = fields
+        results = await self._query('search/sample', params)
+        self._prepare_stories(results['sample'])
+        return results['sample']
+
+    async def story(self, story_id: str) -> Story:
+        params = dict(storyId=story_id, platform=self.PROVIDER)
+        results = await self._query('search/story', params)
+        if self.INTERN_STRINGS:
+            self._intern_strings([results['story']])
+        return results['story']
+
+    async def words(self, query: str, start_date: dt.date, end_date: dt.date,
+                    collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                    platform: Optional[str] = None, limit: Optional[int] = None) -> List[JSONObj]:
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        if limit:
+            params['limit'] = limit
+        results = await self._query('search/words', params)
+        return results['words']
+
+    async def sources(self, query: str, start_date: dt.date, end_date: dt.date,
+                      collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                      platform: Optional[str] = None, limit: Optional[int] = None) -> List[SourceCount]:
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        if limit:
+            params['limit'] = limit
+        results = await self._query('search/sources', params)
+        return results['sources']
+
+    async def languages(self, query: str, start_date: dt.date, end_date: dt.date,
+                        collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                        platform: Optional[str] = None, limit: Optional[int] = None) -> List[LanguageCount]:
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        if limit:
+            params['limit'] = limit
+        results = await self._query('search/languages', params)
+        return results['languages']
+
+
+class AsyncDirectoryManagementApi(_ManagementMixin, AsyncBaseApi):
+    """
+    Async twin of mediacloud.mgmt.DirectoryManagementApi; all arguments are keyword only
+    """
+
+    async def collection_create(self, **kwargs) -> dict:
+        params = self._collection_params(kwargs)
+        if 'name' not in params or not params['name']:
+            raise ValueError("collection_create must have 'name'")
+        return await self._query('sources/collections/', params, "POST")
+
+    async def collection_copy(self, *, collection_id: int, name: str) -> dict:
+        if not name:
+            raise ValueError("collection_copy must have 'name'")
+        params = {'collection_id': collection_id, 'name': name}
+        return await self._query('sources/collections/copy-collection/', params, "POST")
+
+    async def collection_update(self, *, collection_id: int, **kwargs) -> dict:
+        params = self._collection_params(kwargs)
+        if not params:
+            raise ValueError("no parameters for collection_update?")
+        return await self._query(f'sources/collections/{collection_id}/', params, "PATCH")
+
+    async def collection_delete(self, collection_id: int) -> dict:
+        return await self._query(f'sources/collections/{collection_id}/', None, "DELETE")
+
+    async def collection_source_list(self, *, collection_id: int) -> list[dict]:
+        async def fetch_page(limit: int, offset: int) -> OffsetPage:
+            page = await self._query('sources/sources/', dict(collection_id=collection_id, limit=limit,
+                                                              offset=offset))
+            return cast(OffsetPage, page)
+        sources: list[dict] = []
+        async for results in iter_offset_pages_async(fetch_page, DirectoryApi.LIST_PAGE_SIZE,
+                                                     DirectoryApi.LIST_MAX_WORKERS):
+            sources += results
+        return sources
+
+    async def source_create(self, **kwargs) -> dict:
+        params = self._source_params(kwargs)
+        for p in ['name', 'homepage']:
+            if p not in params:
+                raise ValueError(f"source_create requires '{p}'")
+        return await self._query('sources/sources/', params, "POST")
+
+    async def source_update(self, *, source_id: int, **kwargs) -> dict:
+        params = self._source_params(kwargs)
+        if not params:
+            raise ValueError("no parameters for source_update?")
+        params['id'] = source_id
+        return await self._query(f'sources/sources/{source_id}/', params, "PATCH")
+
+    async def source_delete(self, source_id: int) -> dict:
+        return await self._query(f'sources/sources/{source_id}/', None, "DELETE")
+
+    async def source_collection_list(self, *, source_id: int) -> list[dict]:
+        ret = await self._query(f'sources/sources-collections/{source_id}/', None, "GET")
+        return ret['collections']
+
+    async def source_collection_create(self, *, source_id: int, collection_id: int) -> dict:
+        params = {'source_id': source_id, 'collection_id': collection_id}
+        return await self._query('sources/sources-collections/', params, "POST")
+
+    async def source_collection_delete(self, *, source_id: int, collection_id: int) -> dict:
+        return await self._query(
+            f'sources/sources-collections/{source_id}/?collection_id={collection_id}',
+            None,
+            "DELETE",
+        )
@@ -1,21 +1,47 @@
 import datetime as dt
 import importlib.metadata
+import json
 import logging
+import threading
+import time
 import warnings
-from typing import Any, Dict, List, Optional, Union
-
-from requests_ratelimiter import LimiterSession
+from concurrent.futures import ThreadPoolExecutor
+from typing import (TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator,
+                    List, Optional, Sequence, Set, Tuple, Union, cast)
 
 import mediacloud
 import mediacloud.error
-from mediacloud.types import (Collection, CountOverTimePoint, JSONObj,
-                              LanguageCount, OffsetPage, PaginationToken,
+from mediacloud.batch import CODED_FIELDS, StoryBatch, StringTable
+from mediacloud.cache import (CountStore, DirectoryCache, ResponseCache,
+                              cache_key, canonical_params)
+from mediacloud.dates import (OBJECTS, convert_story_dates, parse_date,
+                              story_day)
+from mediacloud.jsondecode import Decoder, decode, get_decoder
+from mediacloud.jsonstream import StreamedArray
+from mediacloud.metrics import Instrument
+from mediacloud.paging import (Checkpoint, PrefetchPages, date_shards,
+                               iter_offset_pages, prefetch_pages)
+from mediacloud.ratelimit import RateLimiter, retry_after_secs
+from mediacloud.retry import RetryPolicy
+from mediacloud.types import (BatchResult, Collection, CountOverTimePoint,
+                              Feed, JSONObj, LanguageCount, OffsetPage,
+                              PaginationToken, QuerySpec, RequestMetrics,
                               Source, SourceCount, SourceIntervalAttention,
                               SourceWeekAttention, Story, StoryCount,
                               VersionInfo)
 
+if TYPE_CHECKING:
+    import requests
+
+    from mediacloud.transport import Transport
+
 logger = logging.getLogger(__name__)
 
+# the positional order of a query spec given as a tuple
+_SPEC_FIELDS = ('query', 'start_date', 'end_date', 'collection_ids', 'source_ids', 'platform')
+
+QuerySpecLike = Union[QuerySpec, Sequence[Any]]
+
 # Identify the version of this package that's running
 try:
     VERSION = "v" + importlib.metadata.version('mediacloud')
@@ -23,7 +49,83 @@ except importlib.metadata.PackageNotFoundError:
     VERSION = "dev"
 
 
-class BaseApi:
+def __getattr__(name: str) -> Any:
+    # requests and LimiterSession used to be imported here eagerly; keep them reachable as
+    # attributes of this module, but only import them when someone asks
+    if name == 'requests':
+        import requests
+        return requests
+    if name == 'LimiterSession':
+        from requests_ratelimiter import LimiterSession
+        return LimiterSession
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _query_spec(spec: QuerySpecLike) -> QuerySpec:
+    """
+    A QuerySpec from either a dict or a (query, start_date, end_date, collection_ids,
+    source_ids, platform) tuple, of which the last three are optional
+    """
+    if isinstance(spec, dict):
+        unknown = set(spec) - set(_SPEC_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown query spec fields: {sorted(unknown)}")
+        values = dict(spec)
+    else:
+        if not 3 <= len(spec) <= len(_SPEC_FIELDS):
+            raise ValueError(f"A query spec tuple needs 3 to {len(_SPEC_FIELDS)} items, got {len(spec)}")
+        values = dict(zip(_SPEC_FIELDS, spec))
+    values.setdefault('collection_ids', [])
+    values.setdefault('source_ids', [])
+    values.setdefault('platform', None)
+    return QuerySpec(**values)  # type: ignore[typeddict-item]
+
+
+def _query_spec_key(spec: QuerySpec) -> str:
+    """
+    Identical for specs that ask the same question (ids in any order, dates or date strings)
+    """
+    return json.dumps(canonical_params(dict(q=spec['query'], start=spec['start_date'], end=spec['end_date'],
+                                            cs=spec['collection_ids'], ss=spec['source_ids'],
+                                            platform=spec['platform'])), sort_keys=True)
+
+
+def _dedupe_specs(specs: Iterable[QuerySpecLike]) -> Tuple[List[QuerySpec], List[str], Dict[str, QuerySpec]]:
+    # every spec in input order, its key, and the first spec seen for each key
+    normalized = [_query_spec(s) for s in specs]
+    keys = [_query_spec_key(s) for s in normalized]
+    unique: Dict[str, QuerySpec] = {}
+    for key, spec in zip(keys, normalized):
+        unique.setdefault(key, spec)
+    return normalized, keys, unique
+
+
+class _MetricsMixin:
+    """
+    RequestMetrics bookkeeping, shared by the blocking and asyncio clients
+    """
+
+    _instruments: List[Instrument]
+
+    def _start_metrics(self, method: str, endpoint: str) -> tuple[Optional[RequestMetrics], float]:
+        if not self._instruments:
+            return None, 0.0
+        metrics = RequestMetrics(method=method, endpoint=endpoint, status=None, attempts=0, cached=False,
+                                 limiter_wait_secs=0.0, retry_wait_secs=0.0, error=None)
+        return metrics, time.perf_counter()
+
+    def _finish_metrics(self, metrics: Optional[RequestMetrics], started: float) -> None:
+        if metrics is None:
+            return
+        metrics['total_secs'] = time.perf_counter() - started
+        for instrument in self._instruments:
+            try:
+                instrument(metrics)
+            except Exception:
+                logger.exception(f"instrument {instrument!r} failed")
+
+
+class BaseApi(_MetricsMixin):
 
     # Default applied to all queries made to main server. You can alter this on
     # your instance if you want to bail out more quickly, or know you have longer
@@ -31,23 +133,76 @@ class BaseApi:
     TIMEOUT_SECS = 60
 
     # Default rate limit for API requests. Admins with higher rate limits can
-    # override this on their subclass or instance before creating the session.
+    # override this on their subclass or instance before creating the session,
+    # or pass in a mediacloud.ratelimit.AdaptiveRateLimiter that follows the server.
     RATE_LIMIT_PER_MINUTE = 2
 
     BASE_API_URL = "https://search.mediacloud.org/api/"
 
     USER_AGENT_STRING = f"mediacloud {VERSION}"
 
-    def __init__(self, auth_token: Optional[str] = None):
+    # How much of a streamed response body to read off the socket at a time
+    STREAM_CHUNK_BYTES = 64 * 1024
+
+    # Content encodings to ask the server for, as an Accept-Encoding header value. None offers
+    # everything the HTTP library can decode as it streams: gzip and deflate, plus br and zstd
+    # when brotli and zstandard are installed (`pip install mediacloud[compression]`). Set it
+    # to e.g. "identity" on your instance to turn compression off.
+    ACCEPT_ENCODING: Optional[str] = None
+
+    def __init__(self, auth_token: Optional[str] = None, cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None, retry_policy: Optional[RetryPolicy] = None,
+                 instruments: Optional[Iterable[Instrument]] = None, json_decoder: Optional[Decoder] = None,
+                 transport: Optional["Transport"] = None):
         if not auth_token:
             raise mediacloud.error.MCException("No api key set - nothing will work without this")
         # Specify the auth_token to use for all future requests
         self._auth_token = auth_token
-        # better performance to put all HTTP through this one object;
-        self._session = LimiterSession(per_minute=self.RATE_LIMIT_PER_MINUTE)
-        self._session.headers.update({'Authorization': f'Token {self._auth_token}'})
-        self._session.headers.update({'Accept': 'application/json'})
-        self._session.headers.update({"User-Agent": self.USER_AGENT_STRING})
+        # optional local store of earlier responses (see mediacloud.cache)
+        self._cache = cache
+        # optional connection pool and per-key rate limiter shared with other clients (see
+        # mediacloud.transport); the key's shared limiter applies unless one is passed in
+        self._transport = transport
+        if rate_limiter is None and transport is not None:
+            rate_limiter = transport.limiter(auth_token)
+        self._rate_limiter = rate_limiter
+        self._retry_policy = retry_policy or RetryPolicy()
+        # called with a RequestMetrics after every call (see mediacloud.metrics)
+        self._instruments = list(instruments or [])
+        # bytes -> JSON; None for the fastest backend installed (see mediacloud.jsondecode)
+        self._json_decoder = json_decoder
+        # built on first use (see _session), so objects that never make a request, and scripts
+        # that only import this module, don't pay for importing requests or setting up a limiter
+        self._http_session: Optional["requests.Session"] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def _session(self) -> "requests.Session":
+        # better performance to put all HTTP through this one object
+        if self._http_session is None:
+            with self._session_lock:
+                if self._http_session is None:
+                    self._http_session = self._build_session()
+        return self._http_session
+
+    def _build_session(self) -> "requests.Session":
+        session: "requests.Session"
+        if self._rate_limiter is None:
+            from requests_ratelimiter import LimiterSession
+            session = LimiterSession(per_minute=self.RATE_LIMIT_PER_MINUTE)
+        else:
+            import requests
+
+            # the limiter paces requests itself (in _query), so a plain session will do
+            session = requests.Session()
+        session.headers.update({'Authorization': f'Token {self._auth_token}'})
+        session.headers.update({'Accept': 'application/json'})
+        session.headers.update({"User-Agent": self.USER_AGENT_STRING})
+        if self.ACCEPT_ENCODING is not None:
+            session.headers.update({'Accept-Encoding': self.ACCEPT_ENCODING})
+        if self._transport is not None:
+            self._transport.mount(session)
+        return session
 
     def user_profile(self) -> JSONObj:
         # :return: basic info about the current user, including their roles
@@ -58,33 +213,185 @@ class BaseApi:
         returns dict with (at least):
         GIT_REV, now (float epoch time), version
         """
-        return self._query('version')
+        return cast(VersionInfo, self._query('version'))
 
     def _query(self, endpoint: str, params: Optional[Dict] = None, method: str = 'GET') -> JSONObj:
         """
         Centralize making the actual queries here for easy maintenance and testing of HTTP comms
         """
-        endpoint_url = self.BASE_API_URL + endpoint
+        metrics, started = self._start_metrics(method, endpoint)
+        try:
+            cache = self._cache
+            if cache is not None and not (method == 'GET' and cache.cacheable(endpoint)):
+                cache = None
+            if cache is not None:
+                cached = cache.get(endpoint, params)
+                if cached is not None:
+                    if metrics is not None:
+                        metrics['cached'] = True
+                    return cached
+            endpoint_url = self.BASE_API_URL + endpoint
+            r = self._send(method, endpoint_url, params, metrics=metrics)
+            decode_started = time.perf_counter()
+            try:
+                results = self._parse_response(r, params, self._json_decoder or get_decoder())
+            finally:
+                if metrics is not None:
+                    metrics['decode_secs'] = time.perf_counter() - decode_started
+            if cache is not None:
+                cache.set(endpoint, params, results)
+            return results
+        except Exception as e:
+            if metrics is not None:
+                metrics['error'] = type(e).__name__
+            raise
+        finally:
+            self._finish_metrics(metrics, started)
+
+    def _query_stream(self, endpoint: str, params: Optional[Dict], key: str) -> StreamedArray:
+        """
+        GET an endpoint whose response is an object holding a big array under `key`, and parse
+        the elements one at a time as the body arrives, instead of decoding the whole page.
+        The response's other fields show up in the result's `meta` after iterating.
+        """
+        metrics, started = self._start_metrics('GET', endpoint)
+        try:
+            r = self._send('GET', self.BASE_API_URL + endpoint, params, stream=True, metrics=metrics)
+            if r.status_code // 100 != 2:
+                self._parse_response(r, params)  # reads the (small) error body and raises
+        except Exception as e:
+            if metrics is not None:
+                metrics['error'] = type(e).__name__
+            self._finish_metrics(metrics, started)
+            raise
+
+        released = False
+
+        def release() -> None:
+            # runs once, when the body has been read or the result is closed, even unread
+            nonlocal released
+            if not released:
+                released = True
+                r.close()
+                self._finish_metrics(metrics, started)
+
+        def chunks() -> Iterator[bytes]:
+            try:
+                if metrics is None:
+                    yield from r.iter_content(self.STREAM_CHUNK_BYTES)
+                    return
+                # decoding is interleaved with reading, so only the time spent waiting on the
+                # socket is counted (as download)
+                metrics.update({'download_secs': 0.0, 'decode_secs': None, 'response_bytes': 0})
+                body = r.iter_content(self.STREAM_CHUNK_BYTES)
+                download_secs = 0.0
+                while True:
+                    waited = time.perf_counter()
+                    chunk = next(body, None)
+                    download_secs += time.perf_counter() - waited
+                    metrics['download_secs'] = download_secs
+                    if chunk is None:
+                        self._record_transfer(metrics, r)
+                        return
+                    metrics['response_bytes'] += len(chunk)
+                    yield chunk
+            finally:
+                release()
+        return StreamedArray(chunks(), key, on_close=release)
+
+    def _send(self, method: str, endpoint_url: str, params: Optional[Dict],
+              stream: bool = False, metrics: Optional[RequestMetrics] = None) -> "requests.Response":
+        """
+        Make one logical request, retrying transient failures as the retry policy allows. Unless
+        `stream` is set, the body of the response returned has been read. Timings and sizes are
+        added to `metrics` if it's given.
+        """
+        policy = self._retry_policy
+        policy.budget.deposit()
+        attempt = 0
+        while True:
+            waiting = time.perf_counter()
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+            sending = time.perf_counter()
+            try:
+                # always streamed, so reading the body can be timed apart from waiting on the server
+                r = self._request(method, endpoint_url, params, stream=True)
+            except Exception as e:
+                if metrics is not None:
+                    metrics['attempts'] += 1
+                    metrics['limiter_wait_secs'] += sending - waiting
+                if not policy.should_retry_exception(method, e, attempt):
+                    raise
+                delay = policy.backoff(attempt)
+                logger.warning(f"{method} {endpoint_url} failed ({e!r}), retry {attempt + 1} in {delay:.1f}s")
+            else:
+                if metrics is not None:
+                    headers_in = time.perf_counter()
+                    server_secs = r.elapsed.total_seconds()
+                    metrics['attempts'] += 1
+                    metrics['status'] = r.status_code
+                    metrics['server_secs'] = server_secs
+                    # a LimiterSession sleeps inside the call, before the request goes out
+                    metrics['limiter_wait_secs'] += sending - waiting + max(0.0, headers_in - sending - server_secs)
+                if self._rate_limiter is not None:
+                    self._rate_limiter.update(r.status_code, r.headers)
+                if not policy.should_retry_status(method, r.status_code, attempt):
+                    if not stream:
+                        body = r.content
+                        if metrics is not None:
+                            metrics['download_secs'] = time.perf_counter() - headers_in
+                            metrics['response_bytes'] = len(body)
+                            self._record_transfer(metrics, r)
+                    return r
+                r.close()  # hand the connection back to the pool
+                delay = policy.backoff(attempt, retry_after_secs(r.headers))
+                logger.warning(f"{method} {endpoint_url} returned {r.status_code}, "
+                               f"retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+            if metrics is not None:
+                metrics['retry_wait_secs'] += delay
+            attempt += 1
+
+    @staticmethod
+    def _record_transfer(metrics: RequestMetrics, r: "requests.Response") -> None:
+        # urllib3 counts the bytes it pulled off the socket, before any decompression
+        tell = getattr(r.raw, 'tell', None)
+        metrics['wire_bytes'] = tell() if tell is not None else None
+        metrics['content_encoding'] = r.headers.get('Content-Encoding', 'identity')
+
+    def _request(self, method: str, endpoint_url: str, params: Optional[Dict],
+                 stream: bool = False) -> "requests.Response":
         if method == 'GET':
-            r = self._session.get(endpoint_url, params=params, timeout=self.TIMEOUT_SECS)
+            return self._session.get(endpoint_url, params=params, timeout=self.TIMEOUT_SECS, stream=stream)
         elif method == 'POST':
-            r = self._session.post(endpoint_url, json=params, timeout=self.TIMEOUT_SECS)
+            return self._session.post(endpoint_url, json=params, timeout=self.TIMEOUT_SECS, stream=stream)
         elif method == "DELETE":
-            r = self._session.delete(endpoint_url, params=params, timeout=self.TIMEOUT_SECS)
+            return self._session.delete(endpoint_url, params=params, timeout=self.TIMEOUT_SECS, stream=stream)
         elif method == "PATCH":
-            r = self._session.patch(endpoint_url, json=params, timeout=self.TIMEOUT_SECS)
+            return self._session.patch(endpoint_url, json=params, timeout=self.TIMEOUT_SECS, stream=stream)
         else:
             raise RuntimeError(f"Unsupported method of '{method}'")
 
+    @staticmethod
+    def _parse_response(r, params: Optional[Dict], loads: Decoder = json.loads) -> JSONObj:
+        """
+        Turn an HTTP response into decoded JSON, raising APIResponseError on failures. Shared
+        with the asyncio clients, so this must only rely on attributes both requests and httpx
+        responses have.
+        """
         status_class = r.status_code // 100
-        if r.text:
+        # decode straight from the raw bytes; going through r.text would decode the body to a
+        # str first (sometimes after guessing its charset) and r.json() would then do it again
+        body = r.content
+        if body:
             try:
-                j = r.json()
-            except:
+                j = decode(body, loads)
+            except ValueError:
                 # here with non/bad json response
                 j = {
                     "status": "bad-response",
-                    "note": f"bad JSON: {r.text}" # for APIResponseError
+                    "note": f"bad JSON: {body.decode('utf-8', errors='replace')}" # for APIResponseError
                 }
                 status_class = 99
         else:
@@ -108,9 +415,28 @@ class DirectoryApi(BaseApi):
     PLATFORM_TWITTER = "twitter"
     PLATFORM_REDDIT = "reddit"
 
-    def collection(self, collection_id: int) -> Collection:
+    # Source and collection objects are remembered this long, to save repeated lookups of the
+    # same ids. Set DIRECTORY_CACHE_SIZE to 0 on your subclass to turn this off.
+    DIRECTORY_CACHE_TTL_SECS = 15 * 60
+    DIRECTORY_CACHE_SIZE = 10000
+
+    # Defaults for iter_sources/iter_collections/iter_feeds: results asked for per request, and
+    # how many requests may be in flight at once (all still paced by the rate limiter)
+    LIST_PAGE_SIZE = 1000
+    LIST_MAX_WORKERS = 4
+
+    def __init__(self, auth_token: Optional[str] = None, directory_cache: Optional[DirectoryCache] = None,
+                 **kwargs):
+        super().__init__(auth_token, **kwargs)
+        self._directory_cache = directory_cache or DirectoryCache(self.DIRECTORY_CACHE_SIZE,
+                                                                  self.DIRECTORY_CACHE_TTL_SECS)
 
-        return self._query(f'sources/collections/{collection_id}/', None)
+    def collection(self, collection_id: int) -> Collection:
+        collection = self._directory_cache.get_collection(collection_id)
+        if collection is None:
+            collection = self._query(f'sources/collections/{collection_id}/', None)
+            self._directory_cache.add_collections([collection])
+        return cast(Collection, collection)
 
     def collection_list(self, platform: Optional[str] = None, name: Optional[str] = None,
                         limit: Optional[int] = 0, offset: Optional[int] = 0, source_id: Optional[int] = None) -> OffsetPage:
@@ -121,10 +447,16 @@ class DirectoryApi(BaseApi):
             params['platform'] = platform
         if source_id:
             params['source_id'] = source_id
-        return self._query('sources/collections/', params)
+        page = cast(OffsetPage, self._query('sources/collections/', params))
+        self._directory_cache.add_collections(page['results'])
+        return page
 
     def source(self, source_id: int) -> Source:
-        return self._query(f'sources/sources/{source_id}/', None)
+        source = self._directory_cache.get_source(source_id)
+        if source is None:
+            source = self._query(f'sources/sources/{source_id}/', None)
+            self._directory_cache.add_sources([source])
+        return cast(Source, source)
 
     def source_list(self, platform: Optional[str] = None, name: Optional[str] = None,
                     collection_id: Optional[int] = None,
@@ -136,7 +468,26 @@ class DirectoryApi(BaseApi):
             params['name'] = name
         if platform:
             params['platform'] = platform
-        return self._query('sources/sources/', params)
+        page = cast(OffsetPage, self._query('sources/sources/', params))
+        self._directory_cache.add_sources(page['results'])
+        return page
+
+    def source_list_stream(self, platform: Optional[str] = None, name: Optional[str] = None,
+                           collection_id: Optional[int] = None,
+                           limit: Optional[int] = 0, offset: Optional[int] = 0) -> StreamedArray:
+        """
+        Like source_list, but parses sources one at a time as the response arrives, so big pages
+        don't have to fit in memory at once. Iterate over the result for the sources; the page's
+        `count`, `next` and `previous` are in its `meta` dict afterwards.
+        """
+        params: Dict[Any, Any] = dict(limit=limit, offset=offset)
+        if collection_id:
+            params['collection_id'] = collection_id
+        if name:
+            params['name'] = name
+        if platform:
+            params['platform'] = platform
+        return self._query_stream('sources/sources/', params, 'results')
 
     def feed_list(self, source_id: Optional[int] = None,
                   modified_since: Optional[Union[dt.datetime, int, float]] = None,
@@ -164,10 +515,72 @@ class DirectoryApi(BaseApi):
 
         return self._query('sources/feeds/', params)
 
-
-class SearchApi(BaseApi):
+    def iter_collections(self, platform: Optional[str] = None, name: Optional[str] = None,
+                         source_id: Optional[int] = None, page_size: Optional[int] = None,
+                         max_workers: Optional[int] = None) -> Iterator[Collection]:
+        """
+        Yield every collection collection_list would page through, fetching pages concurrently
+        (see mediacloud.paging.iter_offset_pages)
+        """
+        def fetch_page(limit: int, offset: int) -> OffsetPage:
+            return self.collection_list(platform=platform, name=name, source_id=source_id, limit=limit,
+                                        offset=offset)
+        for results in iter_offset_pages(fetch_page, page_size or self.LIST_PAGE_SIZE,
+                                         max_workers or self.LIST_MAX_WORKERS):
+            yield from cast(List[Collection], results)
+
+    def iter_sources(self, platform: Optional[str] = None, name: Optional[str] = None,
+                     collection_id: Optional[int] = None, page_size: Optional[int] = None,
+                     max_workers: Optional[int] = None) -> Iterator[Source]:
+        """
+        Yield every source source_list would page through, fetching pages concurrently
+        """
+        def fetch_page(limit: int, offset: int) -> OffsetPage:
+            return self.source_list(platform=platform, name=name, collection_id=collection_id, limit=limit,
+                                    offset=offset)
+        for results in iter_offset_pages(fetch_page, page_size or self.LIST_PAGE_SIZE,
+                                         max_workers or self.LIST_MAX_WORKERS):
+            yield from cast(List[Source], results)
+
+    def iter_feeds(self, source_id: Optional[int] = None,
+                   modified_since: Optional[Union[dt.datetime, int, float]] = None,
+                   modified_before: Optional[Union[dt.datetime, int, float]] = None,
+                   page_size: Optional[int] = None, max_workers: Optional[int] = None) -> Iterator[Feed]:
+        """
+        Yield every feed feed_list would page through, fetching pages concurrently
+        """
+        def fetch_page(limit: int, offset: int) -> OffsetPage:
+            return self.feed_list(source_id=source_id, modified_since=modified_since,  # type: ignore[return-value]
+                                  modified_before=modified_before, limit=limit, offset=offset)
+        for results in iter_offset_pages(fetch_page, page_size or self.LIST_PAGE_SIZE,
+                                         max_workers or self.LIST_MAX_WORKERS):
+            yield from cast(List[Feed], results)
+
+
+class _SearchMixin:
+    """
+    Settings, parameter building and result post-processing shared by SearchApi and
+    mediacloud.aio.AsyncSearchApi; none of it touches the network
+    """
     PROVIDER = "onlinenews-mediacloud"
 
+    # string table shared by the StoryBatches this object returns (and by interned stories),
+    # created on first use
+    _batch_strings: Optional[StringTable] = None
+
+    # default concurrency of story_count_many and friends
+    BATCH_MAX_WORKERS = 8
+
+    # How stories' publish_date and indexed_date are returned: mediacloud.dates.OBJECTS (date and
+    # datetime), RAW (the server's strings, skipping parsing) or EPOCH (seconds since 1970). Set
+    # it on your instance if you never use the dates or want plain numbers.
+    DATE_MODE = OBJECTS
+
+    # Make every story this object returns share one str object per distinct media_name,
+    # media_url and language, instead of each page's JSON decode making fresh copies. Turn it
+    # on for your instance when holding millions of stories in memory.
+    INTERN_STRINGS = False
+
     def _prep_default_params(self, query: str, start_date: dt.date, end_date: dt.date,
                              collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
                              platform: Optional[str] = None):
@@ -192,6 +605,36 @@ class SearchApi(BaseApi):
             params['cs'] = ",".join([str(cid) for cid in collection_ids]),
         return params
 
+    def _prepare_stories(self, stories: List[Story]) -> None:
+        # _in place_ post-processing of every list of stories this object returns
+        self._dates_str2objects(stories)
+        if self.INTERN_STRINGS:
+            self._intern_strings(stories)
+
+    def _story_strings(self) -> StringTable:
+        if self._batch_strings is None:
+            self._batch_strings = StringTable()
+        return self._batch_strings
+
+    def _intern_strings(self, stories: List[Story]) -> None:
+        intern = self._story_strings().intern
+        for s in stories:
+            for f in CODED_FIELDS:
+                if f in s:
+                    s[f] = intern(s[f])  # type: ignore[literal-required]
+
+    def _dates_str2objects(self, stories: List[Story]):
+        # _in place_ translation from ES date str to python data/datetime objects (or whatever
+        # DATE_MODE asks for); publish dates repeat a lot, so they are memoized across pages
+        convert_story_dates(stories, self.DATE_MODE)
+
+
+class SearchApi(_SearchMixin, BaseApi):
+
+    def __init__(self, auth_token: Optional[str] = None, count_store: Optional[CountStore] = None, **kwargs):
+        super().__init__(auth_token, **kwargs)
+        self._count_store = count_store
+
     def story_count(self, query: str, start_date: dt.date, end_date: dt.date, collection_ids: Optional[List[int]] = [],
                     source_ids: Optional[List[int]] = [], platform: Optional[str] = None) -> StoryCount:
         params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
@@ -201,12 +644,69 @@ class SearchApi(BaseApi):
     def story_count_over_time(self, query: str, start_date: dt.date, end_date: dt.date,
                               collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
                               platform: Optional[str] = None) -> List[CountOverTimePoint]:
+        """
+        With a `count_store` set on this object, only days missing from the store or still
+        volatile are fetched, and the rest are filled in from it (see mediacloud.cache.CountStore).
+        """
         params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        if self._count_store is None:
+            return self._fetch_count_over_time(params)
+        store = self._count_store
+        series = store.series_key(params)
+        start, end = dt.date.fromisoformat(params['start']), dt.date.fromisoformat(params['end'])
+        for range_start, range_end in store.stale_ranges(series, start, end):
+            points = self._fetch_count_over_time(dict(params, start=range_start.isoformat(),
+                                                      end=range_end.isoformat()))
+            store.put(series, range_start, range_end, points)
+        return store.get(series, start, end)
+
+    def _fetch_count_over_time(self, params: Dict) -> List[CountOverTimePoint]:
         results = self._query('search/count-over-time', params)
         for d in results['count_over_time']['counts']:
-            d['date'] = dt.date.fromisoformat(d['date'][:10])
+            d['date'] = parse_date(d['date'])
         return results['count_over_time']['counts']
 
+    def story_count_many(self, specs: Iterable[QuerySpecLike],
+                         max_workers: Optional[int] = None) -> List[BatchResult]:
+        """
+        Run story_count for every spec (a QuerySpec dict, or a (query, start_date, end_date,
+        collection_ids, source_ids, platform) tuple) concurrently. See _run_many.
+        """
+        return self._run_many(self.story_count, specs, max_workers)
+
+    def story_count_over_time_many(self, specs: Iterable[QuerySpecLike],
+                                   max_workers: Optional[int] = None) -> List[BatchResult]:
+        """
+        Run story_count_over_time for every spec concurrently. See _run_many.
+        """
+        return self._run_many(self.story_count_over_time, specs, max_workers)
+
+    def _run_many(self, method: Callable[..., Any], specs: Iterable[QuerySpecLike],
+                  max_workers: Optional[int]) -> List[BatchResult]:
+        """
+        Call `method` once per distinct spec on up to `max_workers` threads (default
+        BATCH_MAX_WORKERS). Requests still pass through this client's rate limiter, so the
+        batch runs as fast as the quota allows instead of one round trip at a time.
+
+        Returns one BatchResult per input spec, in input order, holding either `result` or the
+        `error` that call raised; one failing query doesn't stop the others. Duplicate specs are
+        only queried once and share the same result object.
+        """
+        normalized, keys, unique = _dedupe_specs(specs)
+        if not unique:
+            return []
+
+        def run(spec: QuerySpec) -> Tuple[Any, Optional[Exception]]:
+            try:
+                return method(**spec), None
+            except Exception as e:
+                return None, e
+        workers = min(max_workers or self.BATCH_MAX_WORKERS, len(unique))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mediacloud-batch") as pool:
+            outcomes = dict(zip(unique, pool.map(run, unique.values())))
+        return [BatchResult(spec=spec, result=outcomes[key][0], error=outcomes[key][1])
+                for spec, key in zip(normalized, keys)]
+
     def stories_by_source_week(self, query: str, start_date: dt.date, end_date: dt.date,
                                collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
                                platform: Optional[str] = None) -> List[SourceWeekAttention]:
@@ -228,6 +728,16 @@ class SearchApi(BaseApi):
                    expanded: bool = False, pagination_token: Optional[str] = None,
                    sort_order: Optional[str] = None, page_size: Optional[int] = None,
                    randomized: bool = False) -> tuple[List[Story], PaginationToken]:
+        params = self._story_list_params(query, start_date, end_date, collection_ids, source_ids, platform,
+                                         expanded, pagination_token, sort_order, page_size, randomized)
+        results = self._query('search/story-list', params)
+        self._prepare_stories(results['stories'])
+        return results['stories'], results['pagination_token']
+
+    def _story_list_params(self, query: str, start_date: dt.date, end_date: dt.date,
+                           collection_ids: Optional[List[int]], source_ids: Optional[List[int]],
+                           platform: Optional[str], expanded: bool, pagination_token: Optional[str],
+                           sort_order: Optional[str], page_size: Optional[int], randomized: bool) -> Dict:
         params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
         if expanded:
             params['expanded'] = 1
@@ -239,15 +749,177 @@ class SearchApi(BaseApi):
             params['sort_order'] = sort_order
         if page_size:
             params['page_size'] = page_size
-        results = self._query('search/story-list', params)
-        self._dates_str2objects(results['stories'])
-        return results['stories'], results['pagination_token']
+        return params
 
-    def _dates_str2objects(self, stories: List[Story]):
-        # _in place_ translation from ES date str to python data/datetime objects to save memory
-        for s in stories:
-            s['publish_date'] = dt.date.fromisoformat(s['publish_date'][:10]) if s['publish_date'] else None
-            s['indexed_date'] = dt.datetime.fromisoformat(s['indexed_date']) if s['indexed_date'] else None
+    def story_list_batch(self, query: str, start_date: dt.date, end_date: dt.date,
+                         collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                         platform: Optional[str] = None, expanded: bool = False,
+                         pagination_token: Optional[str] = None, sort_order: Optional[str] = None,
+                         page_size: Optional[int] = None, randomized: bool = False,
+                         strings: Optional[StringTable] = None) -> tuple[StoryBatch, PaginationToken]:
+        """
+        Like story_list, but returns the page as a compact, column-oriented StoryBatch (see
+        mediacloud.batch), built as the response streams in. Rows read back as dict-like
+        StoryViews. Repeated strings are coded against `strings`, by default one table shared
+        by every batch this object returns.
+        """
+        params = self._story_list_params(query, start_date, end_date, collection_ids, source_ids, platform,
+                                         expanded, pagination_token, sort_order, page_size, randomized)
+        batch = StoryBatch(strings if strings is not None else self._story_strings())
+        stories = self._query_stream('search/story-list', params, 'stories')
+        try:
+            batch.extend(stories)
+        finally:
+            stories.close()
+        return batch, stories.meta.get('pagination_token')
+
+    def iter_story_batches(self, query: str, start_date: dt.date, end_date: dt.date,
+                           collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                           platform: Optional[str] = None, expanded: bool = False,
+                           pagination_token: Optional[str] = None, sort_order: Optional[str] = None,
+                           page_size: Optional[int] = None, randomized: bool = False,
+                           prefetch: int = 1) -> Iterator[StoryBatch]:
+        """
+        Yield every page of matching stories as a StoryBatch, prefetching like iter_stories
+        """
+        def fetch_page(token: Optional[str]) -> tuple[StoryBatch, PaginationToken]:
+            return self.story_list_batch(query, start_date, end_date, collection_ids, source_ids, platform,
+                                         expanded=expanded, pagination_token=token, sort_order=sort_order,
+                                         page_size=page_size, randomized=randomized)
+        pages = prefetch_pages(fetch_page, pagination_token, prefetch)
+        try:
+            for batch, _ in pages:
+                yield batch
+        finally:
+            pages.close()
+
+    def story_list_stream(self, query: str, start_date: dt.date, end_date: dt.date,
+                          collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                          platform: Optional[str] = None, expanded: bool = False,
+                          pagination_token: Optional[str] = None, sort_order: Optional[str] = None,
+                          page_size: Optional[int] = None, randomized: bool = False) -> "StoryStream":
+        """
+        Like story_list, but parses stories one at a time as the page arrives over the network,
+        so peak memory is about one story rather than the whole page (worth it for expanded
+        pages with full text). Iterate over the result for the stories; its `pagination_token`
+        is filled in once iteration has finished.
+        """
+        params = self._story_list_params(query, start_date, end_date, collection_ids, source_ids, platform,
+                                         expanded, pagination_token, sort_order, page_size, randomized)
+        return StoryStream(self._query_stream('search/story-list', params, 'stories'), self._prepare_stories)
+
+    def iter_stories(self, query: str, start_date: dt.date, end_date: dt.date,
+                     collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                     platform: Optional[str] = None, expanded: bool = False,
+                     pagination_token: Optional[str] = None, sort_order: Optional[str] = None,
+                     page_size: Optional[int] = None, randomized: bool = False,
+                     prefetch: int = 1, stream: bool = False,
+                     checkpoint: Union[None, str, Checkpoint] = None) -> Iterator[Story]:
+        """
+        Yield every story matching the query, following pagination_token until the last page.
+        The next page is fetched on a background thread while the caller works through the
+        current one; `prefetch` caps how many fetched pages may wait, so memory stays flat.
+
+        With `stream=True` pages are instead parsed one story at a time as they arrive (see
+        story_list_stream), for the smallest possible footprint; there is no prefetching then.
+
+        Pass a `checkpoint` (a Checkpoint or a file path) to make the crawl resumable: progress
+        is saved after each page the caller finishes, and running the same query with the same
+        checkpoint later continues from the next unread page (see mediacloud.paging.Checkpoint).
+        """
+        if checkpoint is not None:
+            if not isinstance(checkpoint, Checkpoint):
+                checkpoint = Checkpoint(checkpoint)
+            params = self._story_list_params(query, start_date, end_date, collection_ids, source_ids, platform,
+                                             expanded, None, sort_order, page_size, randomized)
+            checkpoint.start(cache_key('search/story-list', params))
+            if checkpoint.done:
+                return
+            if checkpoint.emitted or checkpoint.pagination_token:
+                pagination_token = checkpoint.pagination_token
+        emitted = checkpoint.emitted if checkpoint is not None else 0
+
+        if stream:
+            token = pagination_token
+            while True:
+                page = self.story_list_stream(query, start_date, end_date, collection_ids, source_ids, platform,
+                                              expanded=expanded, pagination_token=token, sort_order=sort_order,
+                                              page_size=page_size, randomized=randomized)
+                try:
+                    for story in page:
+                        emitted += 1
+                        yield story
+                finally:
+                    page.close()
+                token = page.pagination_token
+                if checkpoint is not None:
+                    checkpoint.save(token, emitted)
+                if token is None:
+                    return
+
+        def fetch_page(token: Optional[str]) -> tuple[List[Story], PaginationToken]:
+            return self.story_list(query, start_date, end_date, collection_ids, source_ids, platform,
+                                   expanded=expanded, pagination_token=token, sort_order=sort_order,
+                                   page_size=page_size, randomized=randomized)
+        pages = prefetch_pages(fetch_page, pagination_token, prefetch)
+        try:
+            for stories, next_token in pages:
+                yield from stories
+                emitted += len(stories)
+                if checkpoint is not None:
+                    checkpoint.save(next_token, emitted)
+        finally:
+            pages.close()
+
+    def iter_stories_sharded(self, query: str, start_date: dt.date, end_date: dt.date,
+                             collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                             platform: Optional[str] = None, expanded: bool = False,
+                             sort_order: Optional[str] = None, page_size: Optional[int] = None,
+                             shards: int = 4, max_workers: Optional[int] = None,
+                             prefetch: int = 4) -> Iterator[Story]:
+        """
+        Like iter_stories, but splits the date range into `shards` sub-ranges and walks each
+        shard's pagination chain on its own background thread, with at most `max_workers`
+        (default: one per shard) requests in flight. Every request still goes through this
+        object's rate limiter, so the speed-up is bounded by your quota.
+
+        Stories come out shard by shard in date order (server order within a shard), so the
+        output is the same from run to run. Each shard buffers up to `prefetch` pages ahead of
+        the reader. Stories published on days next to a shard boundary are checked against ids
+        already emitted, so one showing up in two shards is only yielded once.
+        """
+        ranges = date_shards(start_date, end_date, shards)
+        in_flight = threading.BoundedSemaphore(max_workers or len(ranges))
+        edge_days: Set[dt.date] = set()
+        for i in range(1, len(ranges)):
+            boundary = ranges[i][0]
+            edge_days.update(boundary + dt.timedelta(days=d) for d in (-2, -1, 0, 1))
+
+        def shard_pages(shard_start: dt.date, shard_end: dt.date) -> PrefetchPages:
+            def fetch_page(token: Optional[str]) -> tuple[List[Story], PaginationToken]:
+                with in_flight:
+                    return self.story_list(query, shard_start, shard_end, collection_ids, source_ids, platform,
+                                           expanded=expanded, pagination_token=token, sort_order=sort_order,
+                                           page_size=page_size)
+            return prefetch_pages(fetch_page, None, prefetch)
+
+        # start every shard's worker up front, then drain them in order
+        shard_iters = [shard_pages(*r) for r in ranges]
+        seen_near_edges = set()
+        try:
+            for pages in shard_iters:
+                for stories, _ in pages:
+                    for story in stories:
+                        # compare days, whatever form DATE_MODE left the publish date in
+                        day = story_day(story.get('publish_date'))
+                        if day is None or day in edge_days:
+                            if story['id'] in seen_near_edges:
+                                continue
+                            seen_near_edges.add(story['id'])
+                        yield story
+        finally:
+            for pages in shard_iters:
+                pages.close()
 
     def story_sample(self, query: str, start_date: dt.date, end_date: dt.date, collection_ids: Optional[List[int]] = [],
                      source_ids: Optional[List[int]] = [], platform: Optional[str] = None,
@@ -260,12 +932,30 @@ class SearchApi(BaseApi):
             fields.append('text')
         params['fields'] = fields  # gets passed down to ES in MC client
         results = self._query('search/sample', params)
-        self._dates_str2objects(results['sample'])
+        self._prepare_stories(results['sample'])
         return results['sample']
 
+    def story_sample_stream(self, query: str, start_date: dt.date, end_date: dt.date,
+                            collection_ids: Optional[List[int]] = [], source_ids: Optional[List[int]] = [],
+                            platform: Optional[str] = None, limit: Optional[int] = None,
+                            expanded=False) -> "StoryStream":
+        """
+        Like story_sample, but parses stories one at a time as the response arrives
+        """
+        params = self._prep_default_params(query, start_date, end_date, collection_ids, source_ids, platform)
+        if limit:
+            params['limit'] = limit
+        fields = ['indexed_date', 'publish_date', 'id', 'language', 'media_name', 'media_url', 'title', 'url']
+        if expanded:
+            fields.append('text')
+        params['fields'] = fields
+        return StoryStream(self._query_stream('search/sample', params, 'sample'), self._prepare_stories)
+
     def story(self, story_id: str) -> Story:
         params = dict(storyId=story_id, platform=self.PROVIDER)
         results = self._query('search/story', params)
+        if self.INTERN_STRINGS:
+            self._intern_strings([results['story']])
         return results['story']
 
     def words(self, query: str, start_date: dt.date, end_date: dt.date, collection_ids: Optional[List[int]] = [],
@@ -294,3 +984,28 @@ class SearchApi(BaseApi):
             params['limit'] = limit
         results = self._query('search/languages', params)
         return results['languages']
+
+
+class StoryStream:
+    """
+    Stories from one streamed story-list or sample response, converted as they are parsed
+    """
+
+    def __init__(self, items: StreamedArray, convert):
+        self._items = items
+        self._convert = convert
+
+    def __iter__(self) -> Iterator[Story]:
+        for story in self._items:
+            self._convert([story])
+            yield story
+
+    @property
+    def pagination_token(self) -> PaginationToken:
+        """
+        token for the next page; only known once all the stories have been read
+        """
+        return self._items.meta.get('pagination_token')
+
+    def close(self) -> None:
+        self._items.close()
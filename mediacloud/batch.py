@@ -0,0 +1,240 @@
+"""
+Compact, column-oriented storage for pages of stories.
+
+A list of Story dicts costs several hundred bytes of overhead per story before counting any
+text, plus separate date/datetime objects. A StoryBatch keeps each field in its own column:
+plain lists for the high-cardinality strings (id, url, title, text), small integer codes into
+a shared StringTable for low-cardinality ones (language, media_name, media_url), and typed
+arrays for the dates. Indexing a batch gives a lightweight read-only StoryView that behaves
+like the usual Story dict.
+"""
+import datetime as dt
+import math
+import threading
+from array import array
+from typing import (Any, Dict, Iterable, Iterator, List, Mapping, Optional,
+                    Sequence, Union, overload)
+
+from mediacloud.dates import _EPOCH, _EPOCH_ORDINAL, datetime_epoch, story_day
+from mediacloud.types import Story
+
+# stored in the int32 publish-day column for stories without a publish_date
+NO_DAY = -2 ** 31
+
+# fields stored as codes into a StringTable
+CODED_FIELDS = ('language', 'media_name', 'media_url')
+
+# fields with a column of their own; anything else a story carries goes in a per-row extras dict
+_COLUMNS = ('id', 'title', 'url', 'text', 'publish_date', 'indexed_date') + CODED_FIELDS
+
+# bit of each column field in a row's presence mask
+_COLUMN_BITS = {key: 1 << i for i, key in enumerate(_COLUMNS)}
+
+
+class StringTable:
+    """
+    Dictionary encoding of repeated strings: each distinct value is stored once and referred to
+    by its int code. Share one table between batches so codes stay comparable across pages.
+    Code 0 always stands for None.
+    """
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self._codes: Dict[Optional[str], int] = {None: 0}
+        # only taken to add a value, so prefetch threads filling one table can't hand out a code twice
+        self._lock = threading.Lock()
+
+    def code(self, value: Optional[str]) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    self.values.append(value)
+                    code = self._codes[value] = len(self.values) - 1
+        return code
+
+    def intern(self, value: Optional[str]) -> Optional[str]:
+        """
+        The table's own copy of `value`, so every equal string handed out is one shared object
+        """
+        return self.values[self.code(value)]
+
+    def __getitem__(self, code: int) -> Optional[str]:
+        return self.values[code]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+def date_to_day(value: Union[None, str, int, float, dt.date]) -> int:
+    """
+    Days since 1970-01-01 for a publish_date in any form a DATE_MODE leaves it: a date, an ES
+    date/datetime string or epoch seconds
+    """
+    day = story_day(value)
+    return NO_DAY if day is None else day.toordinal() - _EPOCH_ORDINAL
+
+
+def day_to_date(day: int) -> Optional[dt.date]:
+    return None if day == NO_DAY else dt.date.fromordinal(day + _EPOCH_ORDINAL)
+
+
+def _datetime_to_ts(value: Union[None, str, int, float, dt.datetime]) -> float:
+    # naive datetimes (what the server sends) are stored as if they were UTC and come back naive
+    if value is None or value == '':
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime_epoch(value)
+
+
+def _ts_to_datetime(ts: float) -> Optional[dt.datetime]:
+    return None if math.isnan(ts) else _EPOCH + dt.timedelta(seconds=ts)
+
+
+class StoryView(Mapping):
+    """
+    Read-only, dict-like view of one row of a StoryBatch; supports everything code reading a
+    Story usually does (story['title'], .get(), `in`, iteration, dict(view))
+    """
+    __slots__ = ('_batch', '_row')
+
+    def __init__(self, batch: "StoryBatch", row: int):
+        self._batch = batch
+        self._row = row
+
+    def __getitem__(self, key: str) -> Any:
+        return self._batch.value(self._row, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._batch.row_fields(self._row))
+
+    def __len__(self) -> int:
+        return len(self._batch.row_fields(self._row))
+
+    def __repr__(self) -> str:
+        return f"StoryView({dict(self)!r})"
+
+
+class StoryBatch(Sequence):
+    """
+    Column store for stories. Build one with append()/extend() from Story dicts (with dates as
+    strings or as date objects), then read rows back as StoryViews or whole columns with
+    column(). `publish_days` holds publish dates as int32 days since 1970-01-01 (NO_DAY when
+    missing) and `indexed_ts` holds indexed dates as float seconds since the epoch (NaN when
+    missing). Rows only have the keys their story had; column() gives None for the rest.
+    """
+
+    def __init__(self, strings: Optional[StringTable] = None):
+        self.strings = strings if strings is not None else StringTable()
+        self.ids: List[str] = []
+        self.titles: List[Optional[str]] = []
+        self.urls: List[Optional[str]] = []
+        self.texts: Optional[List[Optional[str]]] = None  # only allocated once a story has text
+        self.publish_days = array('i')
+        self.indexed_ts = array('d')
+        self.codes: Dict[str, array] = {f: array('i') for f in CODED_FIELDS}
+        self._extras: Optional[Dict[int, Dict[str, Any]]] = None
+        self._fields: Dict[str, None] = {}  # insertion-ordered set of keys seen in any story
+        self._present = array('H')  # per row, the _COLUMN_BITS of the column fields its story had
+
+    def append(self, story: Mapping[str, Any]) -> None:
+        row = len(self.ids)
+        present = 0
+        for key in story:
+            if key not in self._fields:
+                self._fields[key] = None
+            present |= _COLUMN_BITS.get(key, 0)
+        self._present.append(present)
+        self.ids.append(story['id'])
+        self.titles.append(story.get('title'))
+        self.urls.append(story.get('url'))
+        if 'text' in story:
+            if self.texts is None:
+                self.texts = [None] * row
+            self.texts.append(story['text'])
+        elif self.texts is not None:
+            self.texts.append(None)
+        self.publish_days.append(date_to_day(story.get('publish_date')))
+        self.indexed_ts.append(_datetime_to_ts(story.get('indexed_date')))
+        for f in CODED_FIELDS:
+            self.codes[f].append(self.strings.code(story.get(f)))
+        extra = {k: v for k, v in story.items() if k not in _COLUMNS}
+        if extra:
+            if self._extras is None:
+                self._extras = {}
+            self._extras[row] = extra
+
+    def extend(self, stories: Iterable[Mapping[str, Any]]) -> None:
+        for s in stories:
+            self.append(s)
+
+    def value(self, row: int, key: str) -> Any:
+        if key not in self._fields:
+            raise KeyError(key)
+        bit = _COLUMN_BITS.get(key)
+        if bit is None:
+            extras = self._extras.get(row) if self._extras else None
+            if extras is None or key not in extras:
+                raise KeyError(key)
+            return extras[key]
+        if not self._present[row] & bit:
+            raise KeyError(key)
+        return self._column_value(row, key)
+
+    def _column_value(self, row: int, key: str) -> Any:
+        if key == 'id':
+            return self.ids[row]
+        if key == 'title':
+            return self.titles[row]
+        if key == 'url':
+            return self.urls[row]
+        if key == 'text':
+            return self.texts[row] if self.texts is not None else None
+        if key == 'publish_date':
+            return day_to_date(self.publish_days[row])
+        if key == 'indexed_date':
+            return _ts_to_datetime(self.indexed_ts[row])
+        return self.strings[self.codes[key][row]]
+
+    def row_fields(self, row: int) -> List[str]:
+        present = self._present[row]
+        extras = self._extras.get(row, {}) if self._extras else {}
+        return [k for k in self._fields
+                if (present & _COLUMN_BITS[k] if k in _COLUMN_BITS else k in extras)]
+
+    def column(self, key: str) -> List[Any]:
+        """
+        All values of one field, decoded (dates as date/datetime objects, codes as strings),
+        with None for stories that didn't have it
+        """
+        if key not in self._fields:
+            raise KeyError(key)
+        if key in _COLUMN_BITS:
+            return [self._column_value(row, key) for row in range(len(self))]
+        extras = self._extras or {}
+        return [extras.get(row, {}).get(key) for row in range(len(self))]
+
+    def to_dicts(self) -> List[Story]:
+        return [dict(view) for view in self]  # type: ignore[misc]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @overload
+    def __getitem__(self, index: int) -> StoryView:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[StoryView]:
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [StoryView(self, row) for row in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return StoryView(self, index)
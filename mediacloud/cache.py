@@ -0,0 +1,388 @@
+"""
+Client-side caches.
+
+Pass a ResponseCache to an API client and GET queries to the cacheable endpoints are answered
+from a local SQLite file when an unexpired copy exists, instead of spending a request from the
+rate limit budget:
+
+    cache = ResponseCache("~/.cache/mediacloud.sqlite")
+    search = SearchApi(MY_TOKEN, cache=cache)
+
+DirectoryCache is a smaller, in-process cache of source and collection metadata that
+DirectoryApi uses for its single-object lookups.
+
+CountStore keeps story_count_over_time results one day at a time, so SearchApi only has to
+fetch the days it hasn't seen (or that are recent enough to still change).
+"""
+import datetime as dt
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from mediacloud.dates import parse_date
+from mediacloud.types import CountOverTimePoint, JSONObj
+
+# parameters holding comma-separated id lists, where order doesn't change the results
+_ID_LIST_PARAMS = ('ss', 'cs')
+
+# parameters holding dates, which may arrive as date objects or as date/datetime strings
+_DATE_PARAMS = ('start', 'end')
+
+
+def _flatten(value: Any) -> list:
+    if isinstance(value, (list, tuple)):
+        return [v for item in value for v in _flatten(item)]
+    return [value]
+
+
+def canonical_params(params: Optional[Dict]) -> Dict[str, Any]:
+    """
+    Normalize query parameters so equivalent queries compare equal: id lists are split and
+    sorted, dates are reduced to YYYY-MM-DD, and sequences become lists.
+    """
+    canonical: Dict[str, Any] = {}
+    for k, v in (params or {}).items():
+        if v is None:
+            continue
+        if k in _ID_LIST_PARAMS:
+            ids = [i.strip() for item in _flatten(v) for i in str(item).split(",") if i.strip()]
+            canonical[k] = sorted(set(ids), key=lambda i: (len(i), i))
+        elif k in _DATE_PARAMS:
+            canonical[k] = v.isoformat()[:10] if isinstance(v, (dt.date, dt.datetime)) else str(v)[:10]
+        elif isinstance(v, (list, tuple)):
+            canonical[k] = [str(i) for i in _flatten(v)]
+        else:
+            canonical[k] = str(v)
+    return canonical
+
+
+def cache_key(endpoint: str, params: Optional[Dict]) -> str:
+    """
+    Stable hash of an endpoint plus its canonical parameters
+    """
+    text = json.dumps([endpoint, canonical_params(params)], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed, size-bounded LRU cache of decoded JSON responses.
+
+    Results for date ranges that ended more than `volatile_days` ago rarely change, so they
+    are kept for `historical_ttl` seconds; anything touching recent days is kept for
+    `recent_ttl` seconds, since counts move as indexing catches up. A TTL of None means entries
+    never expire (they can still be evicted). Once the cache holds more than `max_entries`
+    entries or `max_bytes` of response data, the least recently used entries are dropped.
+    """
+
+    # Aggregate endpoints whose answers depend only on their parameters. Story lists are left
+    # out by default because pages are large and usually read only once.
+    DEFAULT_ENDPOINTS = frozenset([
+        'search/total-count',
+        'search/count-over-time',
+        'search/count-by-source-week',
+        'search/count-by-source-over-interval',
+        'search/words',
+        'search/sources',
+        'search/languages',
+    ])
+
+    def __init__(self, path: str = ":memory:", max_entries: int = 10000, max_bytes: Optional[int] = None,
+                 historical_ttl: Optional[float] = 30 * 24 * 60 * 60, recent_ttl: Optional[float] = 60 * 60,
+                 volatile_days: int = 3, endpoints: Optional[Iterable[str]] = None):
+        if path != ":memory:":
+            path = os.path.expanduser(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.historical_ttl = historical_ttl
+        self.recent_ttl = recent_ttl
+        self.volatile_days = volatile_days
+        self.endpoints = frozenset(endpoints) if endpoints is not None else self.DEFAULT_ENDPOINTS
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # shared by the prefetch and worker threads, so all access goes through self._lock
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, body TEXT NOT NULL,
+                                size INTEGER NOT NULL, expires REAL, last_used REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def cacheable(self, endpoint: str) -> bool:
+        return endpoint in self.endpoints
+
+    def ttl_for(self, params: Optional[Dict]) -> Optional[float]:
+        """
+        How long a response to these parameters may be reused, in seconds
+        """
+        end = canonical_params(params).get('end')
+        if end:
+            try:
+                end_date = dt.date.fromisoformat(end)
+            except ValueError:
+                return self.recent_ttl
+            if end_date < dt.date.today() - dt.timedelta(days=self.volatile_days):
+                return self.historical_ttl
+        return self.recent_ttl
+
+    def get(self, endpoint: str, params: Optional[Dict]) -> Optional[JSONObj]:
+        key = cache_key(endpoint, params)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT body, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        # decode a fresh copy every time, since callers post-process results in place
+        return json.loads(row[0])
+
+    def set(self, endpoint: str, params: Optional[Dict], results: JSONObj) -> None:
+        body = json.dumps(results, separators=(',', ':'))
+        ttl = self.ttl_for(params)
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                             (cache_key(endpoint, params), endpoint, body, len(body),
+                              None if ttl is None else now + ttl, now))
+            self._evict()
+
+    def _evict(self) -> None:
+        entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        while entries > self.max_entries or (self.max_bytes is not None and size > self.max_bytes and entries):
+            key, entry_size = self._db.execute(
+                "SELECT key, size FROM responses ORDER BY last_used LIMIT 1").fetchone()
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            entries -= 1
+            size -= entry_size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        returns dict with hits, misses and evictions since this object was created, plus the
+        current number of entries and bytes stored
+        """
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, entries=entries, bytes=size)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU mapping whose entries also expire `ttl` seconds after being stored
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DirectoryCache:
+    """
+    Recently seen source and collection objects, keyed by id. DirectoryApi fills it from the
+    results of source/collection lookups and list pages, and DirectoryManagementApi invalidates
+    entries when it changes them. Share one instance between API objects so edits made through
+    one are seen by the others.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 15 * 60):
+        self.sources = TTLCache(maxsize, ttl)
+        self.collections = TTLCache(maxsize, ttl)
+
+    def get_source(self, source_id: int) -> Optional[JSONObj]:
+        source = self.sources.get(int(source_id))
+        # hand out copies, so callers annotating results can't corrupt the cache
+        return dict(source) if source is not None else None
+
+    def get_collection(self, collection_id: int) -> Optional[JSONObj]:
+        collection = self.collections.get(int(collection_id))
+        return dict(collection) if collection is not None else None
+
+    def add_sources(self, sources: Iterable[JSONObj]) -> None:
+        for s in sources:
+            if s.get('id') is not None:
+                self.sources.set(int(s['id']), dict(s))
+
+    def add_collections(self, collections: Iterable[JSONObj]) -> None:
+        for c in collections:
+            if c.get('id') is not None:
+                self.collections.set(int(c['id']), dict(c))
+
+    def invalidate_source(self, source_id: int) -> None:
+        self.sources.delete(int(source_id))
+
+    def invalidate_collection(self, collection_id: int) -> None:
+        self.collections.delete(int(collection_id))
+
+    def clear(self) -> None:
+        self.sources.clear()
+        self.collections.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return dict(source_hits=self.sources.hits, source_misses=self.sources.misses, sources=len(self.sources),
+                    collection_hits=self.collections.hits, collection_misses=self.collections.misses,
+                    collections=len(self.collections))
+
+
+class CountStore:
+    """
+    SQLite store of daily story counts, one row per (series, day), where a series is a query
+    plus its source, collection and platform filters. Pass one as `count_store=` to SearchApi and
+    story_count_over_time only asks the server for the days this store is missing, plus the last
+    `volatile_days` days (whose counts keep moving as indexing catches up) once they are more
+    than `volatile_ttl` seconds old:
+
+        search = SearchApi(MY_TOKEN, count_store=CountStore("~/.cache/mediacloud-counts.sqlite"))
+
+    Days inside a fetched range that the server returned no point for are remembered as empty,
+    so they aren't fetched again, and are left out of results just as the server leaves them out.
+    """
+
+    def __init__(self, path: str = ":memory:", volatile_days: int = 3, volatile_ttl: float = 60 * 60):
+        if path != ":memory:":
+            path = os.path.expanduser(path)
+        self.volatile_days = volatile_days
+        self.volatile_ttl = volatile_ttl
+        self.reused_days = 0
+        self.fetched_days = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS daily_counts (
+                                series TEXT NOT NULL, day TEXT NOT NULL, present INTEGER NOT NULL,
+                                count INTEGER, total_count INTEGER, ratio REAL, fetched REAL NOT NULL,
+                                PRIMARY KEY (series, day))""")
+
+    @staticmethod
+    def series_key(params: Dict) -> str:
+        """
+        Key for the count-over-time query these parameters describe, ignoring the date range
+        """
+        return cache_key('search/count-over-time', {k: v for k, v in params.items() if k not in _DATE_PARAMS})
+
+    def stale_ranges(self, series: str, start_date: dt.date, end_date: dt.date) -> List[Tuple[dt.date, dt.date]]:
+        """
+        The inclusive, contiguous sub-ranges of [start_date, end_date] that need fetching
+        """
+        now = time.time()
+        volatile_from = dt.date.today() - dt.timedelta(days=self.volatile_days)
+        with self._lock:
+            fetched = dict(self._db.execute(
+                "SELECT day, fetched FROM daily_counts WHERE series = ? AND day BETWEEN ? AND ?",
+                (series, start_date.isoformat(), end_date.isoformat())).fetchall())
+        ranges: List[Tuple[dt.date, dt.date]] = []
+        reused = 0
+        day = start_date
+        while day <= end_date:
+            when = fetched.get(day.isoformat())
+            if when is None or (day >= volatile_from and when < now - self.volatile_ttl):
+                if ranges and ranges[-1][1] == day - dt.timedelta(days=1):
+                    ranges[-1] = (ranges[-1][0], day)
+                else:
+                    ranges.append((day, day))
+            else:
+                reused += 1
+            day += dt.timedelta(days=1)
+        self.reused_days += reused
+        return ranges
+
+    def put(self, series: str, start_date: dt.date, end_date: dt.date, points: List[CountOverTimePoint]) -> None:
+        """
+        Store the points fetched for the inclusive range [start_date, end_date]
+        """
+        now = time.time()
+        by_day = {p['date'].isoformat()[:10]: p for p in points}
+        rows = []
+        day = start_date
+        while day <= end_date:
+            p = by_day.get(day.isoformat())
+            if p is None:
+                rows.append((series, day.isoformat(), 0, 0, 0, 0.0, now))
+            else:
+                rows.append((series, day.isoformat(), 1, p.get('count', 0), p.get('total_count', 0),
+                             p.get('ratio', 0.0), now))
+            day += dt.timedelta(days=1)
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO daily_counts VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+            self.fetched_days += len(rows)
+
+    def get(self, series: str, start_date: dt.date, end_date: dt.date) -> List[CountOverTimePoint]:
+        with self._lock:
+            rows = self._db.execute(
+                """SELECT day, count, total_count, ratio FROM daily_counts
+                   WHERE series = ? AND day BETWEEN ? AND ? AND present ORDER BY day""",
+                (series, start_date.isoformat(), end_date.isoformat())).fetchall()
+        return [CountOverTimePoint(date=parse_date(day), count=count, total_count=total, ratio=ratio)
+                for day, count, total, ratio in rows]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM daily_counts")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        returns dict with how many days were served from the store and fetched from the server
+        since this object was created, plus the number of stored days
+        """
+        with self._lock:
+            days = self._db.execute("SELECT COUNT(*) FROM daily_counts").fetchone()[0]
+        return dict(reused_days=self.reused_days, fetched_days=self.fetched_days, days=days)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
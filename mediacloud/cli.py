@@ -0,0 +1,330 @@
+"""
+Command-line interface: `python -m mediacloud export ...` (or the `mediacloud` script).
+
+The export command streams every story matching a query to a JSONL, CSV or Parquet file,
+one page at a time, so exports of any size run in constant memory:
+
+    python -m mediacloud export "climate AND protest" --start 2024-01-01 --end 2024-03-31 \\
+        -c 34412234 -o climate.jsonl.gz
+
+The API key is read from --token or the MC_API_TOKEN environment variable.
+"""
+import argparse
+import bz2
+import csv
+import datetime as dt
+import gzip
+import io
+import json
+import logging
+import lzma
+import os
+import sys
+import time
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Union
+
+import mediacloud.api
+from mediacloud.paging import Checkpoint
+from mediacloud.ratelimit import RateLimiter
+from mediacloud.types import Story
+
+CSV_FIELDS = ['id', 'publish_date', 'indexed_date', 'title', 'url', 'language', 'media_name', 'media_url']
+
+_COMPRESSORS: Dict[str, Callable[..., Any]] = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+_COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+_FORMAT_SUFFIXES = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl', '.csv': 'csv', '.parquet': 'parquet'}
+
+
+def _guess_formats(path: str):
+    """
+    (format, compression) implied by a file name like 'out.csv.gz'
+    """
+    root, ext = os.path.splitext(path)
+    compression = _COMPRESSION_SUFFIXES.get(ext)
+    if compression:
+        ext = os.path.splitext(root)[1]
+    return _FORMAT_SUFFIXES.get(ext), compression
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (dt.date, dt.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Can't serialize {type(value).__name__}")
+
+
+class _OutputFile:
+    """
+    Text output to a file, optionally compressed, that can be made durable at a known size.
+    mark() flushes what has been written and returns the file's size in bytes; compressed
+    output ends its stream there (gzip, bz2 and xz readers all read concatenated streams), so
+    the file up to that size is always complete. Opening with `resume_at` cuts the file back to
+    that size first and appends after it.
+    """
+
+    def __init__(self, path: str, compression: Optional[str] = None, resume_at: Optional[int] = None,
+                 append: bool = False):
+        self._compression = compression
+        self._raw: IO[bytes] = open(path, 'r+b' if append else 'wb')
+        if resume_at is not None:
+            self._raw.truncate(resume_at)
+        self._raw.seek(0, os.SEEK_END)
+        self._text: Optional[IO[str]] = None
+
+    def _stream(self) -> IO[str]:
+        if self._text is None:
+            target = _COMPRESSORS[self._compression](self._raw, 'wb') if self._compression else self._raw
+            self._text = io.TextIOWrapper(target, encoding='utf-8', newline='')  # type: ignore[arg-type]
+        return self._text
+
+    def write(self, s: str) -> int:
+        return self._stream().write(s)
+
+    def flush(self) -> None:
+        if self._text is not None:
+            self._text.flush()
+
+    def mark(self) -> int:
+        if self._text is not None:
+            if self._compression:
+                self._text.close()  # ends the compressed stream; the file itself stays open
+                self._text = None
+            else:
+                self._text.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        return self._raw.tell()
+
+    def close(self) -> None:
+        if self._text is not None:
+            self._text.close()
+        self._raw.close()
+
+
+class _CountingWriter:
+    """
+    Text stream wrapper that counts the bytes it passes on (before compression)
+    """
+
+    def __init__(self, target: Union[IO[str], _OutputFile]):
+        self._target = target
+        self.bytes = 0
+
+    def write(self, s: str) -> int:
+        self.bytes += len(s.encode('utf-8'))
+        return self._target.write(s)
+
+    def flush(self) -> None:
+        self._target.flush()
+
+
+class StoryWriter:
+    """
+    Writes stories to a text output as JSON lines or CSV
+    """
+
+    def __init__(self, out: Union[IO[str], _OutputFile], fmt: str, fields: List[str], header: bool = True):
+        self._out = _CountingWriter(out)
+        self._fmt = fmt
+        self._csv: Optional[csv.DictWriter] = None
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(self._out, fieldnames=fields, extrasaction='ignore')
+            if header:
+                self._csv.writeheader()
+
+    @property
+    def bytes(self) -> int:
+        return self._out.bytes
+
+    def write(self, story: Story) -> None:
+        if self._csv is not None:
+            self._csv.writerow(story)
+        else:
+            self._out.write(json.dumps(story, default=_json_default, ensure_ascii=False))
+            self._out.write('\n')
+
+    def flush(self) -> None:
+        self._out.flush()
+
+
+class Progress:
+    """
+    Periodically logs how many stories and bytes have been written, and at what rate
+    """
+
+    def __init__(self, every_secs: float, stream: Optional[IO[str]] = None):
+        self.stories = 0
+        self.bytes = 0
+        self._every = every_secs
+        self._stream = stream
+        self._start = self._last = time.monotonic()
+
+    def update(self, stories: int, bytes_written: int, force: bool = False) -> None:
+        self.stories = stories
+        self.bytes = bytes_written
+        now = time.monotonic()
+        if force or (self._every > 0 and now - self._last >= self._every):
+            self._last = now
+            stream = self._stream or sys.stderr
+            stream.write(self.summary() + '\n')
+            stream.flush()
+
+    def summary(self) -> str:
+        elapsed = max(time.monotonic() - self._start, 1e-9)
+        return (f"{self.stories:,} stories, {self.bytes / 1e6:,.1f} MB in {elapsed:,.1f}s "
+                f"({self.stories / elapsed:,.1f} stories/s, {self.bytes / elapsed / 1e6:,.2f} MB/s)")
+
+
+def _stories(search: mediacloud.api.SearchApi, args, checkpoint: Optional[Checkpoint] = None) -> Iterator[Story]:
+    common = dict(collection_ids=args.collection, source_ids=args.source, platform=args.platform,
+                  expanded=args.expanded, sort_order=args.sort_order, page_size=args.page_size)
+    if args.shards > 1:
+        return search.iter_stories_sharded(args.query, args.start, args.end, shards=args.shards,
+                                           max_workers=args.workers, prefetch=args.prefetch, **common)
+    return search.iter_stories(args.query, args.start, args.end, prefetch=args.prefetch, checkpoint=checkpoint,
+                               **common)
+
+
+def _export_parquet(stories: Iterator[Story], path: str, progress: Progress, rows_per_group: int) -> None:
+    from mediacloud.batch import StoryBatch
+    from mediacloud.columnar import ParquetStoryWriter
+
+    with ParquetStoryWriter(path) as writer:
+        batch = StoryBatch()
+        for story in stories:
+            batch.append(story)
+            if len(batch) >= rows_per_group:
+                writer.write(batch)
+                progress.update(writer.rows, os.path.getsize(path))
+                batch = StoryBatch(batch.strings)
+        if len(batch):
+            writer.write(batch)
+    progress.update(writer.rows, os.path.getsize(path), force=True)
+
+
+def _resuming(checkpoint: Checkpoint, output: str) -> bool:
+    """
+    Whether a loaded checkpoint continues an earlier run's output. Exits if that output is
+    gone or shorter than at the last save, as carrying on would leave out every story
+    written before it.
+    """
+    if not (checkpoint.emitted or checkpoint.pagination_token or checkpoint.done):
+        return False
+    size = os.path.getsize(output) if os.path.exists(output) else None
+    if size is None or size < (checkpoint.output_offset or 0):
+        raise SystemExit(f"{output} is missing or shorter than when {checkpoint.path} was saved; "
+                         "restore it, or delete the checkpoint to start the export over")
+    return True
+
+
+def export(args) -> int:
+    token = args.token or os.getenv('MC_API_TOKEN')
+    if not token:
+        raise SystemExit("no API key: pass --token or set MC_API_TOKEN")
+    limiter = RateLimiter(per_minute=args.rate_limit) if args.rate_limit else None
+    search = mediacloud.api.SearchApi(token, rate_limiter=limiter)
+    if args.base_url:
+        search.BASE_API_URL = args.base_url
+
+    fmt, compression = _guess_formats(args.output) if args.output != '-' else (None, None)
+    fmt = args.format or fmt or 'jsonl'
+    compression = args.compress or compression
+    progress = Progress(args.progress_secs)
+
+    if fmt == 'parquet':
+        if args.output == '-':
+            raise SystemExit("parquet output needs a file name (-o)")
+        if args.checkpoint:
+            raise SystemExit("--checkpoint can't resume a Parquet file; use jsonl or csv")
+        _export_parquet(_stories(search, args), args.output, progress, args.page_size or 1000)
+        return 0
+
+    checkpoint = None
+    if args.checkpoint:
+        if args.output == '-':
+            raise SystemExit("--checkpoint needs an output file (-o) to append to")
+        if args.shards > 1:
+            raise SystemExit("--checkpoint can't be combined with --shards")
+        checkpoint = Checkpoint(args.checkpoint)
+    fields = CSV_FIELDS + (['text'] if args.expanded else [])
+    out: Optional[_OutputFile] = None
+    writer: Optional[StoryWriter] = None
+
+    def open_output() -> None:
+        # when resuming, cut off whatever the previous run wrote after its last checkpoint
+        nonlocal out, writer
+        resuming = checkpoint is not None and _resuming(checkpoint, args.output)
+        out = _OutputFile(args.output, compression, append=resuming,
+                          resume_at=checkpoint.output_offset if resuming and checkpoint else None)
+        writer = StoryWriter(out, fmt, fields, header=not resuming)
+
+    def save_offset() -> None:
+        if out is not None and checkpoint is not None:
+            checkpoint.output_offset = out.mark()
+
+    if args.output == '-':
+        writer = StoryWriter(sys.stdout, fmt, fields)
+    elif checkpoint is not None:
+        # the output is opened once the checkpoint has been read, so it knows where to resume
+        checkpoint.on_start = open_output
+        checkpoint.on_save = save_offset
+    else:
+        open_output()
+    try:
+        count = 0
+        for story in _stories(search, args, checkpoint):
+            writer.write(story)  # type: ignore[union-attr]
+            count += 1
+            progress.update(count, writer.bytes)  # type: ignore[union-attr]
+        if writer is not None:
+            writer.flush()
+        progress.update(count, writer.bytes if writer is not None else 0, force=True)
+    finally:
+        if out is not None:
+            out.close()
+    return 0
+
+
+def _date(value: str) -> dt.date:
+    return dt.date.fromisoformat(value)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="mediacloud", description="Media Cloud API command line tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ex = commands.add_parser('export', help="stream all stories matching a query to a file")
+    ex.add_argument('query', help="search query, in the same syntax as the web tools")
+    ex.add_argument('--start', type=_date, required=True, help="first publication date (YYYY-MM-DD)")
+    ex.add_argument('--end', type=_date, required=True, help="last publication date (YYYY-MM-DD)")
+    ex.add_argument('-c', '--collection', type=int, action='append', default=[], help="collection id (repeatable)")
+    ex.add_argument('-s', '--source', type=int, action='append', default=[], help="source id (repeatable)")
+    ex.add_argument('--platform', default=None)
+    ex.add_argument('--expanded', action='store_true', help="include full text (needs a staff API key)")
+    ex.add_argument('--sort-order', choices=['asc', 'desc'], default=None)
+    ex.add_argument('--page-size', type=int, default=None)
+    ex.add_argument('-o', '--output', default='-',
+                    help="output file (default: stdout); the format and compression are guessed from names "
+                         "like out.csv.gz")
+    ex.add_argument('-f', '--format', choices=['jsonl', 'csv', 'parquet'], default=None)
+    ex.add_argument('--compress', choices=sorted(_COMPRESSORS), default=None)
+    ex.add_argument('--shards', type=int, default=1, help="split the date range into this many shards, "
+                                                          "fetched concurrently")
+    ex.add_argument('--workers', type=int, default=None, help="max concurrent requests when sharding")
+    ex.add_argument('--prefetch', type=int, default=1, help="pages to fetch ahead of the writer, per shard")
+    ex.add_argument('--checkpoint', default=None,
+                    help="file to record progress in after each page; rerunning the same export with the same "
+                         "checkpoint appends to the output from where the last run stopped")
+    ex.add_argument('--rate-limit', type=float, default=None,
+                    help="requests per minute (default: the client's RATE_LIMIT_PER_MINUTE)")
+    ex.add_argument('--token', default=None, help="API key (default: $MC_API_TOKEN)")
+    ex.add_argument('--base-url', default=None, help="API base URL, for staging/dev servers")
+    ex.add_argument('--progress-secs', type=float, default=10.0,
+                    help="how often to report throughput on stderr (0 for only at the end)")
+    ex.set_defaults(func=export)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    args = build_parser().parse_args(argv)
+    return args.func(args)
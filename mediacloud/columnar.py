@@ -0,0 +1,185 @@
+"""
+Converters from search results to Arrow record batches, NumPy arrays and Parquet files.
+
+They read StoryBatch columns directly (see mediacloud.batch), so exporting a crawl doesn't
+go through a dict per story first:
+
+    with ParquetStoryWriter("weather.parquet") as out:
+        for batch in search.iter_story_batches("weather", start, end, collection_ids=[cid]):
+            out.write(batch)
+
+Requires the optional pyarrow and numpy dependencies (`pip install mediacloud[arrow]`).
+"""
+import datetime as dt
+import importlib
+from typing import Any, Dict, Iterable, List, Union
+
+from mediacloud.batch import CODED_FIELDS, NO_DAY, StoryBatch
+from mediacloud.types import CountOverTimePoint, SourceIntervalAttention, Story
+
+
+def _require(module: str) -> Any:
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(f"{module} is needed for columnar export; "
+                          "install with `pip install mediacloud[arrow]`") from e
+
+
+def _as_batch(stories: Union[StoryBatch, Iterable[Story]]) -> StoryBatch:
+    if isinstance(stories, StoryBatch):
+        return stories
+    batch = StoryBatch()
+    batch.extend(stories)
+    return batch
+
+
+def story_schema():
+    """
+    The Arrow schema every story record batch uses, so batches from different pages can go in
+    one file or table
+    """
+    pa = _require('pyarrow')
+    coded = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('id', pa.string()),
+        ('title', pa.string()),
+        ('url', pa.string()),
+        ('language', coded),
+        ('media_name', coded),
+        ('media_url', coded),
+        ('publish_date', pa.date32()),
+        ('indexed_date', pa.timestamp('us')),
+        ('text', pa.string()),
+    ])
+
+
+def story_columns_numpy(stories: Union[StoryBatch, Iterable[Story]]) -> Dict[str, Any]:
+    """
+    The numeric columns of a batch as NumPy arrays: publish_date as datetime64[D] (NaT when
+    missing), indexed_date as datetime64[us], and the coded string fields as int32 codes into
+    `batch.strings` (0 meaning missing). The int32 arrays share memory with the batch.
+    """
+    np = _require('numpy')
+    batch = _as_batch(stories)
+    days = np.frombuffer(batch.publish_days, dtype=np.int32)
+    publish = days.astype('datetime64[D]')
+    publish[days == NO_DAY] = np.datetime64('NaT', 'D')
+    ts = np.frombuffer(batch.indexed_ts, dtype=np.float64)
+    indexed = np.full(len(ts), np.datetime64('NaT', 'us'), dtype='datetime64[us]')
+    present = ~np.isnan(ts)
+    indexed[present] = np.round(ts[present] * 1e6).astype(np.int64).astype('datetime64[us]')
+    columns = dict(publish_date=publish, indexed_date=indexed)
+    for f in CODED_FIELDS:
+        columns[f] = np.frombuffer(batch.codes[f], dtype=np.int32)
+    return columns
+
+
+def stories_to_arrow(stories: Union[StoryBatch, Iterable[Story]]):
+    """
+    Build a pyarrow.RecordBatch (with story_schema()) from a StoryBatch or an iterable of
+    stories. Fields outside the schema are dropped.
+    """
+    pa = _require('pyarrow')
+    batch = _as_batch(stories)
+    numeric = story_columns_numpy(batch)
+    schema = story_schema()
+    # code 0 is None, which Parquet can't store inside a dictionary, so shift it out as a null
+    dictionary = pa.array(batch.strings.values[1:], type=pa.string())
+    columns: List[Any] = [
+        pa.array(batch.ids, type=pa.string()),
+        pa.array(batch.titles, type=pa.string()),
+        pa.array(batch.urls, type=pa.string()),
+    ]
+    for f in CODED_FIELDS:
+        codes = numeric[f]
+        columns.append(pa.DictionaryArray.from_arrays(pa.array(codes - 1, mask=(codes == 0)), dictionary))
+    columns.append(pa.array(numeric['publish_date'], type=pa.date32()))
+    columns.append(pa.array(numeric['indexed_date'], type=pa.timestamp('us')))
+    columns.append(pa.array(batch.texts if batch.texts is not None else [None] * len(batch), type=pa.string()))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def counts_to_numpy(points: List[CountOverTimePoint]):
+    """
+    story_count_over_time results as a NumPy structured array with date, count, total_count
+    and ratio fields
+    """
+    np = _require('numpy')
+    out = np.zeros(len(points), dtype=[('date', 'datetime64[D]'), ('count', np.int64),
+                                       ('total_count', np.int64), ('ratio', np.float64)])
+    for i, p in enumerate(points):
+        day = p['date']
+        out[i] = (np.datetime64(day.isoformat()[:10] if isinstance(day, (dt.date, dt.datetime)) else str(day)[:10]),
+                  p.get('count', 0), p.get('total_count', 0), p.get('ratio', 0.0))
+    return out
+
+
+def counts_to_arrow(points: List[CountOverTimePoint]):
+    """
+    story_count_over_time results as a pyarrow.RecordBatch
+    """
+    pa = _require('pyarrow')
+    arr = counts_to_numpy(points)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(arr['date'], type=pa.date32()), pa.array(arr['count']), pa.array(arr['total_count']),
+         pa.array(arr['ratio'])],
+        names=['date', 'count', 'total_count', 'ratio'])
+
+
+def source_interval_to_arrow(rows: List[SourceIntervalAttention]):
+    """
+    stories_by_source_over_interval results as a pyarrow.RecordBatch, with media_name and
+    interval dictionary-encoded
+    """
+    pa = _require('pyarrow')
+    names = ('media_name', 'interval', 'bucket', 'matching_stories', 'total_stories', 'ratio')
+    columns: Dict[str, List[Any]] = {k: [] for k in names}
+    for row in rows:
+        for k, values in columns.items():
+            values.append(row.get(k))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(columns['media_name'], type=pa.string()).dictionary_encode(),
+         pa.array(columns['interval'], type=pa.string()).dictionary_encode(),
+         pa.array(columns['bucket'], type=pa.string()),
+         pa.array(columns['matching_stories'], type=pa.int64()),
+         pa.array(columns['total_stories'], type=pa.int64()),
+         pa.array(columns['ratio'], type=pa.float64())],
+        names=list(columns.keys()))
+
+
+class ParquetStoryWriter:
+    """
+    Streams story batches into one Parquet file, a row group per write(), so only the batch
+    being written is held in memory
+    """
+
+    def __init__(self, path: str, compression: str = 'zstd', **writer_kwargs):
+        pq = _require('pyarrow.parquet')
+        self.rows = 0
+        self._writer = pq.ParquetWriter(path, story_schema(), compression=compression, **writer_kwargs)
+
+    def write(self, stories: Union[StoryBatch, Iterable[Story]]) -> None:
+        record_batch = stories_to_arrow(stories)
+        self._writer.write_batch(record_batch)
+        self.rows += record_batch.num_rows
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_parquet(batches: Iterable[Union[StoryBatch, Iterable[Story]]], path: str,
+                  compression: str = 'zstd') -> int:
+    """
+    Write every batch to a Parquet file at `path`; returns the number of rows written
+    """
+    with ParquetStoryWriter(path, compression) as writer:
+        for batch in batches:
+            writer.write(batch)
+    return writer.rows
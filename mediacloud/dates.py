@@ -0,0 +1,94 @@
+"""
+Conversion of the date strings in search results.
+
+Stories come back with `publish_date` as 'YYYY-MM-DD HH:MM:SS' (almost always midnight) and
+`indexed_date` as an ISO datetime. A crawl sees the same few hundred publish dates over and
+over, so those are parsed once and memoized in a bounded LRU cache (date objects are immutable,
+so stories can share them). Indexed dates are nearly unique per story, where a cache would only
+add overhead, so they are parsed directly.
+
+How stories' dates are left is picked by a mode, set per client with `SearchApi.DATE_MODE`:
+
+* OBJECTS (default): dt.date publish dates and dt.datetime indexed dates
+* RAW: the server's strings, untouched, for callers that never look at the dates
+* EPOCH: int seconds since 1970-01-01 for publish dates and float seconds for indexed dates,
+  with naive times (what the server sends) read as UTC
+"""
+import datetime as dt
+import functools
+from typing import Iterable, Optional, Union
+
+from mediacloud.types import Story
+
+OBJECTS = 'objects'
+RAW = 'raw'
+EPOCH = 'epoch'
+DATE_MODES = (OBJECTS, RAW, EPOCH)
+
+# distinct publish dates remembered; a few years of days fits comfortably
+DATE_CACHE_SIZE = 4096
+
+_EPOCH = dt.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(value: str) -> dt.date:
+    """
+    The date part of an ES date or datetime string, memoized
+    """
+    return dt.date.fromisoformat(value[:10])
+
+
+@functools.lru_cache(maxsize=DATE_CACHE_SIZE)
+def date_epoch(value: str) -> int:
+    """
+    Seconds since 1970-01-01 at midnight UTC of the date part of an ES date string, memoized
+    """
+    return (parse_date(value).toordinal() - _EPOCH_ORDINAL) * 86400
+
+
+def datetime_epoch(value: Union[str, dt.datetime]) -> float:
+    """
+    Seconds since the epoch of an ISO datetime string or datetime; naive values are read as UTC
+    """
+    if isinstance(value, str):
+        value = dt.datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH).total_seconds()
+
+
+def story_day(value: Union[None, str, int, float, dt.date]) -> Optional[dt.date]:
+    """
+    The day of a story's publish_date as left by any of the date modes (None if it has none)
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, dt.datetime):
+        return value.date()
+    if isinstance(value, dt.date):
+        return value
+    if isinstance(value, str):
+        return parse_date(value[:10])
+    return dt.date.fromordinal(_EPOCH_ORDINAL + int(value // 86400))
+
+
+def convert_story_dates(stories: Iterable[Story], mode: str = OBJECTS) -> None:
+    """
+    Convert the publish_date and indexed_date of each story _in place_, as `mode` says
+    """
+    if mode == RAW:
+        return
+    if mode == OBJECTS:
+        date, datetime = parse_date, dt.datetime.fromisoformat
+    elif mode == EPOCH:
+        date, datetime = date_epoch, datetime_epoch  # type: ignore[assignment]
+    else:
+        raise ValueError(f"Unknown date mode {mode!r}; use one of {', '.join(DATE_MODES)}")
+    for s in stories:
+        publish: Optional[str] = s['publish_date']  # type: ignore[assignment]
+        indexed: Optional[str] = s['indexed_date']  # type: ignore[assignment]
+        # key the cache on the day alone, in case some publish dates carry a time
+        s['publish_date'] = date(publish[:10]) if publish else None
+        s['indexed_date'] = datetime(indexed) if indexed else None
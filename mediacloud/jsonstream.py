@@ -0,0 +1,145 @@
+"""
+Incremental parsing of large JSON responses.
+
+The list endpoints answer with one object holding a (possibly huge) array plus a few small
+fields, e.g. `{"stories": [...], "pagination_token": "..."}`. StreamedArray walks such a
+body as chunks arrive from the socket and hands back the array elements one at a time, so only
+the element being parsed needs to be held in memory, not the whole page.
+"""
+import codecs
+import json
+import re
+from typing import Any, Callable, Dict, Generator, Iterable, Iterator, Optional
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# once this much of the buffer has been consumed, drop it
+_COMPACT_AT = 1 << 16
+
+
+class _Reader:
+    """
+    Text buffer over an iterable of byte chunks, decoding UTF-8 incrementally
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self) -> bool:
+        """
+        Append the next chunk to the buffer; returns False once the input is exhausted
+        """
+        if self.eof:
+            return False
+        if self.pos >= _COMPACT_AT:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self.buf += self._decoder.decode(chunk)
+                return True
+        self.buf += self._decoder.decode(b'', final=True)
+        self.eof = True
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character without consuming it ('' at end of input)
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()  # type: ignore[union-attr]  # \s* always matches
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise json.JSONDecodeError(f"Expecting one of {chars!r}", self.buf, self.pos)
+        self.pos += 1
+        return c
+
+    def value(self) -> Any:
+        """
+        Decode one complete JSON value, reading more input until it is available
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+                continue
+            # a number at the very end of the buffer might continue in the next chunk
+            if end == len(self.buf) and not self.eof:
+                self.more()
+                continue
+            self.pos = end
+            return value
+
+
+class StreamedArray:
+    """
+    Iterator over the elements of one array member of a streamed JSON object. The object's other
+    members are collected into `meta` as the parser passes them, so all of them are there once
+    iteration has finished. Call close() to stop early and release the underlying response;
+    `on_close` is called the first time it is, whether or not iteration ever started, and when
+    an unclosed array is garbage collected.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], key: str, on_close: Optional[Callable[[], None]] = None):
+        self.key = key
+        self.meta: Dict[str, Any] = {}
+        self._chunks = chunks
+        # _parse is kept off self, so a dropped array is freed (and closed) straight away
+        self._items = self._parse(_Reader(chunks), key, self.meta)
+        self._on_close = on_close
+
+    def __iter__(self) -> Iterator[Any]:
+        return self._items
+
+    def close(self) -> None:
+        self._items.close()
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+
+    def __del__(self) -> None:
+        self.close()
+
+    @staticmethod
+    def _parse(reader: _Reader, key: str, meta: Dict[str, Any]) -> Generator[Any, None, None]:
+        reader.expect('{')
+        if reader.peek() == '}':
+            reader.pos += 1
+            return
+        while True:
+            name = reader.value()
+            if not isinstance(name, str):
+                raise json.JSONDecodeError("Expecting property name", reader.buf, reader.pos)
+            reader.expect(':')
+            if name == key and reader.peek() == '[':
+                reader.pos += 1
+                if reader.peek() == ']':
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield reader.value()
+                        if reader.expect(',]') == ']':
+                            break
+            else:
+                meta[name] = reader.value()
+            if reader.expect(',}') == '}':
+                break
+        if reader.peek():
+            raise json.JSONDecodeError("Extra data", reader.buf, reader.pos)
@@ -0,0 +1,177 @@
+"""
+Per-request instrumentation.
+
+Every API client accepts `instruments=`, a list of callables that get a RequestMetrics dict
+after each call: endpoint, status, attempts, the time spent waiting on the rate limiter, on
+retries, on the server, downloading and decoding, and the response size before and after
+decompression. Any function will do:
+
+    search = SearchApi(MY_TOKEN, instruments=[lambda m: print(m['endpoint'], m['total_secs'])])
+
+Metrics is a ready-made instrument that keeps Prometheus-style counters and histograms and
+renders them in the Prometheus text exposition format:
+
+    metrics = Metrics()
+    search = SearchApi(MY_TOKEN, instruments=[metrics])
+    ...
+    print(metrics.render())
+"""
+import bisect
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, cast
+
+from mediacloud.types import RequestMetrics
+
+Instrument = Callable[[RequestMetrics], None]
+
+# the timed phases of a request, as named in RequestMetrics and in the `phase` label
+PHASES = ('limiter_wait', 'retry_wait', 'server', 'download', 'decode', 'total')
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def endpoint_label(endpoint: str) -> str:
+    """
+    An endpoint with ids and query strings taken out, so e.g. every `sources/sources/<id>/`
+    lookup is counted under one label
+    """
+    return _ID_SEGMENT.sub('/{id}', endpoint.split('?', 1)[0])
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with a running sum and count, as Prometheus defines it
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        running, out = 0, []
+        for c in self.counts:
+            running += c
+            out.append(running)
+        return out
+
+
+class Metrics:
+    """
+    Instrument that aggregates RequestMetrics into counters and histograms labelled by method
+    and endpoint (plus status for the request counter, and phase for the timings). Pass one
+    instance to any number of clients; it is thread-safe.
+    """
+
+    SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+    def __init__(self, prefix: str = 'mediacloud'):
+        self.prefix = prefix
+        self.requests: Dict[Labels, int] = {}
+        self.retries: Dict[Labels, int] = {}
+        self.cache_hits: Dict[Labels, int] = {}
+        self.errors: Dict[Labels, int] = {}
+        self.response_bytes: Dict[Labels, Histogram] = {}
+        self.seconds: Dict[Labels, Histogram] = {}
+        self.wire_bytes: Dict[Labels, int] = {}
+        self.decoded_bytes: Dict[Labels, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, m: RequestMetrics) -> None:
+        labels: Labels = (('method', m.get('method', '')), ('endpoint', endpoint_label(m.get('endpoint', ''))))
+        with self._lock:
+            if m.get('cached'):
+                self.cache_hits[labels] = self.cache_hits.get(labels, 0) + 1
+            else:
+                status = m.get('status')
+                key = labels + (('status', str(status) if status is not None else 'none'),)
+                self.requests[key] = self.requests.get(key, 0) + 1
+                if m.get('attempts', 1) > 1:
+                    self.retries[labels] = self.retries.get(labels, 0) + m['attempts'] - 1
+                if 'response_bytes' in m:
+                    self._histogram(self.response_bytes, labels, self.BYTES_BUCKETS).observe(m['response_bytes'])
+                wire_bytes = m.get('wire_bytes')
+                if wire_bytes is not None:
+                    key = labels + (('encoding', m.get('content_encoding') or 'identity'),)
+                    self.wire_bytes[key] = self.wire_bytes.get(key, 0) + wire_bytes
+                    self.decoded_bytes[key] = self.decoded_bytes.get(key, 0) + m.get('response_bytes', 0)
+            error = m.get('error')
+            if error:
+                key = labels + (('error', error),)
+                self.errors[key] = self.errors.get(key, 0) + 1
+            for phase in PHASES:
+                value = cast(Optional[float], m.get(f'{phase}_secs'))
+                if value is not None:
+                    self._histogram(self.seconds, labels + (('phase', phase),), self.SECONDS_BUCKETS).observe(value)
+
+    @staticmethod
+    def _histogram(family: Dict[Labels, Histogram], labels: Labels, buckets: Sequence[float]) -> Histogram:
+        h = family.get(labels)
+        if h is None:
+            h = family[labels] = Histogram(buckets)
+        return h
+
+    def transfer(self) -> Dict[str, Dict[str, float]]:
+        """
+        Bytes transferred vs. bytes after decompression, per endpoint, with their ratio; only
+        responses whose transferred size is known are counted
+        """
+        out: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for labels, wire in self.wire_bytes.items():
+                endpoint = dict(labels)['endpoint']
+                totals = out.setdefault(endpoint, dict(wire_bytes=0, decoded_bytes=0))
+                totals['wire_bytes'] += wire
+                totals['decoded_bytes'] += self.decoded_bytes[labels]
+        for totals in out.values():
+            totals['ratio'] = totals['wire_bytes'] / totals['decoded_bytes'] if totals['decoded_bytes'] else 1.0
+        return out
+
+    def render(self) -> str:
+        """
+        Everything collected so far, in the Prometheus text exposition format
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, help_text, family in (
+                    ('requests_total', "API requests by response status", self.requests),
+                    ('retries_total', "Retried HTTP requests", self.retries),
+                    ('cache_hits_total', "Calls answered from the response cache", self.cache_hits),
+                    ('errors_total', "Calls that raised, by exception type", self.errors),
+                    ('wire_bytes_total', "Response bytes transferred, by content encoding", self.wire_bytes),
+                    ('decoded_bytes_total', "Response bytes after decompression, by content encoding",
+                     self.decoded_bytes)):
+                lines += [f"# HELP {self.prefix}_{name} {help_text}", f"# TYPE {self.prefix}_{name} counter"]
+                lines += [f"{self.prefix}_{name}{_format_labels(labels)} {value}"
+                          for labels, value in sorted(family.items())]
+            for name, help_text, histograms in (
+                    ('request_seconds', "Time spent per request phase", self.seconds),
+                    ('response_bytes', "Response body sizes", self.response_bytes)):
+                lines += [f"# HELP {self.prefix}_{name} {help_text}", f"# TYPE {self.prefix}_{name} histogram"]
+                for labels, h in sorted(histograms.items()):
+                    for bound, count in zip(h.buckets, h.cumulative()):
+                        lines.append(f"{self.prefix}_{name}_bucket{_format_labels(labels, (('le', repr(float(bound))),))} "
+                                     f"{count}")
+                    lines.append(f"{self.prefix}_{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{self.prefix}_{name}_sum{_format_labels(labels)} {h.sum}")
+                    lines.append(f"{self.prefix}_{name}_count{_format_labels(labels)} {h.count}")
+        return '\n'.join(lines) + '\n'
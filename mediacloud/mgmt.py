@@ -8,18 +8,21 @@ update/patch methods not yet tested!!!
 
 ALL arguments are keyword only, for safety!
 """
-from typing import TypeAlias
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, TypeAlias
 
-from mediacloud.api import BaseApi
+from mediacloud.api import DirectoryApi
+from mediacloud.types import ReconcileFailure, ReconcileReport, Source
 
 _EMPTY = object()
 
 _Params: TypeAlias = dict
 
 
-class DirectoryManagementApi(BaseApi):  # XXX maybe extend DirectoryApi???
+class _ManagementMixin:
     """
-    Class for Directory Management
+    Checking of create/update arguments, shared by DirectoryManagementApi and
+    mediacloud.aio.AsyncDirectoryManagementApi
     """
 
     def _params(self, what: str, kws: dict, params: list[str]) -> _Params:
@@ -37,8 +40,6 @@ class DirectoryManagementApi(BaseApi):  # XXX maybe extend DirectoryApi???
             raise ValueError(f"Unknown {what} params {extra}")
         return ret
 
-    ################ CollectionsViewSet
-
     def _collection_params(self, kws: dict) -> _Params:
         """
         helper for collection_{create,update}
@@ -46,6 +47,30 @@ class DirectoryManagementApi(BaseApi):  # XXX maybe extend DirectoryApi???
         return self._params("collection", kws,
                             ['name', 'notes', 'public', 'featured', 'managed', 'monitored'])
 
+    def _source_params(self, kws: dict) -> _Params:
+        """
+        helper for source_{create,update}
+        """
+        return self._params("source", kws,
+                            ['name', 'label', 'homepage', 'platform',
+                             'url_search_string', 'notes', 'media_type',
+                             'pub_state', 'pub_country', 'primary_language'])
+
+
+class DirectoryManagementApi(_ManagementMixin, DirectoryApi):
+    """
+    Class for Directory Management
+
+    Extends DirectoryApi so that edits made here invalidate the cached source and collection
+    objects its lookups return (pass the same directory_cache to other DirectoryApi objects to
+    have them see edits too).
+    """
+
+    # how many association changes collection_reconcile makes at once (all still rate limited)
+    RECONCILE_MAX_WORKERS = 4
+
+    ################ CollectionsViewSet
+
     def collection_create(self, **kwargs) -> dict:
         params = self._collection_params(kwargs)
         if 'name' not in params or not params['name']:
@@ -63,32 +88,26 @@ class DirectoryManagementApi(BaseApi):  # XXX maybe extend DirectoryApi???
         params = self._collection_params(kwargs)
         if not params:
             raise ValueError("no parameters for collection_update?")
-        return self._query(f'sources/collections/{collection_id}/', params, "PATCH")
+        try:
+            return self._query(f'sources/collections/{collection_id}/', params, "PATCH")
+        finally:
+            self._directory_cache.invalidate_collection(collection_id)
 
     # for testing/cleanup:
     def collection_delete(self, collection_id: int) -> dict:
-        return self._query(f'sources/collections/{collection_id}/', None, "DELETE")
+        try:
+            return self._query(f'sources/collections/{collection_id}/', None, "DELETE")
+        finally:
+            self._directory_cache.invalidate_collection(collection_id)
 
-    def collection_source_list(self, *, collection_id: int) -> list[dict]:
+    def collection_source_list(self, *, collection_id: int) -> list[Source]:
         """
-        returns list of source objects for a collection
+        returns list of source objects for a collection (all of them, fetching pages concurrently)
         """
-        # XXX should do pagination!!!!!!!
-        ret = self._query(f'sources/sources/?collection_id={collection_id}', None, "GET")
-        # returns {'count': n, 'next': ..., 'previous': ..., 'results': [{...}, ...]}
-        return ret['results']
+        return list(self.iter_sources(collection_id=collection_id))
 
     ################ SourcesViewSet
 
-    def _source_params(self, kws: dict) -> _Params:
-        """
-        helper for source_{create,update}
-        """
-        return self._params("source", kws,
-                            ['name', 'label', 'homepage', 'platform',
-                             'url_search_string', 'notes', 'media_type',
-                             'pub_state', 'pub_country', 'primary_language'])
-
     def source_create(self, **kwargs) -> dict:
         params = self._source_params(kwargs)
         for p in ['name', 'homepage']:
@@ -104,11 +123,17 @@ class DirectoryManagementApi(BaseApi):  # XXX maybe extend DirectoryApi???
         # currently causes Internal Server Error and <Response [500]> returned with body:
         # {"detail":"{'homepage': [ErrorDetail(string='This field is required.', code='required')]}"}
         # which isn't what I expect from "PATCH"!!!
-        return self._query(f'sources/sources/{source_id}/', params, "PATCH")
+        try:
+            return self._query(f'sources/sources/{source_id}/', params, "PATCH")
+        finally:
+            self._directory_cache.invalidate_source(source_id)
 
     # for testing/cleanup:
     def source_delete(self, source_id: int) -> dict:
-        return self._query(f'sources/sources/{source_id}/', None, "DELETE")
+        try:
+            return self._query(f'sources/sources/{source_id}/', None, "DELETE")
+        finally:
+            self._directory_cache.invalidate_source(source_id)
 
     ################ SourcesCollectionsViewSet
 
@@ -122,14 +147,69 @@ class DirectoryManagementApi(BaseApi):  # XXX maybe extend DirectoryApi???
     # mcweb sourcesCollectionsApi.js calls this createSourceCollectionAssociation
     def source_collection_create(self, *, source_id: int, collection_id: int) -> dict:
         params = {'source_id': source_id, 'collection_id': collection_id}
-        return self._query('sources/sources-collections/', params, "POST")
+        try:
+            return self._query('sources/sources-collections/', params, "POST")
+        finally:
+            self._invalidate_association(source_id, collection_id)
 
     # mcweb sourcesCollectionsApi.js calls this deleteSourceCollectionAssociation
     # XXX endpoint seems to take collection=bool query parameter??
     # (if not set to true, expects collection_id parameter??)
     def source_collection_delete(self, *, source_id: int, collection_id: int) -> dict:
-        return self._query(
-            f'sources/sources-collections/{source_id}/?collection_id={collection_id}',
-            None,
-            "DELETE",
-        )
+        try:
+            return self._query(
+                f'sources/sources-collections/{source_id}/?collection_id={collection_id}',
+                None,
+                "DELETE",
+            )
+        finally:
+            self._invalidate_association(source_id, collection_id)
+
+    def collection_reconcile(self, *, collection_id: int, source_ids: Iterable[int], remove: bool = True,
+                             dry_run: bool = False, max_workers: Optional[int] = None) -> ReconcileReport:
+        """
+        Make the collection contain exactly `source_ids`: reads the live membership, then adds
+        the missing sources and (if `remove`) removes the extra ones, making up to
+        `max_workers` (default RECONCILE_MAX_WORKERS) association calls at once. One failed
+        call doesn't stop the rest; it is listed under 'failed' in the returned report, next to
+        the 'added', 'removed' and 'unchanged' source ids. With `dry_run` nothing is changed and
+        'added'/'removed' list what would have been.
+        """
+        desired = set(int(s) for s in source_ids)
+        current = set(int(s['id']) for s in self.iter_sources(collection_id=collection_id))
+        to_add = sorted(desired - current)
+        to_remove = sorted(current - desired) if remove else []
+        report = ReconcileReport(collection_id=collection_id, dry_run=dry_run, unchanged=sorted(desired & current),
+                                 added=[], removed=[], failed=[])
+        if dry_run:
+            report['added'], report['removed'] = to_add, to_remove
+            return report
+        if not to_add and not to_remove:
+            return report
+
+        def apply(change: tuple[str, int]) -> Optional[Exception]:
+            action, source_id = change
+            call = self.source_collection_create if action == 'add' else self.source_collection_delete
+            try:
+                call(source_id=source_id, collection_id=collection_id)
+            except Exception as e:
+                return e
+            return None
+        changes = [('add', s) for s in to_add] + [('remove', s) for s in to_remove]
+        workers = min(max_workers or self.RECONCILE_MAX_WORKERS, len(changes))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mediacloud-reconcile") as pool:
+            for (action, source_id), error in zip(changes, pool.map(apply, changes)):
+                if error is not None:
+                    report['failed'].append(ReconcileFailure(source_id=source_id, action=action, error=error))
+                elif action == 'add':
+                    report['added'].append(source_id)
+                else:
+                    report['removed'].append(source_id)
+        return report
+
+    def _invalidate_association(self, source_id: int, collection_id: int) -> None:
+        """
+        membership changes can alter counts on both objects, so forget both
+        """
+        self._directory_cache.invalidate_source(source_id)
+        self._directory_cache.invalidate_collection(collection_id)
@@ -0,0 +1,267 @@
+"""
+A local, indexed copy of the Media Cloud directory.
+
+DirectoryMirror pulls sources, collections, feeds and (for the collections you ask for)
+collection membership into SQLite, then answers lookups by id, name, homepage and collection
+without touching the API:
+
+    mirror = DirectoryMirror(DirectoryApi(MY_TOKEN), "~/.cache/mediacloud-directory.sqlite")
+    mirror.sync(collection_ids=[34412234])   # slow the first time, incremental afterwards
+    mirror.source_by_homepage("https://www.nytimes.com/")
+    mirror.collection_source_ids(34412234)
+
+Lists are read with the concurrent offset pagination of DirectoryApi.iter_sources and friends.
+Feeds are kept fresh incrementally with `feed_list(modified_since=...)`. The directory API has
+no such filter for sources and collections, so those are re-pulled in full once the last full
+pull is older than FULL_SYNC_SECS.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from mediacloud.api import DirectoryApi
+from mediacloud.types import Collection, Feed, JSONList, Source
+
+# feeds modified this close to the previous sync's start are fetched again, to cover clock skew
+# and edits that were in flight
+_WATERMARK_OVERLAP_SECS = 5 * 60
+
+_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS sources (
+           id INTEGER PRIMARY KEY, name TEXT, homepage_key TEXT, platform TEXT, body TEXT NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS sources_name ON sources (name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS sources_homepage ON sources (homepage_key)",
+    """CREATE TABLE IF NOT EXISTS collections (
+           id INTEGER PRIMARY KEY, name TEXT, platform TEXT, body TEXT NOT NULL)""",
+    "CREATE INDEX IF NOT EXISTS collections_name ON collections (name COLLATE NOCASE)",
+    """CREATE TABLE IF NOT EXISTS collection_sources (
+           collection_id INTEGER NOT NULL, source_id INTEGER NOT NULL, PRIMARY KEY (collection_id, source_id))""",
+    "CREATE INDEX IF NOT EXISTS collection_sources_source ON collection_sources (source_id)",
+    "CREATE TABLE IF NOT EXISTS feeds (id INTEGER PRIMARY KEY, source_id INTEGER, body TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS feeds_source ON feeds (source_id)",
+    "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value REAL NOT NULL)",
+]
+
+
+def homepage_key(url: Optional[str]) -> Optional[str]:
+    """
+    Normalize a homepage URL for matching: no scheme, no leading 'www.', no trailing slash,
+    lower case
+    """
+    if not url:
+        return None
+    key = url.strip().lower()
+    for prefix in ('https://', 'http://'):
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+    if key.startswith('www.'):
+        key = key[4:]
+    return key.rstrip('/')
+
+
+class DirectoryMirror:
+    """
+    SQLite mirror of the directory, filled and refreshed by sync(). Lookups read only the local
+    store and are safe to call from several threads while a sync runs.
+    """
+
+    # how old the last full pull of sources and collections may get before sync() repeats it
+    FULL_SYNC_SECS = 24 * 60 * 60
+
+    # results asked for per list request
+    PAGE_SIZE = 1000
+
+    def __init__(self, directory: DirectoryApi, path: str = ":memory:"):
+        if path != ":memory:":
+            path = os.path.expanduser(path)
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+
+    # --- syncing ---
+
+    def sync(self, collection_ids: Iterable[int] = (), full: bool = False) -> Dict[str, int]:
+        """
+        Bring the mirror up to date: re-pull sources and collections if `full` or if the last
+        full pull is older than FULL_SYNC_SECS, fetch feeds changed since the last sync, and
+        refresh the membership of `collection_ids` plus every collection synced before.
+        Returns how many rows of each kind were written.
+        """
+        written = dict(sources=0, collections=0, feeds=0, memberships=0)
+        started = time.time()
+        last_full = self._state('full_sync')
+        if full or last_full is None or started - last_full > self.FULL_SYNC_SECS:
+            written['sources'] = self.sync_sources()
+            written['collections'] = self.sync_collections()
+            self._set_state('full_sync', started)
+        written['feeds'] = self.sync_feeds(full=full)
+        tracked = set(int(c) for c in collection_ids) | set(self.tracked_collection_ids())
+        for collection_id in sorted(tracked):
+            written['memberships'] += self.sync_collection_sources(collection_id)
+        return written
+
+    def sync_sources(self) -> int:
+        """
+        Replace the mirrored sources with a full pull; returns the number of sources
+        """
+        sources = self._directory.iter_sources(page_size=self.PAGE_SIZE)
+        rows = [(s['id'], s.get('name'), homepage_key(s.get('homepage')), s.get('platform'), json.dumps(s))
+                for s in sources]
+        self._replace('sources', rows, "INSERT INTO sources VALUES (?, ?, ?, ?, ?)")
+        return len(rows)
+
+    def sync_collections(self) -> int:
+        """
+        Replace the mirrored collections with a full pull; returns the number of collections
+        """
+        collections = self._directory.iter_collections(page_size=self.PAGE_SIZE)
+        rows = [(c['id'], c.get('name'), c.get('platform'), json.dumps(c)) for c in collections]
+        # collections that are gone take their membership, and its tracking, with them
+        self._replace('collections', rows, "INSERT INTO collections VALUES (?, ?, ?, ?)", [
+            "DELETE FROM collection_sources WHERE collection_id NOT IN (SELECT id FROM collections)",
+            """DELETE FROM sync_state WHERE name LIKE 'collection_sources:%'
+                   AND CAST(substr(name, 20) AS INTEGER) NOT IN (SELECT id FROM collections)""",
+        ])
+        return len(rows)
+
+    def sync_feeds(self, full: bool = False) -> int:
+        """
+        Fetch the feeds modified since the last sync (every feed the first time, or if `full`);
+        returns the number of feeds written
+        """
+        started = time.time()
+        since = None if full else self._state('feeds_modified_since')
+        feeds = self._directory.iter_feeds(modified_since=since, page_size=self.PAGE_SIZE)
+        rows = [(f['id'], f.get('source_id'), json.dumps(f)) for f in feeds]
+        with self._lock:
+            self._db.execute("BEGIN")
+            if since is None:
+                self._db.execute("DELETE FROM feeds")
+            self._db.executemany("INSERT OR REPLACE INTO feeds VALUES (?, ?, ?)", rows)
+            self._db.execute("INSERT OR REPLACE INTO sync_state VALUES ('feeds_modified_since', ?)",
+                             (started - _WATERMARK_OVERLAP_SECS,))
+            self._db.execute("COMMIT")
+        return len(rows)
+
+    def sync_collection_sources(self, collection_id: int) -> int:
+        """
+        Replace the mirrored membership of one collection; returns the number of sources in it.
+        The collection is remembered, so later sync() calls refresh it too.
+        """
+        collection_id = int(collection_id)
+        sources = list(self._directory.iter_sources(collection_id=collection_id, page_size=self.PAGE_SIZE))
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM collection_sources WHERE collection_id = ?", (collection_id,))
+            self._db.executemany("INSERT OR IGNORE INTO collection_sources VALUES (?, ?)",
+                                 [(collection_id, s['id']) for s in sources])
+            # members seen here are current, so refresh their rows too
+            self._db.executemany("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                                 [(s['id'], s.get('name'), homepage_key(s.get('homepage')), s.get('platform'),
+                                   json.dumps(s)) for s in sources])
+            self._db.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)",
+                             (f'collection_sources:{collection_id}', time.time()))
+            self._db.execute("COMMIT")
+        return len(sources)
+
+    def tracked_collection_ids(self) -> List[int]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name FROM sync_state WHERE name LIKE 'collection_sources:%'").fetchall()
+        return [int(name.split(':', 1)[1]) for (name,) in rows]
+
+    def _replace(self, table: str, rows: List[tuple], insert: str, cleanup: Iterable[str] = ()) -> None:
+        # `cleanup` statements run after the insert, in the same transaction
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.execute(f"DELETE FROM {table}")
+            self._db.executemany(insert, rows)
+            for statement in cleanup:
+                self._db.execute(statement)
+            self._db.execute("COMMIT")
+
+    def _state(self, name: str) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, name: str, value: float) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (name, value))
+
+    # --- lookups ---
+
+    def _bodies(self, sql: str, args: tuple) -> JSONList:
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def _ids(self, sql: str, args: tuple) -> List[int]:
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [i for (i,) in rows]
+
+    def source(self, source_id: int) -> Optional[Source]:
+        found = self._bodies("SELECT body FROM sources WHERE id = ?", (int(source_id),))
+        return found[0] if found else None  # type: ignore[return-value]
+
+    def sources_by_name(self, name: str) -> List[Source]:
+        """
+        Sources with exactly this name, ignoring case
+        """
+        return self._bodies("SELECT body FROM sources WHERE name = ? COLLATE NOCASE ORDER BY id",
+                            (name,))  # type: ignore[return-value]
+
+    def source_by_homepage(self, url: str) -> Optional[Source]:
+        """
+        The source whose homepage matches `url`, ignoring scheme, 'www.' and a trailing slash
+        """
+        found = self._bodies("SELECT body FROM sources WHERE homepage_key = ? ORDER BY id LIMIT 1",
+                             (homepage_key(url),))
+        return found[0] if found else None  # type: ignore[return-value]
+
+    def collection(self, collection_id: int) -> Optional[Collection]:
+        found = self._bodies("SELECT body FROM collections WHERE id = ?", (int(collection_id),))
+        return found[0] if found else None  # type: ignore[return-value]
+
+    def collections_by_name(self, name: str) -> List[Collection]:
+        return self._bodies("SELECT body FROM collections WHERE name = ? COLLATE NOCASE ORDER BY id",
+                            (name,))  # type: ignore[return-value]
+
+    def collection_source_ids(self, collection_id: int) -> List[int]:
+        """
+        Ids of the sources in a collection; empty unless its membership has been synced
+        """
+        return self._ids("SELECT source_id FROM collection_sources WHERE collection_id = ? ORDER BY source_id",
+                         (int(collection_id),))
+
+    def source_collection_ids(self, source_id: int) -> List[int]:
+        """
+        Ids of the synced collections that include a source
+        """
+        return self._ids("SELECT collection_id FROM collection_sources WHERE source_id = ? ORDER BY collection_id",
+                         (int(source_id),))
+
+    def feeds_for_source(self, source_id: int) -> List[Feed]:
+        return self._bodies("SELECT body FROM feeds WHERE source_id = ? ORDER BY id",
+                            (int(source_id),))  # type: ignore[return-value]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        returns dict with the number of mirrored sources, collections, feeds and memberships,
+        and when the last full sync started (epoch seconds, or None)
+        """
+        with self._lock:
+            counts = {table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ('sources', 'collections', 'feeds', 'collection_sources')}
+        counts['full_sync'] = self._state('full_sync')
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,337 @@
+"""
+Helpers for walking paged API results.
+
+A "page fetcher" is any callable taking a pagination token (None for the first page) and
+returning `(items, next_token)`, where a next_token of None means there are no more pages.
+SearchApi.story_list fits that shape once its query arguments are bound.
+
+The directory endpoints are offset-paged instead: iter_offset_pages reads the total `count`
+from the first page and fetches the remaining offsets concurrently.
+
+A Checkpoint records how far a crawl got, so a long iter_stories run that dies can pick up
+from its last finished page instead of starting over.
+"""
+import datetime as dt
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (Any, AsyncIterator, Awaitable, Callable, Deque, Dict,
+                    Iterator, List, Optional, Tuple)
+
+from mediacloud.types import JSONList, OffsetPage, PaginationToken
+
+Page = Tuple[Any, PaginationToken]  # a page's items (a list, or a StoryBatch) and the next token
+PageFetcher = Callable[[PaginationToken], Page]
+AsyncPageFetcher = Callable[[PaginationToken], Awaitable[Page]]
+
+# takes (limit, offset) and returns that slice of an offset-paged list endpoint
+OffsetPageFetcher = Callable[[int, int], OffsetPage]
+AsyncOffsetPageFetcher = Callable[[int, int], Awaitable[OffsetPage]]
+
+# how often a blocked background worker checks whether its consumer went away
+_POLL_SECS = 0.5
+
+_DONE = object()
+
+
+def date_shards(start_date: dt.date, end_date: dt.date, shards: int) -> List[Tuple[dt.date, dt.date]]:
+    """
+    Split the inclusive range [start_date, end_date] into at most `shards` contiguous,
+    non-overlapping inclusive sub-ranges of whole days, as evenly sized as possible
+    """
+    if shards < 1:
+        raise ValueError("shards must be at least 1")
+    if end_date < start_date:
+        raise ValueError("end_date is before start_date")
+    days = (end_date - start_date).days + 1
+    shards = min(shards, days)
+    ranges = []
+    shard_start = start_date
+    for i in range(shards):
+        length = days // shards + (1 if i < days % shards else 0)
+        shard_end = shard_start + dt.timedelta(days=length - 1)
+        ranges.append((shard_start, shard_end))
+        shard_start = shard_end + dt.timedelta(days=1)
+    return ranges
+
+
+def iter_offset_pages(fetch_page: OffsetPageFetcher, page_size: int = 1000,
+                      max_workers: int = 4) -> Iterator[JSONList]:
+    """
+    Yield the `results` of every page of an offset-paged list, in order. The first page gives
+    the total `count` (and the page size the server actually used), then the remaining offsets
+    are fetched on up to `max_workers` threads, with at most 2 * max_workers pages outstanding.
+    If the list grew while it was being read, the rest is followed serially from the last page.
+    """
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    first = fetch_page(page_size, 0)
+    results = first['results']
+    yield results
+    if not first.get('next') or not results:
+        return
+    step = len(results)
+    offsets = iter(range(step, first.get('count', 0), step))
+    last, last_offset = first, 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mediacloud-offset") as pool:
+        pending: Deque[Tuple[int, Future]] = deque()
+        try:
+            for offset in offsets:
+                pending.append((offset, pool.submit(fetch_page, step, offset)))
+                if len(pending) >= 2 * max_workers:
+                    break
+            while pending:
+                last_offset, future = pending.popleft()
+                last = future.result()
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    pending.append((next_offset, pool.submit(fetch_page, step, next_offset)))
+                yield last['results']
+        finally:
+            for _, future in pending:
+                future.cancel()
+    offset = last_offset + len(last['results'])
+    while last.get('next') and last['results']:
+        last = fetch_page(step, offset)
+        yield last['results']
+        offset += len(last['results'])
+
+
+async def iter_offset_pages_async(fetch_page: AsyncOffsetPageFetcher, page_size: int = 1000,
+                                  max_workers: int = 4) -> AsyncIterator[JSONList]:
+    """
+    asyncio version of iter_offset_pages: the remaining offsets are fetched in waves of
+    `max_workers` concurrent requests
+    """
+    import asyncio  # here rather than at the top, so the blocking clients don't import it
+
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1")
+    first = await fetch_page(page_size, 0)
+    results = first['results']
+    yield results
+    if not first.get('next') or not results:
+        return
+    step = len(results)
+    offsets = list(range(step, first.get('count', 0), step))
+    last, last_offset = first, 0
+    for i in range(0, len(offsets), max_workers):
+        wave_offsets = offsets[i:i + max_workers]
+        wave = await asyncio.gather(*[fetch_page(step, offset) for offset in wave_offsets])
+        for last_offset, last in zip(wave_offsets, wave):
+            yield last['results']
+    offset = last_offset + len(last['results'])
+    while last.get('next') and last['results']:
+        last = await fetch_page(step, offset)
+        yield last['results']
+        offset += len(last['results'])
+
+
+class Checkpoint:
+    """
+    Durable record of a paged crawl's progress: a fingerprint of the query, the pagination
+    token of the next page to fetch, and how many items have been emitted so far. It is kept in
+    a small JSON file that is replaced atomically on every save, so a crash leaves either the
+    old or the new state, never a torn one.
+
+    Pass one (or just a path) as `checkpoint=` to SearchApi.iter_stories. The state is saved
+    each time the caller has been handed every story of a page and asks for the next one;
+    running the same query with the same checkpoint again continues from there, and a finished
+    crawl yields nothing. `on_save` is called before each save - use it to flush the file the
+    stories are going to, so the checkpoint is never ahead of the data, and to set
+    `output_offset` to that file's size, which is saved along with the rest. `on_start` is
+    called once the saved state has been loaded, before the first page is fetched - the place to
+    cut the output back to `output_offset`, dropping stories written after the last save.
+    """
+
+    def __init__(self, path: str, on_save: Optional[Callable[[], None]] = None,
+                 on_start: Optional[Callable[[], None]] = None):
+        self.path = os.path.expanduser(path)
+        self.on_save = on_save
+        self.on_start = on_start
+        self.fingerprint: Optional[str] = None
+        self.pagination_token: PaginationToken = None
+        self.emitted = 0
+        self.done = False
+        self.output_offset: Optional[int] = None
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def start(self, fingerprint: str) -> None:
+        """
+        Load the saved state for the query with this fingerprint, if there is any. Raises
+        ValueError if the file holds the checkpoint of a different query.
+        """
+        state: Optional[Dict[str, Any]] = None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            pass
+        if state is not None and state.get('fingerprint') != fingerprint:
+            raise ValueError(f"Checkpoint {self.path} belongs to a different query; "
+                             "delete it or use another path")
+        self.fingerprint = fingerprint
+        if state is not None:
+            self.pagination_token = state.get('pagination_token')
+            self.emitted = state.get('emitted', 0)
+            self.done = state.get('done', False)
+            self.output_offset = state.get('output_offset')
+        if self.on_start is not None:
+            self.on_start()
+
+    def save(self, pagination_token: PaginationToken, emitted: int) -> None:
+        """
+        Record that `emitted` items have been handed out and the crawl continues at
+        `pagination_token` (None once the last page is done)
+        """
+        if self.fingerprint is None:
+            raise RuntimeError("Checkpoint.start() must be called before save()")
+        if self.on_save is not None:
+            self.on_save()
+        self.pagination_token = pagination_token
+        self.emitted = emitted
+        self.done = pagination_token is None
+        state = dict(fingerprint=self.fingerprint, pagination_token=pagination_token, emitted=emitted,
+                     done=self.done, output_offset=self.output_offset, updated=time.time())
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        """
+        Forget the saved state, so the next run starts from the first page
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.pagination_token = None
+        self.emitted = 0
+        self.done = False
+        self.output_offset = None
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class PrefetchPages:
+    """
+    Iterator over `(items, next_token)` pages that fetches on a background thread, so page N+1
+    is downloaded while the caller works on page N. The worker starts as soon as this object is
+    created. At most `depth` pages wait in the buffer, which bounds memory at roughly depth + 2
+    pages (buffered, in the caller's hands, in flight). Errors from the worker are re-raised in
+    the caller, after the pages fetched before them. Call close() (or exhaust the iterator) to
+    release the worker.
+    """
+
+    def __init__(self, fetch_page: PageFetcher, pagination_token: PaginationToken = None, depth: int = 1):
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self._fetch_page = fetch_page
+        self._pages: queue.Queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._finished = False
+        self._thread = threading.Thread(target=self._work, args=(pagination_token,),
+                                        name="mediacloud-prefetch", daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._pages.put(item, timeout=_POLL_SECS)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _work(self, token: PaginationToken) -> None:
+        try:
+            while not self._stop.is_set():
+                page = self._fetch_page(token)
+                if not self._put(page):
+                    return
+                token = page[1]
+                if token is None:
+                    break
+            self._put(_DONE)
+        except BaseException as e:  # hand everything to the consumer to re-raise
+            self._put(_Failure(e))
+
+    def __iter__(self) -> Iterator[Page]:
+        return self
+
+    def __next__(self) -> Page:
+        if self._finished:
+            raise StopIteration
+        item = self._pages.get()
+        if item is _DONE:
+            self.close()
+            raise StopIteration
+        if isinstance(item, _Failure):
+            self.close()
+            raise item.exc
+        return item
+
+    def close(self) -> None:
+        self._finished = True
+        self._stop.set()
+
+
+def prefetch_pages(fetch_page: PageFetcher, pagination_token: PaginationToken = None,
+                   depth: int = 1) -> PrefetchPages:
+    """
+    Start fetching `(items, next_token)` pages from `pagination_token` on a background thread
+    (see PrefetchPages)
+    """
+    return PrefetchPages(fetch_page, pagination_token, depth)
+
+
+async def prefetch_pages_async(fetch_page: AsyncPageFetcher, pagination_token: PaginationToken = None,
+                               depth: int = 1) -> AsyncIterator[Page]:
+    """
+    asyncio version of prefetch_pages: the next page is fetched by a background task
+    """
+    import asyncio
+
+    if depth < 1:
+        raise ValueError("depth must be at least 1")
+    pages: asyncio.Queue = asyncio.Queue(maxsize=depth)
+
+    async def worker():
+        token = pagination_token
+        try:
+            while True:
+                page = await fetch_page(token)
+                await pages.put(page)
+                token = page[1]
+                if token is None:
+                    break
+            await pages.put(_DONE)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            await pages.put(_Failure(e))
+
+    task = asyncio.ensure_future(worker())
+    try:
+        while True:
+            item = await pages.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        task.cancel()
@@ -0,0 +1,186 @@
+"""
+Client-side rate limiting helpers.
+
+The blocking clients in mediacloud.api use requests_ratelimiter's LimiterSession unless they
+are handed a limiter from this module; the asyncio clients in mediacloud.aio always use one.
+"""
+import datetime as dt
+import email.utils
+import threading
+import time
+from typing import Mapping, Optional
+
+
+class RateLimiter:
+    """
+    Token bucket that hands out one token per request. Tokens refill continuously at
+    `per_minute / 60` per second, up to `burst` banked tokens. Callers that find the
+    bucket empty reserve a future token, so waiters are served in arrival order.
+
+    Safe to share between threads, and between coroutines on one event loop.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        if per_minute <= 0:
+            raise ValueError("per_minute must be positive")
+        self._per_minute = float(per_minute)
+        self._burst = float(burst if burst is not None else max(1.0, per_minute))
+        self._tokens = self._burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        """
+        current allowed rate, in requests per minute
+        """
+        return self._per_minute
+
+    def update(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """
+        Called with every response; a fixed-rate limiter ignores what the server says
+        """
+        pass
+
+    def _refill(self, now: float) -> None:
+        # _last may be in the future while the limiter is paused (see AdaptiveRateLimiter)
+        if now > self._last:
+            self._tokens = min(self._burst, self._tokens + (now - self._last) * self._per_minute / 60)
+            self._last = now
+
+    def reserve(self) -> float:
+        """
+        Take a token, returning how many seconds the caller must wait before using it
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0.0, self._last - now)
+            if self._tokens < 0:
+                wait += -self._tokens * 60 / self._per_minute
+            return wait
+
+    def acquire(self) -> float:
+        """
+        Block the current thread until a request may be sent; returns seconds waited
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self) -> float:
+        """
+        Suspend the current coroutine until a request may be sent; returns seconds waited
+        """
+        import asyncio  # here rather than at the top, so the blocking clients don't import it
+
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+def _header_float(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(str(value).split(',')[0].split(';')[0].strip())
+            except ValueError:
+                continue
+    return None
+
+
+def retry_after_secs(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    Seconds the server asked us to wait via Retry-After (either delta-seconds or an HTTP-date)
+    """
+    value = headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=dt.timezone.utc)
+    return max(0.0, (when - dt.datetime.now(dt.timezone.utc)).total_seconds())
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket whose rate follows what the server tells us (AIMD, like TCP congestion control):
+
+    * each successful response raises the rate by `increase` requests per minute,
+    * each 429 multiplies it by `decrease_factor`, and no request is sent until any
+      Retry-After delay has passed,
+    * a server-advertised quota (RateLimit-Limit / X-RateLimit-Limit, with the window from
+      RateLimit-Policy when present) caps the rate, and an exhausted RateLimit-Remaining pauses
+      requests until the advertised reset.
+
+    The rate always stays within [min_per_minute, max_per_minute]; with no max and no advertised
+    quota it keeps probing upwards, so expect the occasional 429 that pulls it back down.
+    """
+
+    def __init__(self, per_minute: float = 2, min_per_minute: float = 1,
+                 max_per_minute: Optional[float] = None, increase: float = 0.5,
+                 decrease_factor: float = 0.5, burst: Optional[float] = 1):
+        super().__init__(per_minute, burst)
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between 0 and 1")
+        self.min_per_minute = min_per_minute
+        self.max_per_minute = max_per_minute
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.server_limit: Optional[float] = None
+
+    def _ceiling(self) -> Optional[float]:
+        limits = [x for x in (self.max_per_minute, self.server_limit) if x is not None]
+        return min(limits) if limits else None
+
+    def _set_rate(self, now: float, per_minute: float) -> None:
+        # settle tokens earned at the old rate before switching
+        self._refill(now)
+        ceiling = self._ceiling()
+        if ceiling is not None:
+            per_minute = min(per_minute, ceiling)
+        self._per_minute = max(self.min_per_minute, per_minute)
+
+    def _pause(self, now: float, secs: float) -> None:
+        """
+        Hand out no tokens for `secs`, then allow a single request through
+        """
+        self._refill(now)
+        self._last = max(self._last, now + secs)
+        self._tokens = min(self._tokens, 1.0)
+
+    def update(self, status_code: int, headers: Mapping[str, str]) -> None:
+        with self._lock:
+            now = time.monotonic()
+            limit = _header_float(headers, 'RateLimit-Limit', 'X-RateLimit-Limit')
+            if limit is not None and limit > 0:
+                window = 60.0
+                policy = headers.get('RateLimit-Policy')
+                if policy and 'w=' in policy:
+                    window = _header_float({'w': policy.split('w=', 1)[1]}, 'w') or window
+                self.server_limit = limit * 60 / window
+            remaining = _header_float(headers, 'RateLimit-Remaining', 'X-RateLimit-Remaining')
+            reset = _header_float(headers, 'RateLimit-Reset', 'X-RateLimit-Reset')
+            if remaining is not None and remaining <= 0 and reset is not None:
+                # X-RateLimit-Reset is sometimes an epoch timestamp rather than a delay
+                delay = reset - time.time() if reset > 1e9 else reset
+                self._pause(now, max(0.0, delay))
+            if status_code == 429:
+                self._set_rate(now, self._per_minute * self.decrease_factor)
+                # even without Retry-After, don't let banked tokens send a burst straight back
+                self._pause(now, retry_after_secs(headers) or 0.0)
+            elif 200 <= status_code < 300:
+                self._set_rate(now, self._per_minute + self.increase)
+            else:
+                self._set_rate(now, self._per_minute)
@@ -0,0 +1,115 @@
+"""
+Retry policy for transient API failures (429s, gateway errors, dropped connections).
+
+Every client gets a default RetryPolicy; pass your own to tune it, or
+`RetryPolicy(max_retries=0)` to turn retries off:
+
+    search = SearchApi(MY_TOKEN, retry_policy=RetryPolicy(max_retries=8, backoff_max=120))
+"""
+import random
+import threading
+from typing import Collection, Optional, Tuple, Type
+
+
+class RetryBudget:
+    """
+    Caps retries across every call sharing this object, so a struggling server isn't hit
+    with a multiple of the normal load. Each request adds `ratio` of a retry to the budget,
+    each retry spends one, and `minimum` retries are always available on top.
+    """
+
+    def __init__(self, ratio: float = 0.2, minimum: int = 10):
+        self.ratio = ratio
+        self.minimum = minimum
+        self._requests = 0
+        self._retries = 0
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._requests += 1
+
+    def withdraw(self) -> bool:
+        """
+        Spend one retry if any are left; returns False when the budget is exhausted
+        """
+        with self._lock:
+            if self._retries >= self.minimum + self._requests * self.ratio:
+                return False
+            self._retries += 1
+            return True
+
+    @property
+    def retries(self) -> int:
+        return self._retries
+
+
+class RetryPolicy:
+    """
+    Which failures to retry, and how long to wait between attempts.
+
+    A failure is retried when its status code is in `retry_statuses` or it raised one of
+    `retry_exceptions`, the call has made fewer than `max_retries` retries, and the client-wide
+    `budget` isn't exhausted. Waits use exponential backoff with full jitter (a random delay
+    between 0 and min(backoff_max, backoff_base * 2 ** attempt)), but never less than a
+    Retry-After the server sent.
+
+    POST and PATCH (the DirectoryManagementApi create/update calls) might have taken effect
+    before a failure, so they are only retried when `retry_non_idempotent` is set - except after
+    a 429, which means the server turned the request away without acting on it.
+    """
+
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+    # None stands for requests' ConnectionError and Timeout, looked up on first use so that
+    # importing this module doesn't import requests
+    RETRY_EXCEPTIONS: Optional[Tuple[Type[BaseException], ...]] = None
+
+    IDEMPOTENT_METHODS = frozenset(['GET', 'DELETE'])
+
+    def __init__(self, max_retries: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 retry_statuses: Optional[Collection[int]] = None,
+                 retry_exceptions: Optional[Tuple[Type[BaseException], ...]] = None,
+                 retry_non_idempotent: bool = False, budget: Optional[RetryBudget] = None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses) if retry_statuses is not None else self.RETRY_STATUSES
+        self._retry_exceptions = retry_exceptions if retry_exceptions is not None else self.RETRY_EXCEPTIONS
+        self.retry_non_idempotent = retry_non_idempotent
+        self.budget = budget if budget is not None else RetryBudget()
+
+    @property
+    def retry_exceptions(self) -> Tuple[Type[BaseException], ...]:
+        if self._retry_exceptions is None:
+            import requests
+            self._retry_exceptions = (requests.ConnectionError, requests.Timeout)
+        return self._retry_exceptions
+
+    def _may_retry(self, attempt: int) -> bool:
+        # check the per-call limit first, so calls that are done anyway don't spend budget
+        return attempt < self.max_retries and self.budget.withdraw()
+
+    def should_retry_status(self, method: str, status_code: int, attempt: int) -> bool:
+        if status_code not in self.retry_statuses:
+            return False
+        if method not in self.IDEMPOTENT_METHODS and not self.retry_non_idempotent and status_code != 429:
+            return False
+        return self._may_retry(attempt)
+
+    def should_retry_exception(self, method: str, exc: BaseException, attempt: int,
+                               extra_exceptions: Tuple[Type[BaseException], ...] = ()) -> bool:
+        if not isinstance(exc, self.retry_exceptions + extra_exceptions):
+            return False
+        if method not in self.IDEMPOTENT_METHODS and not self.retry_non_idempotent:
+            return False
+        return self._may_retry(attempt)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to sleep before retry number `attempt` (counting from 0)
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
@@ -0,0 +1,196 @@
+"""
+Unit tests for the asyncio clients (mediacloud.aio), against an in-process httpx mock transport.
+"""
+import asyncio
+import datetime as dt
+import gzip
+import json
+import unittest
+
+import pytest
+
+from mediacloud.error import APIResponseError
+from mediacloud.retry import RetryPolicy
+from mediacloud.transport import Transport
+
+try:
+    import httpx
+
+    from mediacloud.aio import (AsyncDirectoryApi, AsyncDirectoryManagementApi,
+                                AsyncSearchApi)
+except ImportError:
+    pytest.skip("mediacloud.aio needs httpx", allow_module_level=True)
+
+START_DATE = dt.date(2023, 11, 1)
+END_DATE = dt.date(2023, 11, 3)
+
+
+def _mock(api, handler):
+    # swap in a client that talks to `handler` instead of the network, keeping the auth headers
+    api._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), headers=api._client.headers)
+    return api
+
+
+class FastAsyncSearchApi(AsyncSearchApi):
+    RATE_LIMIT_PER_MINUTE = 60000
+
+
+class AsyncSearchApiTest(unittest.TestCase):
+
+    def test_story_list(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json={
+                'stories': [{'id': 'a', 'publish_date': '2023-11-02 00:00:00',
+                             'indexed_date': '2023-11-02T10:11:12'}],
+                'pagination_token': 'next'})
+
+        async def run():
+            async with _mock(FastAsyncSearchApi("test-token"), handler) as search:
+                return await search.story_list("weather", START_DATE, END_DATE, collection_ids=[1, 2])
+        stories, token = asyncio.run(run())
+        self.assertEqual(token, 'next')
+        self.assertEqual(stories[0]['publish_date'], dt.date(2023, 11, 2))
+        self.assertIsInstance(stories[0]['indexed_date'], dt.datetime)
+        self.assertEqual(seen[0].url.path, '/api/search/story-list')
+        self.assertEqual(seen[0].url.params['cs'], '1,2')
+        self.assertEqual(seen[0].headers['Authorization'], 'Token test-token')
+
+    def test_story_count_many(self):
+        def handler(request):
+            q = request.url.params['q']
+            if q == 'broken':
+                return httpx.Response(400, json={'note': 'bad query'})
+            return httpx.Response(200, json={'count': {'relevant': len(q), 'total': 10}})
+
+        async def run():
+            async with _mock(FastAsyncSearchApi("test-token"), handler) as search:
+                return await search.story_count_many([("weather", START_DATE, END_DATE, [1]),
+                                                      ("broken", START_DATE, END_DATE, [1]),
+                                                      ("weather", START_DATE, END_DATE, [1])])
+        results = asyncio.run(run())
+        self.assertEqual(results[0]['result']['relevant'], 7)
+        self.assertIsInstance(results[1]['error'], APIResponseError)
+        self.assertIs(results[2]['result'], results[0]['result'])
+
+    def test_instruments(self):
+        events = []
+
+        body = json.dumps({'count': {'relevant': 1, 'total': 10}}).encode('utf-8')
+
+        def handler(request):
+            return httpx.Response(200, stream=httpx.ByteStream(gzip.compress(body)), headers={'Content-Encoding': 'gzip'})
+
+        async def run():
+            search = FastAsyncSearchApi("test-token", instruments=[events.append])
+            async with _mock(search, handler):
+                await search.story_count("weather", START_DATE, END_DATE, collection_ids=[1])
+        asyncio.run(run())
+        self.assertEqual((events[0]['endpoint'], events[0]['status'], events[0]['attempts']),
+                         ('search/total-count', 200, 1))
+        self.assertEqual(events[0]['response_bytes'], len(body))
+        self.assertEqual(events[0]['wire_bytes'], len(gzip.compress(body)))
+        self.assertEqual(events[0]['content_encoding'], 'gzip')
+        self.assertIsNone(events[0]['download_secs'])
+
+    def test_iter_stories(self):
+        def handler(request):
+            page = int(request.url.params.get('pagination_token', 0))
+            return httpx.Response(200, json={
+                'stories': [{'id': f'{page}', 'publish_date': None, 'indexed_date': None}],
+                'pagination_token': str(page + 1) if page < 2 else None})
+
+        async def run():
+            async with _mock(FastAsyncSearchApi("test-token"), handler) as search:
+                return [s['id'] async for s in search.iter_stories("weather", START_DATE, END_DATE,
+                                                                   collection_ids=[1])]
+        self.assertEqual(asyncio.run(run()), ['0', '1', '2'])
+
+    def test_concurrent_counts(self):
+        def handler(request):
+            return httpx.Response(200, json={'count': {'relevant': len(request.url.params['q']), 'total': 10}})
+
+        async def run():
+            async with _mock(FastAsyncSearchApi("test-token"), handler) as search:
+                return await asyncio.gather(*[search.story_count(q, START_DATE, END_DATE, collection_ids=[1])
+                                              for q in ["a", "bb", "ccc"]])
+        results = asyncio.run(run())
+        self.assertEqual([r['relevant'] for r in results], [1, 2, 3])
+
+    def test_retries_transient_failures(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                raise httpx.ConnectError("refused")
+            if len(calls) == 2:
+                return httpx.Response(503, text="")
+            return httpx.Response(200, json={'count': {'relevant': 1, 'total': 2}})
+
+        async def run():
+            search = FastAsyncSearchApi("test-token", retry_policy=RetryPolicy(backoff_base=0))
+            async with _mock(search, handler):
+                return await search.story_count("x", START_DATE, END_DATE, collection_ids=[1])
+        self.assertEqual(asyncio.run(run()), {'relevant': 1, 'total': 2})
+        self.assertEqual(len(calls), 3)
+
+    def test_error_response(self):
+        def handler(request):
+            return httpx.Response(400, json={'note': 'bad query'})
+
+        async def run():
+            async with _mock(FastAsyncSearchApi("test-token"), handler) as search:
+                await search.story_count("(", START_DATE, END_DATE, collection_ids=[1])
+        with self.assertRaises(APIResponseError) as ctx:
+            asyncio.run(run())
+        self.assertEqual(ctx.exception.response.status_code, 400)
+        self.assertIn('bad query', str(ctx.exception))
+
+
+class AsyncDirectoryApiTest(unittest.TestCase):
+
+    def test_source_list_drops_unset_params(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json={'count': 0, 'next': None, 'previous': None, 'results': []})
+
+        async def run():
+            async with _mock(AsyncDirectoryApi("test-token"), handler) as directory:
+                return await directory.source_list(collection_id=5, limit=10)
+        page = asyncio.run(run())
+        self.assertEqual(page['results'], [])
+        self.assertEqual(dict(seen[0].url.params), {'limit': '10', 'offset': '0', 'collection_id': '5'})
+
+    def test_transport_shares_the_limiter(self):
+        transport = Transport()
+        directory = AsyncDirectoryApi("test-token", transport=transport)
+        self.assertIs(directory._limiter, transport.search("test-token")._rate_limiter)
+
+
+class AsyncDirectoryManagementApiTest(unittest.TestCase):
+
+    def test_collection_update_patches_json(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json={'id': 7, 'name': 'new'})
+
+        async def run():
+            async with _mock(AsyncDirectoryManagementApi("test-token"), handler) as mgmt:
+                return await mgmt.collection_update(collection_id=7, name='new')
+        asyncio.run(run())
+        self.assertEqual(seen[0].method, 'PATCH')
+        self.assertEqual(json.loads(seen[0].content), {'name': 'new'})
+
+    def test_collection_create_rejects_unknown_kwargs(self):
+        async def run():
+            async with AsyncDirectoryManagementApi("test-token") as mgmt:
+                await mgmt.collection_create(name="x", bogus_field=1)
+        with self.assertRaises(ValueError):
+            asyncio.run(run())
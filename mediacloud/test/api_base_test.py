@@ -1,4 +1,6 @@
 import os
+import subprocess
+import sys
 from unittest import TestCase
 
 import mediacloud.api
@@ -34,3 +36,27 @@ class BaseApiTest(TestCase):
         client = mediacloud.api.DirectoryApi(mc_api_key)
         _ = client.user_profile()
         assert True
+
+
+class LazyImportTest(TestCase):
+
+    def _modules_after(self, code):
+        # a fresh interpreter, since this one has imported everything already
+        out = subprocess.run([sys.executable, "-c", code + "\nimport sys; print(' '.join(sys.modules))"],
+                             capture_output=True, text=True, check=True).stdout
+        return set(out.split())
+
+    def test_import_is_light(self):
+        modules = self._modules_after("import mediacloud.api")
+        for heavy in ('requests', 'requests_ratelimiter', 'asyncio'):
+            self.assertNotIn(heavy, modules)
+
+    def test_session_built_on_first_use(self):
+        modules = self._modules_after("import mediacloud.api\n"
+                                      "search = mediacloud.api.SearchApi('test-token')\n"
+                                      "directory = mediacloud.api.DirectoryApi('test-token')")
+        self.assertNotIn('requests', modules)
+        search = mediacloud.api.SearchApi('test-token')
+        self.assertIsInstance(search._session, mediacloud.api.LimiterSession)
+        self.assertIs(search._session, search._session)
+        self.assertEqual(search._session.headers['Authorization'], 'Token test-token')
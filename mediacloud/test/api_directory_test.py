@@ -3,8 +3,10 @@ import os
 import time
 from typing import Dict, List
 from unittest import TestCase
+from unittest.mock import patch
 
 import mediacloud.api
+from mediacloud.cache import DirectoryCache
 
 TEST_COLLECTION_ID = 34412234  # US -National sources
 TEST_SOURCE_ID = 1095  # cnn.com
@@ -12,6 +14,50 @@ TEST_FEED_ID = 1
 mediacloud.api.BaseApi.BASE_API_URL = os.getenv("MC_API_BASE_URL", "https://search.mediacloud.org/api/")
 
 
+class DirectoryCacheUnitTest(TestCase):
+    """Pure unit tests (no network)."""
+
+    def setUp(self):
+        self._directory = mediacloud.api.DirectoryApi("test-token")
+
+    def test_source_lookup_is_memoized(self):
+        with patch.object(self._directory, "_query", autospec=True) as mock_query:
+            mock_query.return_value = {'id': TEST_SOURCE_ID, 'name': 'cnn.com'}
+            first = self._directory.source(TEST_SOURCE_ID)
+            first['name'] = 'changed by caller'
+            second = self._directory.source(TEST_SOURCE_ID)
+        mock_query.assert_called_once()
+        assert second['name'] == 'cnn.com'
+
+    def test_list_pages_fill_cache(self):
+        page = {'count': 1, 'next': None, 'previous': None, 'results': [{'id': TEST_COLLECTION_ID, 'name': 'US'}]}
+        with patch.object(self._directory, "_query", autospec=True) as mock_query:
+            mock_query.return_value = page
+            self._directory.collection_list(name='US')
+            collection = self._directory.collection(TEST_COLLECTION_ID)
+        mock_query.assert_called_once()
+        assert collection['name'] == 'US'
+
+    def test_cache_can_be_disabled(self):
+        class UncachedDirectoryApi(mediacloud.api.DirectoryApi):
+            DIRECTORY_CACHE_SIZE = 0
+        directory = UncachedDirectoryApi("test-token")
+        with patch.object(directory, "_query", autospec=True) as mock_query:
+            mock_query.return_value = {'id': TEST_SOURCE_ID}
+            directory.source(TEST_SOURCE_ID)
+            directory.source(TEST_SOURCE_ID)
+        assert mock_query.call_count == 2
+
+    def test_shared_cache(self):
+        shared = DirectoryCache()
+        a = mediacloud.api.DirectoryApi("test-token", directory_cache=shared)
+        b = mediacloud.api.DirectoryApi("test-token", directory_cache=shared)
+        with patch.object(a, "_query", autospec=True) as mock_query:
+            mock_query.return_value = {'id': TEST_SOURCE_ID}
+            a.source(TEST_SOURCE_ID)
+        assert b._directory_cache.get_source(TEST_SOURCE_ID) == {'id': TEST_SOURCE_ID}
+
+
 class DirectoryTest(TestCase):
 
     def setUp(self):
@@ -33,6 +33,54 @@ class DirectoryManagementApiUnitTest(unittest.TestCase):
             "DELETE",
         )
 
+    def test_source_update_invalidates_cached_source(self):
+        self._api._directory_cache.add_sources([{'id': 42, 'name': 'old'}])
+        with patch.object(self._api, "_query", autospec=True) as mock_query:
+            mock_query.return_value = {'id': 42, 'name': 'new'}
+            self._api.source_update(source_id=42, name='new')
+        self.assertIsNone(self._api._directory_cache.get_source(42))
+
+    def test_failed_delete_still_invalidates(self):
+        self._api._directory_cache.add_collections([{'id': 99}])
+        with patch.object(self._api, "_query", autospec=True) as mock_query:
+            mock_query.side_effect = RuntimeError("network down")
+            with self.assertRaises(RuntimeError):
+                self._api.collection_delete(99)
+        self.assertIsNone(self._api._directory_cache.get_collection(99))
+
+    def test_collection_source_list_reads_every_page(self):
+        def fake_query(endpoint, params):
+            offset, limit = params['offset'], min(params['limit'], 100)
+            results = [{'id': i} for i in range(offset, min(offset + limit, 250))]
+            return {'count': 250, 'results': results, 'next': 'more' if offset + limit < 250 else None}
+        with patch.object(self._api, "_query", side_effect=fake_query) as mock_query:
+            sources = self._api.collection_source_list(collection_id=7)
+        self.assertEqual([s['id'] for s in sources], list(range(250)))
+        self.assertEqual(mock_query.call_count, 3)
+        self.assertEqual(mock_query.call_args.args[1]['collection_id'], 7)
+
+    def test_collection_reconcile(self):
+        calls = []
+
+        def fake_query(endpoint, params, method='GET'):
+            if method == 'GET':
+                return {'count': 3, 'results': [{'id': 1}, {'id': 2}, {'id': 3}], 'next': None}
+            calls.append((method, endpoint, params))
+            if method == 'POST' and params['source_id'] == 5:
+                raise RuntimeError("server said no")
+            return {}
+        with patch.object(self._api, "_query", side_effect=fake_query):
+            preview = self._api.collection_reconcile(collection_id=9, source_ids=[2, 3, 4, 5], dry_run=True)
+            self.assertEqual(calls, [])
+            report = self._api.collection_reconcile(collection_id=9, source_ids=[2, 3, 4, 5])
+        self.assertEqual((preview['added'], preview['removed']), ([4, 5], [1]))
+        self.assertEqual(report['unchanged'], [2, 3])
+        self.assertEqual(report['added'], [4])
+        self.assertEqual(report['removed'], [1])
+        self.assertEqual([(f['source_id'], f['action']) for f in report['failed']], [(5, 'add')])
+        self.assertIsInstance(report['failed'][0]['error'], RuntimeError)
+        self.assertIn(('DELETE', 'sources/sources-collections/1/?collection_id=9', None), calls)
+
     def test_collection_create_requires_name(self):
         with self.assertRaises(ValueError):
             self._api.collection_create(notes="only notes")
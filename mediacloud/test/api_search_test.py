@@ -7,6 +7,8 @@ from unittest.mock import patch
 import pytest
 
 import mediacloud.api
+import mediacloud.error
+from mediacloud.test.util import fake_response
 
 COLLECTION_US_NATIONAL = 34412234
 AU_BROADCAST_COMPANY = 20775
@@ -484,3 +486,49 @@ class SearchErrorHandlingTest(TestCase):
                     end_date=self.END_DATE,
                     interval="bad",
                 )
+
+
+class SearchBatchTest(TestCase):
+
+    def setUp(self):
+        self._search = mediacloud.api.SearchApi("test-token")
+
+    def test_story_count_many(self):
+        seen = []
+
+        def fake_query(endpoint, params):
+            seen.append(params['q'])
+            if params['q'] == 'broken':
+                raise mediacloud.error.APIResponseError(fake_response(400), params, {'note': 'bad query'})
+            return {'count': {'relevant': len(params['q']), 'total': 100}}
+        specs = [
+            ('biden', dt.date(2024, 1, 1), dt.date(2024, 1, 30), [2, 1]),
+            {'query': 'broken', 'start_date': dt.date(2024, 1, 1), 'end_date': dt.date(2024, 1, 30),
+             'collection_ids': [1]},
+            ('biden', dt.date(2024, 1, 1), dt.date(2024, 1, 30), [1, 2]),  # same as the first
+            ('trump', dt.date(2024, 1, 1), dt.date(2024, 1, 30), [1, 2]),
+        ]
+        with patch.object(self._search, "_query", side_effect=fake_query):
+            results = self._search.story_count_many(specs, max_workers=3)
+        self.assertEqual(sorted(seen), ['biden', 'broken', 'trump'])
+        self.assertEqual([r['spec']['query'] for r in results], ['biden', 'broken', 'biden', 'trump'])
+        self.assertEqual(results[0]['result'], {'relevant': 5, 'total': 100})
+        self.assertIsNone(results[0]['error'])
+        self.assertIsNone(results[1]['result'])
+        self.assertIsInstance(results[1]['error'], mediacloud.error.APIResponseError)
+        self.assertIs(results[2]['result'], results[0]['result'])
+        self.assertEqual(results[3]['result']['relevant'], 5)
+
+    def test_story_count_over_time_many(self):
+        counts = {'count_over_time': {'counts': [{'date': '2024-01-01 00:00:00', 'count': 3, 'total_count': 9,
+                                                  'ratio': 0.33}]}}
+        with patch.object(self._search, "_query", side_effect=lambda endpoint, params: counts):
+            results = self._search.story_count_over_time_many(
+                [('biden', dt.date(2024, 1, 1), dt.date(2024, 1, 1), [1])])
+        self.assertEqual(results[0]['result'][0]['date'], dt.date(2024, 1, 1))
+
+    def test_bad_spec(self):
+        with self.assertRaises(ValueError):
+            self._search.story_count_many([('biden', dt.date(2024, 1, 1))])
+        with self.assertRaises(ValueError):
+            self._search.story_count_many([{'q': 'biden'}])
@@ -0,0 +1,113 @@
+"""
+Offline tests for the compact StoryBatch representation.
+"""
+import datetime as dt
+import json
+import unittest
+from unittest.mock import patch
+
+import mediacloud.api
+from mediacloud.batch import NO_DAY, StoryBatch, StringTable
+from mediacloud.test.util import fake_response
+
+RAW_STORIES = [
+    {'id': 'a', 'title': 'One', 'url': 'https://cnn.com/1', 'language': 'en', 'media_name': 'cnn.com',
+     'media_url': 'cnn.com', 'publish_date': '2023-11-02 00:00:00', 'indexed_date': '2023-11-02T10:11:12.5'},
+    {'id': 'b', 'title': 'Two', 'url': 'https://cnn.com/2', 'language': 'en', 'media_name': 'cnn.com',
+     'media_url': 'cnn.com', 'publish_date': None, 'indexed_date': None, 'text': 'body', 'score': 3},
+]
+
+
+class StoryBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self._batch = StoryBatch()
+        self._batch.extend(RAW_STORIES)
+
+    def test_views_look_like_stories(self):
+        first, second = self._batch
+        self.assertEqual(first['title'], 'One')
+        self.assertEqual(first['publish_date'], dt.date(2023, 11, 2))
+        self.assertEqual(first['indexed_date'], dt.datetime(2023, 11, 2, 10, 11, 12, 500000))
+        self.assertEqual(first.get('text'), None)
+        self.assertIsNone(second['publish_date'])
+        self.assertEqual(second['text'], 'body')
+        self.assertEqual(second['score'], 3)
+        self.assertNotIn('score', first)
+        with self.assertRaises(KeyError):
+            first['score']
+        self.assertEqual(dict(second)['media_name'], 'cnn.com')
+
+    def test_columns(self):
+        self.assertEqual(list(self._batch.publish_days), [19663, NO_DAY])
+        self.assertEqual(self._batch.codes['media_name'][0], self._batch.codes['media_name'][1])
+        self.assertEqual(self._batch.column('id'), ['a', 'b'])
+        self.assertEqual(len(self._batch[0:1]), 1)
+        self.assertEqual(self._batch[-1]['id'], 'b')
+
+    def test_shared_string_table(self):
+        strings = StringTable()
+        a, b = StoryBatch(strings), StoryBatch(strings)
+        a.append(RAW_STORIES[0])
+        b.append(dict(RAW_STORIES[0], media_name='bbc.co.uk'))
+        b.append(RAW_STORIES[0])
+        self.assertEqual(a.codes['media_name'][0], b.codes['media_name'][1])
+        self.assertEqual(strings.values, [None, "en", "cnn.com", "bbc.co.uk"])
+
+    def test_intern(self):
+        strings = StringTable()
+        first = strings.intern(''.join(['cnn', '.com']))
+        self.assertIs(strings.intern(''.join(['cnn', '.com'])), first)
+        self.assertIsNone(strings.intern(None))
+
+    def test_accepts_date_objects(self):
+        batch = StoryBatch()
+        batch.append({'id': 'c', 'publish_date': dt.date(2024, 1, 1),
+                      'indexed_date': dt.datetime(2024, 1, 1, 5, tzinfo=dt.timezone(dt.timedelta(hours=2)))})
+        self.assertEqual(batch[0]['publish_date'], dt.date(2024, 1, 1))
+        self.assertEqual(batch[0]['indexed_date'], dt.datetime(2024, 1, 1, 3))
+
+    def test_accepts_epoch_dates(self):
+        batch = StoryBatch()
+        batch.append({'id': 'd', 'publish_date': 1698883200, 'indexed_date': 1698919872.5})
+        self.assertEqual(batch[0]['publish_date'], dt.date(2023, 11, 2))
+        self.assertEqual(batch[0]['indexed_date'], dt.datetime(2023, 11, 2, 10, 11, 12, 500000))
+
+    def test_rows_keep_their_own_keys(self):
+        first, second = self._batch
+        self.assertNotIn('text', first)
+        self.assertNotIn('text', dict(first))
+        self.assertIn('text', second)
+        self.assertEqual(set(dict(second)) - set(dict(first)), {'text', 'score'})
+        with self.assertRaises(KeyError):
+            first['text']
+        self.assertEqual(self._batch.column('text'), [None, 'body'])
+        self.assertEqual(self._batch.column('score'), [None, 3])
+
+
+class StoryListBatchTest(unittest.TestCase):
+
+    def test_story_list_batch(self):
+        search = mediacloud.api.SearchApi("test-token")
+        body = json.dumps({'stories': RAW_STORIES, 'pagination_token': 'next'}).encode('utf-8')
+        with patch.object(search._session, 'get', return_value=fake_response(200, body=body, stream=True)):
+            batch, token = search.story_list_batch("weather", dt.date(2023, 11, 1), dt.date(2023, 11, 3),
+                                                   collection_ids=[1])
+        self.assertEqual(token, 'next')
+        self.assertEqual(len(batch), 2)
+        self.assertIs(batch.strings, search._batch_strings)
+        self.assertEqual(batch[0]['publish_date'], dt.date(2023, 11, 2))
+
+    def test_interned_story_strings(self):
+        search = mediacloud.api.SearchApi("test-token")
+        search.INTERN_STRINGS = True
+
+        def page(endpoint, params):
+            return json.loads(json.dumps({'stories': RAW_STORIES, 'pagination_token': None}))
+        with patch.object(search, "_query", side_effect=page):
+            first, _ = search.story_list("weather", dt.date(2023, 11, 1), dt.date(2023, 11, 3), [1])
+            second, _ = search.story_list("weather", dt.date(2023, 11, 1), dt.date(2023, 11, 3), [1])
+        self.assertIs(first[0]['media_name'], second[1]['media_name'])
+        self.assertIs(first[0]['media_name'], first[0]['media_url'])
+        self.assertIs(second[0]['language'], search._batch_strings.intern('en'))
+        self.assertEqual(first[0]['publish_date'], dt.date(2023, 11, 2))
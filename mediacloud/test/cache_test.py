@@ -0,0 +1,180 @@
+"""
+Offline tests for the on-disk response cache and daily count store.
+"""
+import datetime as dt
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import mediacloud.api
+from mediacloud.cache import (CountStore, ResponseCache, TTLCache, cache_key,
+                              canonical_params)
+from mediacloud.error import APIResponseError
+from mediacloud.test.util import fake_response
+
+OLD_PARAMS = dict(q="weather", start="2023-11-01", end="2023-12-01", platform="onlinenews-mediacloud")
+
+
+class CanonicalParamsTest(unittest.TestCase):
+
+    def test_id_lists_are_sorted(self):
+        a = canonical_params(dict(q="x", cs=("34412234,12",), ss="5,1"))
+        b = canonical_params(dict(q="x", cs="12,34412234", ss=["1", "5"]))
+        self.assertEqual(a, b)
+        self.assertEqual(a['cs'], ['12', '34412234'])
+
+    def test_dates_normalized(self):
+        self.assertEqual(canonical_params(dict(start=dt.date(2023, 11, 1)))['start'], "2023-11-01")
+        self.assertEqual(canonical_params(dict(end="2023-11-01T00:00:00"))['end'], "2023-11-01")
+
+    def test_key_depends_on_endpoint(self):
+        self.assertNotEqual(cache_key('search/total-count', OLD_PARAMS), cache_key('search/words', OLD_PARAMS))
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def test_roundtrip_and_stats(self):
+        cache = ResponseCache()
+        self.assertIsNone(cache.get('search/total-count', OLD_PARAMS))
+        cache.set('search/total-count', OLD_PARAMS, {'count': {'relevant': 1, 'total': 2}})
+        self.assertEqual(cache.get('search/total-count', OLD_PARAMS), {'count': {'relevant': 1, 'total': 2}})
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+    def test_ttl_depends_on_end_date(self):
+        cache = ResponseCache(historical_ttl=None, recent_ttl=60)
+        self.assertIsNone(cache.ttl_for(OLD_PARAMS))
+        self.assertEqual(cache.ttl_for(dict(OLD_PARAMS, end=dt.date.today().isoformat())), 60)
+
+    def test_expired_entries_miss(self):
+        cache = ResponseCache(recent_ttl=10)
+        params = dict(OLD_PARAMS, end=dt.date.today().isoformat())
+        cache.set('search/words', params, {'words': []})
+        with patch('mediacloud.cache.time.time', return_value=dt.datetime.now().timestamp() + 11):
+            self.assertIsNone(cache.get('search/words', params))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        for q in ["a", "b"]:
+            cache.set('search/words', dict(OLD_PARAMS, q=q), {'words': [q]})
+        cache.get('search/words', dict(OLD_PARAMS, q="a"))  # "b" is now least recently used
+        cache.set('search/words', dict(OLD_PARAMS, q="c"), {'words': ["c"]})
+        self.assertIsNotNone(cache.get('search/words', dict(OLD_PARAMS, q="a")))
+        self.assertIsNone(cache.get('search/words', dict(OLD_PARAMS, q="b")))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_persists_to_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            cache = ResponseCache(path)
+            cache.set('search/words', OLD_PARAMS, {'words': []})
+            cache.close()
+            self.assertEqual(ResponseCache(path).get('search/words', OLD_PARAMS), {'words': []})
+
+
+class CachedSearchApiTest(unittest.TestCase):
+
+    def test_repeated_count_over_time_hits_cache(self):
+        search = mediacloud.api.SearchApi("test-token", cache=ResponseCache())
+        payload = {'count_over_time': {'counts': [{'date': '2023-11-01 00:00:00', 'count': 3, 'total_count': 9,
+                                                   'ratio': 0.3}]}}
+        with patch.object(search._session, 'get', return_value=fake_response(200, payload)) as mock_get:
+            for collection_ids in ([2, 1], [1, 2]):
+                counts = search.story_count_over_time("weather", dt.date(2023, 11, 1), dt.date(2023, 11, 1),
+                                                      collection_ids=collection_ids)
+                self.assertEqual(counts[0]['date'], dt.date(2023, 11, 1))
+        self.assertEqual(mock_get.call_count, 1)
+
+    def test_story_list_not_cached(self):
+        search = mediacloud.api.SearchApi("test-token", cache=ResponseCache())
+        payload = {'stories': [], 'pagination_token': None}
+        with patch.object(search._session, 'get', return_value=fake_response(200, payload)) as mock_get:
+            for _ in range(2):
+                search.story_list("weather", dt.date(2023, 11, 1), dt.date(2023, 11, 1), collection_ids=[1])
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_errors_not_cached(self):
+        cache = ResponseCache()
+        search = mediacloud.api.SearchApi("test-token", cache=cache)
+        with patch.object(search._session, 'get', return_value=fake_response(400, {'note': 'bad'})):
+            with self.assertRaises(APIResponseError):
+                search.words("(", dt.date(2023, 11, 1), dt.date(2023, 11, 1), collection_ids=[1])
+        self.assertEqual(cache.stats()['entries'], 0)
+
+
+def _daily_counts(endpoint, params):
+    # fake count-over-time response with a point for every day but Sundays
+    day, end = dt.date.fromisoformat(params['start']), dt.date.fromisoformat(params['end'])
+    counts = []
+    while day <= end:
+        if day.weekday() != 6:
+            counts.append({'date': f"{day.isoformat()} 00:00:00", 'count': day.day, 'total_count': 100,
+                           'ratio': day.day / 100})
+        day += dt.timedelta(days=1)
+    return {'count_over_time': {'counts': counts}}
+
+
+class CountStoreTest(unittest.TestCase):
+
+    def test_stale_ranges(self):
+        store = CountStore()
+        series = store.series_key(OLD_PARAMS)
+        self.assertEqual(store.stale_ranges(series, dt.date(2023, 11, 1), dt.date(2023, 11, 30)),
+                         [(dt.date(2023, 11, 1), dt.date(2023, 11, 30))])
+        store.put(series, dt.date(2023, 11, 5), dt.date(2023, 11, 10),
+                  [{'date': dt.date(2023, 11, 6), 'count': 1, 'total_count': 2, 'ratio': 0.5}])
+        self.assertEqual(store.stale_ranges(series, dt.date(2023, 11, 1), dt.date(2023, 11, 30)),
+                         [(dt.date(2023, 11, 1), dt.date(2023, 11, 4)), (dt.date(2023, 11, 11), dt.date(2023, 11, 30))])
+        # days without a point are remembered, but not returned
+        self.assertEqual(store.get(series, dt.date(2023, 11, 1), dt.date(2023, 11, 30)),
+                         [{'date': dt.date(2023, 11, 6), 'count': 1, 'total_count': 2, 'ratio': 0.5}])
+        self.assertEqual(store.series_key(dict(OLD_PARAMS, start="2020-01-01")), series)
+
+    def test_volatile_days_refetched_once_old(self):
+        store = CountStore(volatile_days=2, volatile_ttl=60)
+        series = store.series_key(OLD_PARAMS)
+        today = dt.date.today()
+        start = today - dt.timedelta(days=5)
+        store.put(series, start, today, [])
+        self.assertEqual(store.stale_ranges(series, start, today), [])
+        with patch('mediacloud.cache.time.time', return_value=time.time() + 120):
+            self.assertEqual(store.stale_ranges(series, start, today), [(today - dt.timedelta(days=2), today)])
+
+
+class IncrementalCountOverTimeTest(unittest.TestCase):
+
+    def test_fetches_only_new_days(self):
+        store = CountStore()
+        search = mediacloud.api.SearchApi("test-token", count_store=store)
+        plain = mediacloud.api.SearchApi("test-token")
+        with patch.object(search, '_query', side_effect=_daily_counts) as mock_query, \
+                patch.object(plain, '_query', side_effect=_daily_counts):
+            first = search.story_count_over_time("weather", dt.date(2023, 1, 1), dt.date(2023, 10, 31),
+                                                 collection_ids=[1])
+            second = search.story_count_over_time("weather", dt.date(2023, 1, 1), dt.date(2023, 11, 2),
+                                                  collection_ids=[1])
+            expected = plain.story_count_over_time("weather", dt.date(2023, 1, 1), dt.date(2023, 11, 2),
+                                                   collection_ids=[1])
+        self.assertEqual(mock_query.call_count, 2)
+        self.assertEqual(mock_query.call_args.args[1]['start'], '2023-11-01')
+        self.assertEqual(mock_query.call_args.args[1]['end'], '2023-11-02')
+        self.assertEqual(second, expected)
+        self.assertEqual(second[:len(first)], first)
+        self.assertEqual(store.stats()['fetched_days'], 306)
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def test_lru_and_expiry(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set(1, 'a')
+        cache.set(2, 'b')
+        cache.get(1)
+        cache.set(3, 'c')
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), 'a')
+        with patch('mediacloud.cache.time.monotonic', return_value=dt.datetime.now().timestamp() + 1e9):
+            self.assertIsNone(cache.get(1))
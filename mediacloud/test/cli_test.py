@@ -0,0 +1,155 @@
+"""
+Offline tests for the `python -m mediacloud export` command.
+"""
+import bz2
+import csv
+import datetime as dt
+import gzip
+import io
+import json
+import lzma
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pytest
+
+from mediacloud.cli import StoryWriter, _guess_formats, main
+
+STORIES = [
+    {'id': 'a', 'title': 'One, with a comma', 'url': 'u1', 'language': 'en', 'media_name': 'cnn.com',
+     'media_url': 'cnn.com', 'publish_date': dt.date(2023, 11, 2), 'indexed_date': dt.datetime(2023, 11, 2, 10)},
+    {'id': 'b', 'title': 'Twö', 'url': 'u2', 'language': 'en', 'media_name': 'cnn.com', 'media_url': 'cnn.com',
+     'publish_date': None, 'indexed_date': None},
+]
+
+ARGS = ['export', 'weather', '--start', '2023-11-01', '--end', '2023-11-30', '-c', '34412234', '--token', 'x']
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+
+    def _run(self, *extra):
+        stderr = io.StringIO()
+        with patch('mediacloud.api.SearchApi.iter_stories', return_value=iter(STORIES)) as mock_iter, \
+                patch('sys.stderr', stderr):
+            self.assertEqual(main(ARGS + list(extra)), 0)
+        return mock_iter, stderr.getvalue()
+
+    def test_guess_formats(self):
+        self.assertEqual(_guess_formats('x.csv.gz'), ('csv', 'gzip'))
+        self.assertEqual(_guess_formats('x.jsonl'), ('jsonl', None))
+        self.assertEqual(_guess_formats('x.xz'), (None, 'xz'))
+
+    def test_jsonl(self):
+        path = os.path.join(self._tmp.name, 'out.jsonl')
+        mock_iter, stderr = self._run('-o', path, '--page-size', '500')
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(rows[0]['publish_date'], '2023-11-02')
+        self.assertEqual(rows[1]['title'], 'Twö')
+        self.assertEqual(mock_iter.call_args.args[:3], ('weather', dt.date(2023, 11, 1), dt.date(2023, 11, 30)))
+        self.assertEqual(mock_iter.call_args.kwargs['collection_ids'], [34412234])
+        self.assertEqual(mock_iter.call_args.kwargs['page_size'], 500)
+        self.assertIn('2 stories', stderr)
+        self.assertIn('stories/s', stderr)
+
+    def test_compressed_csv(self):
+        path = os.path.join(self._tmp.name, 'out.csv.gz')
+        self._run('-o', path)
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows[0]['title'], 'One, with a comma')
+        self.assertEqual(rows[0]['indexed_date'], '2023-11-02 10:00:00')
+        self.assertEqual(rows[1]['publish_date'], '')
+
+    def test_parquet(self):
+        pq = pytest.importorskip("pyarrow.parquet")
+        path = os.path.join(self._tmp.name, 'out.parquet')
+        self._run('-o', path)
+        table = pq.read_table(path)
+        self.assertEqual(table.column('id').to_pylist(), ['a', 'b'])
+        self.assertEqual(table.column('media_name').to_pylist(), ['cnn.com', 'cnn.com'])
+
+    def test_sharded(self):
+        path = os.path.join(self._tmp.name, 'out.jsonl')
+        with patch('mediacloud.api.SearchApi.iter_stories_sharded', return_value=iter(STORIES)) as mock_iter:
+            main(ARGS + ['-o', path, '--shards', '4', '--workers', '2', '--progress-secs', '0'])
+        self.assertEqual(mock_iter.call_args.kwargs['shards'], 4)
+        self.assertEqual(mock_iter.call_args.kwargs['max_workers'], 2)
+
+    def test_checkpoint_resume_appends(self):
+        path = os.path.join(self._tmp.name, 'out.csv.gz')
+        checkpoint = os.path.join(self._tmp.name, 'crawl.json')
+        pages = {None: (STORIES[:1], 't1'), 't1': (STORIES[1:], None)}
+        calls = []
+
+        def story_list(*args, pagination_token=None, **kwargs):
+            calls.append(pagination_token)
+            if pagination_token == 't1' and len(calls) == 2:
+                raise RuntimeError("connection lost")
+            return pages[pagination_token]
+        with patch('mediacloud.api.SearchApi.story_list', side_effect=story_list), patch('sys.stderr', io.StringIO()):
+            with self.assertRaises(RuntimeError):
+                main(ARGS + ['-o', path, '--checkpoint', checkpoint])
+            main(ARGS + ['-o', path, '--checkpoint', checkpoint])
+        self.assertEqual(calls, [None, 't1', 't1'])
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([r['id'] for r in rows], ['a', 'b'])
+
+    def _resume_after_failure(self, path, torn_tail=b'', delete_output=False):
+        # the first run dies while writing the middle story of the second page
+        checkpoint = path + '.checkpoint.json'
+        third = dict(STORIES[1], id='c')
+        pages = {None: (STORIES[:1], 't1'), 't1': ([STORIES[1], third], None)}
+        write = StoryWriter.write
+        failing = [True]
+
+        def write_or_die(writer, story):
+            if failing[0] and story['id'] == 'c':
+                raise KeyboardInterrupt
+            write(writer, story)
+        with patch('mediacloud.api.SearchApi.story_list', side_effect=lambda *a, pagination_token=None, **k:
+                   pages[pagination_token]), \
+                patch('mediacloud.cli.StoryWriter.write', write_or_die), patch('sys.stderr', io.StringIO()):
+            with self.assertRaises(KeyboardInterrupt):
+                main(ARGS + ['-o', path, '--checkpoint', checkpoint])
+            with open(path, 'ab') as f:
+                f.write(torn_tail)
+            failing[0] = False
+            if delete_output:
+                os.remove(path)
+                with self.assertRaises(SystemExit):
+                    main(ARGS + ['-o', path, '--checkpoint', checkpoint])
+            else:
+                main(ARGS + ['-o', path, '--checkpoint', checkpoint])
+
+    def test_checkpoint_resume_mid_page(self):
+        path = os.path.join(self._tmp.name, 'out.jsonl')
+        self._resume_after_failure(path)
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual([json.loads(line)['id'] for line in f], ['a', 'b', 'c'])
+
+    def test_checkpoint_resume_compressed_mid_page(self):
+        for suffix, module in (('.csv.gz', gzip), ('.csv.bz2', bz2), ('.csv.xz', lzma)):
+            with self.subTest(suffix):
+                path = os.path.join(self._tmp.name, 'out' + suffix)
+                # a hard kill can leave a partly written compressed stream behind
+                self._resume_after_failure(path, torn_tail=module.compress(b'x' * 100)[:-12])
+                with module.open(path, 'rt', encoding='utf-8', newline='') as f:
+                    self.assertEqual([r['id'] for r in csv.DictReader(f)], ['a', 'b', 'c'])
+
+    def test_checkpoint_refuses_missing_output(self):
+        path = os.path.join(self._tmp.name, 'out.jsonl')
+        self._resume_after_failure(path, delete_output=True)
+        self.assertFalse(os.path.exists(path))
+
+    def test_requires_token(self):
+        with patch.dict(os.environ, {}, clear=True):
+            with self.assertRaises(SystemExit):
+                main(ARGS[:-2])
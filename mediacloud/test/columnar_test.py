@@ -0,0 +1,79 @@
+"""
+Offline tests for Arrow / NumPy / Parquet conversion.
+"""
+import datetime as dt
+import os
+import tempfile
+import unittest
+
+import pytest
+
+from mediacloud.batch import StoryBatch, StringTable
+from mediacloud.columnar import (counts_to_arrow, counts_to_numpy,
+                                 source_interval_to_arrow, stories_to_arrow,
+                                 story_columns_numpy, write_parquet)
+
+pa = pytest.importorskip("pyarrow")
+np = pytest.importorskip("numpy")
+
+STORIES = [
+    {'id': 'a', 'title': 'One', 'url': 'u1', 'language': 'en', 'media_name': 'cnn.com', 'media_url': 'cnn.com',
+     'publish_date': '2023-11-02 00:00:00', 'indexed_date': '2023-11-02T10:11:12'},
+    {'id': 'b', 'title': 'Two', 'url': 'u2', 'language': None, 'media_name': 'bbc.co.uk', 'media_url': 'bbc.co.uk',
+     'publish_date': None, 'indexed_date': None},
+]
+
+
+class StoriesToArrowTest(unittest.TestCase):
+
+    def test_record_batch(self):
+        rb = stories_to_arrow(STORIES)
+        self.assertEqual(rb.num_rows, 2)
+        rows = rb.to_pylist()
+        self.assertEqual(rows[0]['media_name'], 'cnn.com')
+        self.assertEqual(rows[0]['publish_date'], dt.date(2023, 11, 2))
+        self.assertEqual(rows[0]['indexed_date'], dt.datetime(2023, 11, 2, 10, 11, 12))
+        self.assertIsNone(rows[1]['language'])
+        self.assertIsNone(rows[1]['publish_date'])
+        self.assertIsNone(rows[1]['text'])
+
+    def test_numpy_columns_share_batch_memory(self):
+        batch = StoryBatch()
+        batch.extend(STORIES)
+        cols = story_columns_numpy(batch)
+        self.assertEqual(str(cols['publish_date'][0]), '2023-11-02')
+        self.assertTrue(np.isnat(cols['publish_date'][1]))
+        self.assertEqual(batch.strings[cols['media_name'][1]], 'bbc.co.uk')
+
+    def test_parquet_roundtrip_across_batches(self):
+        pq = pytest.importorskip("pyarrow.parquet")
+        strings = StringTable()
+        first, second = StoryBatch(strings), StoryBatch(strings)
+        first.append(STORIES[0])
+        second.append(dict(STORIES[1], text='full text'))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "stories.parquet")
+            self.assertEqual(write_parquet([first, second], path), 2)
+            table = pq.read_table(path)
+        self.assertEqual(table.column('id').to_pylist(), ['a', 'b'])
+        self.assertEqual(table.column('text').to_pylist(), [None, 'full text'])
+
+
+class CountsTest(unittest.TestCase):
+
+    POINTS = [{'date': dt.date(2023, 11, 1), 'count': 3, 'total_count': 10, 'ratio': 0.3},
+              {'date': dt.date(2023, 11, 2), 'count': 0, 'total_count': 8, 'ratio': 0.0}]
+
+    def test_numpy(self):
+        arr = counts_to_numpy(self.POINTS)
+        self.assertEqual(arr['count'].sum(), 3)
+        self.assertEqual(str(arr['date'][1]), '2023-11-02')
+
+    def test_arrow(self):
+        rb = counts_to_arrow(self.POINTS)
+        self.assertEqual(rb.column(0).to_pylist(), [dt.date(2023, 11, 1), dt.date(2023, 11, 2)])
+
+    def test_source_interval(self):
+        rb = source_interval_to_arrow([{'media_name': 'cnn.com', 'interval': 'week', 'bucket': '2023-11-01',
+                                        'matching_stories': 2, 'total_stories': 4, 'ratio': 0.5}])
+        self.assertEqual(rb.to_pylist()[0]['media_name'], 'cnn.com')
@@ -0,0 +1,69 @@
+"""
+Offline tests for date conversion of search results.
+"""
+import copy
+import datetime as dt
+import unittest
+from unittest.mock import patch
+
+import mediacloud.api
+from mediacloud import dates
+
+RAW_STORIES = [
+    {'id': 'a', 'publish_date': '2023-11-02 00:00:00', 'indexed_date': '2023-11-02T10:11:12.5'},
+    {'id': 'b', 'publish_date': '2023-11-02 00:00:00', 'indexed_date': '2023-11-03T00:00:00+02:00'},
+    {'id': 'c', 'publish_date': None, 'indexed_date': None},
+]
+
+
+class ConvertStoryDatesTest(unittest.TestCase):
+
+    def _converted(self, mode):
+        stories = copy.deepcopy(RAW_STORIES)
+        dates.convert_story_dates(stories, mode)
+        return stories
+
+    def test_objects(self):
+        a, b, c = self._converted(dates.OBJECTS)
+        self.assertEqual(a['publish_date'], dt.date(2023, 11, 2))
+        self.assertEqual(a['indexed_date'], dt.datetime(2023, 11, 2, 10, 11, 12, 500000))
+        # repeated publish dates come from the cache, so they are one shared object
+        self.assertIs(a['publish_date'], b['publish_date'])
+        self.assertIsNone(c['publish_date'])
+        self.assertIsNone(c['indexed_date'])
+
+    def test_raw(self):
+        self.assertEqual(self._converted(dates.RAW), RAW_STORIES)
+
+    def test_epoch(self):
+        a, b, c = self._converted(dates.EPOCH)
+        self.assertEqual(a['publish_date'], 1698883200)
+        self.assertIsInstance(a['publish_date'], int)
+        self.assertEqual(a['indexed_date'], 1698919872.5)
+        self.assertEqual(b['indexed_date'], dt.datetime(2023, 11, 2, 22, tzinfo=dt.timezone.utc).timestamp())
+        self.assertIsNone(c['publish_date'])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            dates.convert_story_dates(copy.deepcopy(RAW_STORIES), 'strings')
+
+    def test_story_day(self):
+        for mode in dates.DATE_MODES:
+            a, _, c = self._converted(mode)
+            self.assertEqual(dates.story_day(a['publish_date']), dt.date(2023, 11, 2))
+            self.assertIsNone(dates.story_day(c['publish_date']))
+        self.assertIsNone(dates.story_day(''))
+
+    def test_cache_is_bounded(self):
+        self.assertEqual(dates.parse_date.cache_info().maxsize, dates.DATE_CACHE_SIZE)
+
+
+class SearchDateModeTest(unittest.TestCase):
+
+    def test_story_list_follows_date_mode(self):
+        search = mediacloud.api.SearchApi("test-token")
+        search.DATE_MODE = dates.RAW
+        page = {'stories': copy.deepcopy(RAW_STORIES), 'pagination_token': None}
+        with patch.object(search, "_query", return_value=page):
+            stories, _ = search.story_list("q", dt.date(2023, 11, 1), dt.date(2023, 11, 3), [1])
+        self.assertEqual(stories[0]['publish_date'], '2023-11-02 00:00:00')
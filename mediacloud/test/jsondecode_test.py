@@ -0,0 +1,93 @@
+"""
+Offline tests for the pluggable JSON decoders.
+"""
+import json
+import unittest
+from unittest.mock import patch
+
+import mediacloud.api
+import mediacloud.error
+from mediacloud.jsondecode import (BACKENDS, DEFAULT_BACKENDS, decode,
+                                   get_decoder)
+from mediacloud.test.util import fake_response
+
+BODY = json.dumps({'stories': [{'id': 'a', 'title': 'Café', 'score': 1.5, 'big': 2 ** 40}],
+                   'pagination_token': None}).encode('utf-8')
+
+
+class GetDecoderTest(unittest.TestCase):
+
+    def test_backends_agree(self):
+        for name in BACKENDS:
+            try:
+                loads = get_decoder(name)
+            except ImportError:
+                continue
+            with self.subTest(backend=name):
+                self.assertEqual(loads(BODY), json.loads(BODY))
+                with self.assertRaises(ValueError):
+                    loads(b'{"stories": [')
+
+    def _installed(self, names):
+        decoders = []
+        for name in names:
+            try:
+                decoders.append(get_decoder(name))
+            except ImportError:
+                continue
+        return decoders
+
+    def test_default_is_fastest_installed(self):
+        self.assertIs(get_decoder(), self._installed(DEFAULT_BACKENDS)[0])
+
+    def test_falls_back_to_json(self):
+        body = b'{"score": NaN, "big": %d}' % 2 ** 70
+        for loads in self._installed(BACKENDS):
+            with self.subTest(loads=loads):
+                j = decode(body, loads)
+                self.assertNotEqual(j['score'], j['score'])
+        for loads in self._installed(DEFAULT_BACKENDS):
+            with self.subTest(loads=loads):
+                self.assertEqual(decode(b'[%d]' % 2 ** 70, loads), [2 ** 70])
+        with self.assertRaises(ValueError):
+            decode(b'{"stories": [', get_decoder())
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_decoder('simplejson')
+
+    def test_missing_backend(self):
+        with patch.dict('sys.modules', {'orjson': None}):
+            get_decoder.cache_clear()
+            try:
+                with self.assertRaises(ImportError):
+                    get_decoder('orjson')
+            finally:
+                get_decoder.cache_clear()
+
+
+class ClientDecoderTest(unittest.TestCase):
+
+    def test_custom_decoder(self):
+        calls = []
+
+        def loads(body):
+            calls.append(body)
+            return json.loads(body)
+        search = mediacloud.api.SearchApi("test-token", json_decoder=loads)
+        with patch.object(search._session, 'get', return_value=fake_response(200, body=BODY, stream=True)):
+            results = search._query('search/story-list', {'q': 'weather'})
+        self.assertEqual(calls, [BODY])
+        self.assertEqual(results['stories'][0]['title'], 'Café')
+
+    def test_nan_is_not_an_api_error(self):
+        search = mediacloud.api.SearchApi("test-token")
+        body = b'{"stories": [], "score": Infinity}'
+        with patch.object(search._session, 'get', return_value=fake_response(200, body=body, stream=True)):
+            self.assertEqual(search._query('search/story-list', {'q': 'weather'})['score'], float('inf'))
+
+    def test_bad_json_is_an_api_error(self):
+        search = mediacloud.api.SearchApi("test-token")
+        with patch.object(search._session, 'get', return_value=fake_response(200, body=b'<html>', stream=True)):
+            with self.assertRaises(mediacloud.error.APIResponseError):
+                search._query('search/story-list', {'q': 'weather'})
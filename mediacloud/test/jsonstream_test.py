@@ -0,0 +1,110 @@
+"""
+Offline tests for incremental parsing of streamed responses.
+"""
+import datetime as dt
+import json
+import unittest
+from unittest.mock import patch
+
+import mediacloud.api
+from mediacloud.error import APIResponseError
+from mediacloud.jsonstream import StreamedArray
+from mediacloud.test.util import fake_response
+
+PAGE = {
+    'stories': [
+        {'id': 'a1', 'title': 'Café ☃ crème', 'publish_date': '2023-11-02 00:00:00',
+         'indexed_date': '2023-11-02T10:11:12', 'text': 'x' * 5000},
+        {'id': 'b2', 'title': 'second', 'publish_date': None, 'indexed_date': None, 'score': 12345},
+    ],
+    'pagination_token': 'abc==',
+    'count': 9876543210,
+}
+
+
+def _chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class StreamedArrayTest(unittest.TestCase):
+
+    def test_any_chunking_gives_same_result(self):
+        body = json.dumps(PAGE, ensure_ascii=False).encode('utf-8')
+        for size in (1, 2, 3, 7, 64, 100000):
+            items = StreamedArray(_chunked(body, size), 'stories')
+            self.assertEqual(list(items), PAGE['stories'])
+            self.assertEqual(items.meta, {'pagination_token': 'abc==', 'count': 9876543210})
+
+    def test_meta_before_array_and_whitespace(self):
+        body = b' {\n "next" : null , "results" : [ 1 , 22 ,333 ] , "count":3 }\n'
+        items = StreamedArray(_chunked(body, 2), 'results')
+        self.assertEqual(list(items), [1, 22, 333])
+        self.assertEqual(items.meta, {'next': None, 'count': 3})
+
+    def test_empty_array_and_object(self):
+        self.assertEqual(list(StreamedArray([b'{"stories": []}'], 'stories')), [])
+        self.assertEqual(list(StreamedArray([b'{}'], 'stories')), [])
+
+    def test_malformed(self):
+        for body in (b'{"stories": [1, 2', b'[1, 2]', b'{"stories": [1] } x'):
+            with self.assertRaises(ValueError):
+                list(StreamedArray(_chunked(body, 3), 'stories'))
+
+
+class StoryListStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self._search = mediacloud.api.SearchApi("test-token")
+
+    def test_story_list_stream(self):
+        body = json.dumps(PAGE).encode('utf-8')
+        with patch.object(self._search._session, 'get', return_value=fake_response(200, body=body, stream=True)):
+            page = self._search.story_list_stream("weather", dt.date(2023, 11, 1), dt.date(2023, 11, 3),
+                                                  collection_ids=[1])
+            stories = list(page)
+        self.assertEqual([s['id'] for s in stories], ['a1', 'b2'])
+        self.assertEqual(stories[0]['publish_date'], dt.date(2023, 11, 2))
+        self.assertEqual(page.pagination_token, 'abc==')
+
+    def test_iter_stories_stream_follows_tokens(self):
+        pages = [dict(stories=[{'id': str(i), 'publish_date': None, 'indexed_date': None}],
+                      pagination_token=(str(i + 1) if i < 2 else None)) for i in range(3)]
+        responses = [fake_response(200, body=json.dumps(p).encode('utf-8'), stream=True) for p in pages]
+        with patch.object(self._search._session, 'get', side_effect=responses) as mock_get:
+            ids = [s['id'] for s in self._search.iter_stories("weather", dt.date(2023, 11, 1), dt.date(2023, 11, 3),
+                                                              collection_ids=[1], stream=True)]
+        self.assertEqual(ids, ['0', '1', '2'])
+        self.assertEqual(mock_get.call_args.kwargs['params']['pagination_token'], '2')
+
+    def test_close_before_iterating_releases_response(self):
+        seen = []
+        search = mediacloud.api.SearchApi("test-token", instruments=[seen.append])
+        response = fake_response(200, body=json.dumps(PAGE).encode('utf-8'), stream=True)
+        with patch.object(search._session, 'get', return_value=response):
+            page = search.story_list_stream("weather", dt.date(2023, 11, 1), dt.date(2023, 11, 3),
+                                            collection_ids=[1])
+            page.close()
+            page.close()
+        self.assertTrue(response.raw.closed)
+        self.assertEqual([m['endpoint'] for m in seen], ['search/story-list'])
+
+    def test_dropped_before_iterating_releases_response(self):
+        seen = []
+        directory = mediacloud.api.DirectoryApi("test-token", instruments=[seen.append])
+        response = fake_response(200, body=b'{"count": 0, "results": []}', stream=True)
+        with patch.object(directory._session, 'get', return_value=response):
+            directory.source_list_stream(collection_id=1)
+        self.assertTrue(response.raw.closed)
+        self.assertEqual([m['endpoint'] for m in seen], ['sources/sources/'])
+
+    def test_stream_error_raises_before_iterating(self):
+        with patch.object(self._search._session, 'get',
+                          return_value=fake_response(400, {'note': 'bad query'}, stream=True)):
+            with self.assertRaises(APIResponseError):
+                self._search.story_list_stream("(", dt.date(2023, 11, 1), dt.date(2023, 11, 3), collection_ids=[1])
+
+    def test_bad_json_note_decoded_once(self):
+        with patch.object(self._search._session, 'get', return_value=fake_response(200, body=b'<html>oops</html>')):
+            with self.assertRaises(APIResponseError) as ctx:
+                self._search.story_count("x", dt.date(2023, 11, 1), dt.date(2023, 11, 3), collection_ids=[1])
+        self.assertIn('bad JSON: <html>oops</html>', str(ctx.exception))
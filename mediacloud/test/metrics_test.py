@@ -0,0 +1,134 @@
+"""
+Offline tests for per-request instrumentation and the Prometheus-style Metrics instrument.
+"""
+import datetime as dt
+import gzip
+import io
+import json
+import unittest
+from unittest.mock import patch
+
+import urllib3
+
+import mediacloud.api
+from mediacloud.cache import ResponseCache
+from mediacloud.error import APIResponseError
+from mediacloud.metrics import Metrics, endpoint_label
+from mediacloud.test.util import fake_response
+
+START_DATE = dt.date(2023, 11, 1)
+COUNT = {'count': {'relevant': 3, 'total': 9}}
+
+
+class InstrumentedApiTest(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.metrics = Metrics()
+        self.search = mediacloud.api.SearchApi("test-token", instruments=[self.events.append, self.metrics])
+
+    def _count(self):
+        return self.search.story_count("weather", START_DATE, START_DATE, collection_ids=[1])
+
+    def test_reports_each_call(self):
+        with patch.object(self.search._session, 'get', return_value=fake_response(200, COUNT)):
+            self._count()
+        m = self.events[0]
+        self.assertEqual((m['method'], m['endpoint'], m['status'], m['attempts']), ('GET', 'search/total-count', 200, 1))
+        self.assertEqual(m['response_bytes'], len(json.dumps(COUNT)))
+        self.assertFalse(m['cached'])
+        self.assertIsNone(m['error'])
+        for phase in ('limiter_wait', 'retry_wait', 'server', 'download', 'decode', 'total'):
+            self.assertGreaterEqual(m[f'{phase}_secs'], 0)
+
+    def test_retries_and_errors(self):
+        responses = [fake_response(503, {}), fake_response(400, {'note': 'bad'})]
+        with patch.object(self.search._session, 'get', side_effect=responses), \
+                patch('mediacloud.api.time.sleep'):
+            with self.assertRaises(APIResponseError):
+                self._count()
+        m = self.events[0]
+        self.assertEqual((m['status'], m['attempts'], m['error']), (400, 2, 'APIResponseError'))
+        self.assertGreaterEqual(m['retry_wait_secs'], 0)
+
+    def test_cache_hits(self):
+        search = mediacloud.api.SearchApi("test-token", cache=ResponseCache(), instruments=[self.events.append])
+        with patch.object(search._session, 'get', return_value=fake_response(200, COUNT)):
+            for _ in range(2):
+                search.story_count("weather", START_DATE, START_DATE, collection_ids=[1])
+        self.assertEqual([m['cached'] for m in self.events], [False, True])
+        self.assertEqual(self.events[1]['attempts'], 0)
+
+    def test_streamed(self):
+        body = json.dumps({'stories': [{'id': 'a', 'publish_date': None, 'indexed_date': None}],
+                           'pagination_token': None}).encode('utf-8')
+        with patch.object(self.search._session, 'get', return_value=fake_response(200, body=body, stream=True)):
+            page = self.search.story_list_stream("weather", START_DATE, START_DATE, collection_ids=[1])
+            self.assertEqual(self.events, [])  # reported once the body has been read
+            list(page)
+        self.assertEqual(self.events[0]['response_bytes'], len(body))
+        self.assertIsNone(self.events[0]['decode_secs'])
+
+    def test_compressed_transfer(self):
+        body = json.dumps({'stories': [{'id': str(i), 'title': 'weather ' * 20, 'publish_date': None,
+                                        'indexed_date': None} for i in range(50)],
+                           'pagination_token': None}).encode('utf-8')
+        compressed = gzip.compress(body)
+
+        def gzipped_response(*args, **kwargs):
+            r = fake_response(200, stream=True)
+            r.headers['Content-Encoding'] = 'gzip'
+            r.raw = urllib3.HTTPResponse(io.BytesIO(compressed), headers={'Content-Encoding': 'gzip'},
+                                         preload_content=False)
+            return r
+        with patch.object(self.search._session, 'get', side_effect=gzipped_response):
+            stories, _ = self.search.story_list("weather", START_DATE, START_DATE, collection_ids=[1])
+            list(self.search.story_list_stream("weather", START_DATE, START_DATE, collection_ids=[1]))
+        self.assertEqual(len(stories), 50)
+        for m in self.events:
+            self.assertEqual((m['response_bytes'], m['wire_bytes'], m['content_encoding']),
+                             (len(body), len(compressed), 'gzip'))
+        totals = self.metrics.transfer()['search/story-list']
+        self.assertEqual((totals['wire_bytes'], totals['decoded_bytes']), (2 * len(compressed), 2 * len(body)))
+        self.assertLess(totals['ratio'], 0.5)
+        self.assertIn('mediacloud_wire_bytes_total{method="GET",endpoint="search/story-list",encoding="gzip"} '
+                      f'{2 * len(compressed)}', self.metrics.render())
+
+    def test_accept_encoding(self):
+        self.assertIn('gzip', self.search._session.headers['Accept-Encoding'])
+
+        class Uncompressed(mediacloud.api.SearchApi):
+            ACCEPT_ENCODING = 'identity'
+        self.assertEqual(Uncompressed("test-token")._session.headers['Accept-Encoding'], 'identity')
+
+    def test_broken_instrument_is_ignored(self):
+        def broken(m):
+            raise ValueError("oops")
+        search = mediacloud.api.SearchApi("test-token", instruments=[broken, self.events.append])
+        with patch.object(search._session, 'get', return_value=fake_response(200, COUNT)), \
+                self.assertLogs('mediacloud.api', level='ERROR'):
+            self.assertEqual(search.story_count("weather", START_DATE, START_DATE, collection_ids=[1])['relevant'], 3)
+        self.assertEqual(len(self.events), 1)
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_endpoint_label(self):
+        self.assertEqual(endpoint_label('sources/sources/123/'), 'sources/sources/{id}/')
+        self.assertEqual(endpoint_label('sources/sources-collections/4/?collection_id=9'),
+                         'sources/sources-collections/{id}/')
+
+    def test_render(self):
+        metrics = Metrics()
+        for status, total in ((200, 0.2), (200, 3.0), (429, 0.01)):
+            metrics(dict(method='GET', endpoint='search/total-count', status=status, attempts=1, cached=False,
+                         limiter_wait_secs=0.0, retry_wait_secs=0.0, server_secs=total, download_secs=None,
+                         decode_secs=0.001, total_secs=total, response_bytes=500, error=None))
+        text = metrics.render()
+        self.assertIn('mediacloud_requests_total{method="GET",endpoint="search/total-count",status="200"} 2', text)
+        self.assertIn('mediacloud_request_seconds_bucket{method="GET",endpoint="search/total-count",'
+                      'phase="total",le="0.25"} 2', text)
+        self.assertIn('mediacloud_request_seconds_count{method="GET",endpoint="search/total-count",'
+                      'phase="total"} 3', text)
+        self.assertNotIn('phase="download"', text)
+        self.assertIn('# TYPE mediacloud_response_bytes histogram', text)
@@ -0,0 +1,95 @@
+"""
+Offline tests for the local directory mirror, against an in-memory fake DirectoryApi.
+"""
+import unittest
+
+from mediacloud.api import DirectoryApi
+from mediacloud.mirror import DirectoryMirror, homepage_key
+
+SOURCES = [{'id': i, 'name': f"source{i}.com", 'homepage': f"https://www.source{i}.com/", 'platform': 'online_news'}
+           for i in range(1, 8)]
+COLLECTIONS = [{'id': 100, 'name': "US National", 'platform': 'online_news'},
+               {'id': 200, 'name': "Test", 'platform': 'online_news'}]
+MEMBERS = {100: [1, 2, 3], 200: [3, 4]}
+
+
+def _page(items, limit, offset):
+    results = items[offset:offset + limit]
+    return {'count': len(items), 'results': results,
+            'next': 'more' if offset + limit < len(items) else None, 'previous': None}
+
+
+class FakeDirectory(DirectoryApi):
+
+    def __init__(self):
+        super().__init__("test-token")
+        self.feeds = [{'id': 10, 'source_id': 1, 'url': 'https://source1.com/rss'}]
+        self.collections = list(COLLECTIONS)
+        self.feed_calls = []
+
+    def source_list(self, platform=None, name=None, collection_id=None, limit=0, offset=0):
+        items = SOURCES if collection_id is None else [s for s in SOURCES if s['id'] in MEMBERS[collection_id]]
+        return _page(items, limit, offset)
+
+    def collection_list(self, platform=None, name=None, limit=0, offset=0, source_id=None):
+        return _page(self.collections, limit, offset)
+
+    def feed_list(self, source_id=None, modified_since=None, modified_before=None, limit=0, offset=0):
+        self.feed_calls.append(modified_since)
+        return _page(self.feeds if modified_since is None else self.feeds[1:], limit, offset)
+
+
+class SmallPageMirror(DirectoryMirror):
+    PAGE_SIZE = 3
+
+
+class DirectoryMirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = FakeDirectory()
+        self.mirror = SmallPageMirror(self.directory)
+        self.addCleanup(self.mirror.close)
+
+    def test_homepage_key(self):
+        self.assertEqual(homepage_key("HTTPS://www.Example.com/"), "example.com")
+        self.assertEqual(homepage_key("example.com/news"), "example.com/news")
+
+    def test_sync_and_lookups(self):
+        written = self.mirror.sync(collection_ids=[100])
+        self.assertEqual(written, dict(sources=7, collections=2, feeds=1, memberships=3))
+        self.assertEqual(self.mirror.source(4)['name'], "source4.com")
+        self.assertIsNone(self.mirror.source(99))
+        self.assertEqual([s['id'] for s in self.mirror.sources_by_name("SOURCE2.com")], [2])
+        self.assertEqual(self.mirror.source_by_homepage("http://source5.com")['id'], 5)
+        self.assertEqual(self.mirror.collection(200)['name'], "Test")
+        self.assertEqual([c['id'] for c in self.mirror.collections_by_name("us national")], [100])
+        self.assertEqual(self.mirror.collection_source_ids(100), [1, 2, 3])
+        self.assertEqual(self.mirror.collection_source_ids(200), [])  # not synced
+        self.assertEqual(self.mirror.source_collection_ids(3), [100])
+        self.assertEqual(self.mirror.feeds_for_source(1)[0]['url'], 'https://source1.com/rss')
+
+    def test_incremental_sync(self):
+        self.mirror.sync(collection_ids=[100])
+        self.directory.feeds.append({'id': 11, 'source_id': 2, 'url': 'https://source2.com/rss'})
+        written = self.mirror.sync(collection_ids=[200])
+        # sources and collections are fresh, so only feeds since the watermark and memberships are fetched
+        self.assertEqual(written, dict(sources=0, collections=0, feeds=1, memberships=5))
+        self.assertIsNone(self.directory.feed_calls[0])
+        self.assertIsNotNone(self.directory.feed_calls[-1])
+        self.assertEqual(len(self.mirror.feeds_for_source(1)), 1)
+        self.assertEqual(len(self.mirror.feeds_for_source(2)), 1)
+        self.assertEqual(self.mirror.source_collection_ids(3), [100, 200])
+        self.assertEqual(sorted(self.mirror.tracked_collection_ids()), [100, 200])
+        stats = self.mirror.stats()
+        self.assertEqual((stats['sources'], stats['feeds'], stats['collection_sources']), (7, 2, 5))
+
+    def test_full_sync_drops_deleted_collections(self):
+        self.mirror.sync(collection_ids=[100, 200])
+        self.directory.collections = COLLECTIONS[:1]
+        written = self.mirror.sync(full=True)
+        self.assertEqual((written['collections'], written['memberships']), (1, 3))
+        self.assertIsNone(self.mirror.collection(200))
+        self.assertEqual(self.mirror.collection_source_ids(200), [])
+        self.assertEqual(self.mirror.source_collection_ids(3), [100])
+        self.assertEqual(self.mirror.tracked_collection_ids(), [100])
+        self.assertEqual(self.mirror.stats()['collection_sources'], 3)
@@ -0,0 +1,267 @@
+"""
+Offline tests for the paging helpers and the iterators built on them.
+"""
+import asyncio
+import datetime as dt
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import mediacloud.api
+from mediacloud import dates
+from mediacloud.paging import (Checkpoint, date_shards, iter_offset_pages,
+                               iter_offset_pages_async, prefetch_pages,
+                               prefetch_pages_async)
+
+START_DATE = dt.date(2023, 11, 1)
+END_DATE = dt.date(2023, 12, 1)
+
+
+def _fake_pages(n_pages: int, per_page: int = 3):
+    # page fetcher over n_pages pages whose tokens are "1", "2", ...
+    calls = []
+
+    def fetch(token):
+        calls.append(token)
+        i = int(token or 0)
+        items = [f"{i}-{j}" for j in range(per_page)]
+        return items, (str(i + 1) if i + 1 < n_pages else None)
+    return fetch, calls
+
+
+class DateShardsTest(unittest.TestCase):
+
+    def test_covers_range_without_overlap(self):
+        ranges = date_shards(dt.date(2023, 1, 1), dt.date(2023, 1, 10), 3)
+        self.assertEqual(ranges, [(dt.date(2023, 1, 1), dt.date(2023, 1, 4)),
+                                  (dt.date(2023, 1, 5), dt.date(2023, 1, 7)),
+                                  (dt.date(2023, 1, 8), dt.date(2023, 1, 10))])
+
+    def test_never_more_shards_than_days(self):
+        self.assertEqual(date_shards(dt.date(2023, 1, 1), dt.date(2023, 1, 2), 8),
+                         [(dt.date(2023, 1, 1), dt.date(2023, 1, 1)), (dt.date(2023, 1, 2), dt.date(2023, 1, 2))])
+
+
+class PrefetchPagesTest(unittest.TestCase):
+
+    def test_yields_pages_in_order(self):
+        fetch, calls = _fake_pages(4)
+        pages = list(prefetch_pages(fetch))
+        self.assertEqual([p[0][0] for p in pages], ["0-0", "1-0", "2-0", "3-0"])
+        self.assertIsNone(pages[-1][1])
+        self.assertEqual(calls, [None, "1", "2", "3"])
+
+    def test_starts_from_token(self):
+        fetch, calls = _fake_pages(4)
+        pages = list(prefetch_pages(fetch, "2"))
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(calls[0], "2")
+
+    def test_depth_bounds_read_ahead(self):
+        fetch, calls = _fake_pages(100)
+        pages = prefetch_pages(fetch, depth=2)
+        next(pages)
+        time.sleep(0.2)
+        # one page handed out, two buffered, one blocked waiting for buffer space
+        self.assertLessEqual(len(calls), 4)
+        pages.close()
+
+    def test_error_raised_after_earlier_pages(self):
+        def fetch(token):
+            if token:
+                raise RuntimeError("boom")
+            return ["a"], "1"
+        pages = prefetch_pages(fetch)
+        self.assertEqual(next(pages), (["a"], "1"))
+        with self.assertRaises(RuntimeError):
+            next(pages)
+
+    def test_close_stops_worker(self):
+        fetch, calls = _fake_pages(1000)
+        pages = prefetch_pages(fetch, depth=1)
+        next(pages)
+        pages.close()
+        time.sleep(1.0)
+        fetched = len(calls)
+        time.sleep(0.6)
+        self.assertEqual(len(calls), fetched)
+        self.assertFalse(any(t.name == "mediacloud-prefetch" for t in threading.enumerate()))
+
+    def test_async(self):
+        async def run():
+            fetch, _ = _fake_pages(3)
+
+            async def afetch(token):
+                return fetch(token)
+            return [page async for page in prefetch_pages_async(afetch, depth=2)]
+        pages = asyncio.run(run())
+        self.assertEqual([p[1] for p in pages], ["1", "2", None])
+
+
+def _fake_offset_list(n_items: int, max_limit: int = 100):
+    # offset-paged fetcher over n_items numbers, capping limit like the server does
+    calls = []
+
+    def fetch(limit, offset):
+        calls.append((limit, offset))
+        limit = min(limit, max_limit)
+        return {'count': n_items, 'results': list(range(offset, min(offset + limit, n_items))),
+                'next': 'more' if offset + limit < n_items else None, 'previous': None}
+    return fetch, calls
+
+
+class OffsetPagesTest(unittest.TestCase):
+
+    def test_all_results_in_order(self):
+        fetch, calls = _fake_offset_list(1050)
+        results = [r for page in iter_offset_pages(fetch, page_size=1000, max_workers=3) for r in page]
+        self.assertEqual(results, list(range(1050)))
+        # the first request found out the server only gives 100 at a time, and the rest followed that
+        self.assertEqual(calls[0], (1000, 0))
+        self.assertEqual(sorted(calls[1:]), [(100, offset) for offset in range(100, 1050, 100)])
+
+    def test_single_page(self):
+        fetch, calls = _fake_offset_list(5)
+        self.assertEqual(list(iter_offset_pages(fetch, page_size=10)), [[0, 1, 2, 3, 4]])
+        self.assertEqual(len(calls), 1)
+
+    def test_list_growing_while_read(self):
+        items = {'n': 250}
+
+        def fetch(limit, offset):
+            count = items['n']
+            items['n'] = 320  # grows after the first request
+            limit = min(limit, 100)
+            return {'count': count, 'results': list(range(offset, min(offset + limit, items['n']))),
+                    'next': 'more' if offset + limit < items['n'] else None}
+        results = [r for page in iter_offset_pages(fetch, page_size=100, max_workers=2) for r in page]
+        self.assertEqual(results, list(range(320)))
+
+    def test_async(self):
+        fetch, _ = _fake_offset_list(450)
+
+        async def afetch(limit, offset):
+            return fetch(limit, offset)
+
+        async def run():
+            return [r async for page in iter_offset_pages_async(afetch, page_size=100, max_workers=2) for r in page]
+        self.assertEqual(asyncio.run(run()), list(range(450)))
+
+
+class IterStoriesTest(unittest.TestCase):
+
+    def test_iter_stories_follows_tokens(self):
+        search = mediacloud.api.SearchApi("test-token")
+        fetch, _ = _fake_pages(3, per_page=2)
+        with patch.object(search, "story_list", autospec=True) as mock_list:
+            mock_list.side_effect = lambda *args, pagination_token=None, **kwargs: fetch(pagination_token)
+            stories = list(search.iter_stories("weather", START_DATE, END_DATE, collection_ids=[1], page_size=2))
+        self.assertEqual(stories, ["0-0", "0-1", "1-0", "1-1", "2-0", "2-1"])
+        self.assertEqual(mock_list.call_count, 3)
+        self.assertEqual(mock_list.call_args.kwargs['page_size'], 2)
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "crawl.json")
+        self.search = mediacloud.api.SearchApi("test-token")
+        self.fetch, self.calls = _fake_pages(4, per_page=2)
+
+    def _iter(self, checkpoint, query="weather"):
+        return self.search.iter_stories(query, START_DATE, END_DATE, collection_ids=[1], checkpoint=checkpoint)
+
+    def test_resumes_after_last_finished_page(self):
+        with patch.object(self.search, "story_list", autospec=True) as mock_list:
+            mock_list.side_effect = lambda *args, pagination_token=None, **kwargs: self.fetch(pagination_token)
+            stories = self._iter(self.path)
+            first = [next(stories) for _ in range(5)]  # all of pages 0 and 1, and one story of page 2
+            stories.close()  # the crawl "dies" here
+            with open(self.path) as f:
+                state = json.load(f)
+            self.assertEqual(state['pagination_token'], "2")
+            self.assertEqual(state['emitted'], 4)
+            self.assertFalse(state['done'])
+
+            del self.calls[:]
+            rest = list(self._iter(self.path))
+        self.assertEqual(first[:4] + rest, ["0-0", "0-1", "1-0", "1-1", "2-0", "2-1", "3-0", "3-1"])
+        self.assertEqual(self.calls, ["2", "3"])
+        with open(self.path) as f:
+            state = json.load(f)
+        self.assertTrue(state['done'])
+        self.assertEqual(state['emitted'], 8)
+
+    def test_finished_crawl_yields_nothing(self):
+        with patch.object(self.search, "story_list", autospec=True) as mock_list:
+            mock_list.side_effect = lambda *args, pagination_token=None, **kwargs: self.fetch(pagination_token)
+            self.assertEqual(len(list(self._iter(self.path))), 8)
+            self.assertEqual(list(self._iter(self.path)), [])
+        self.assertEqual(len(self.calls), 4)
+
+    def test_other_query_is_rejected(self):
+        saved = []
+        with patch.object(self.search, "story_list", autospec=True) as mock_list:
+            mock_list.side_effect = lambda *args, pagination_token=None, **kwargs: self.fetch(pagination_token)
+            next(self._iter(Checkpoint(self.path, on_save=lambda: saved.append(1))))
+            list(self._iter(Checkpoint(self.path, on_save=lambda: saved.append(1))))
+            with self.assertRaises(ValueError):
+                next(self._iter(self.path, query="climate"))
+        self.assertEqual(len(saved), 4)
+
+
+class ShardedStoriesTest(unittest.TestCase):
+
+    def test_merges_in_shard_order_and_dedupes_boundaries(self):
+        search = mediacloud.api.SearchApi("test-token")
+
+        def story_list(query, start_date, end_date, *args, pagination_token=None, **kwargs):
+            # two pages per shard; the first story of each shard is also reported by the previous one
+            time.sleep(0.01 if start_date.day > 10 else 0.05)  # later shards finish first
+            if pagination_token is None:
+                return [{'id': f'{start_date}-a', 'publish_date': start_date},
+                        {'id': f'{start_date}-b', 'publish_date': start_date}], 'more'
+            next_start = end_date + dt.timedelta(days=1)
+            return [{'id': f'{next_start}-a', 'publish_date': next_start}], None
+
+        with patch.object(search, "story_list", side_effect=story_list):
+            stories = list(search.iter_stories_sharded("weather", dt.date(2023, 1, 1), dt.date(2023, 1, 30),
+                                                       collection_ids=[1], shards=3))
+        ids = [s['id'] for s in stories]
+        self.assertEqual(ids, ['2023-01-01-a', '2023-01-01-b', '2023-01-11-a', '2023-01-11-b',
+                               '2023-01-21-a', '2023-01-21-b', '2023-01-31-a'])
+
+    def test_dedupes_boundaries_in_every_date_mode(self):
+        for mode in dates.DATE_MODES:
+            with self.subTest(mode):
+                search = mediacloud.api.SearchApi("test-token")
+                search.DATE_MODE = mode
+
+                def story_list(query, start_date, end_date, *args, pagination_token=None, **kwargs):
+                    # both shards report the story published on the day the second one starts
+                    stories = [{'id': 'dup', 'publish_date': '2023-01-16 00:00:00', 'indexed_date': None}]
+                    dates.convert_story_dates(stories, mode)
+                    return stories, None
+
+                with patch.object(search, "story_list", side_effect=story_list):
+                    stories = list(search.iter_stories_sharded("weather", dt.date(2023, 1, 1),
+                                                               dt.date(2023, 1, 30), collection_ids=[1], shards=2))
+                self.assertEqual([s['id'] for s in stories], ['dup'])
+
+    def test_empty_publish_date(self):
+        search = mediacloud.api.SearchApi("test-token")
+        search.DATE_MODE = dates.RAW
+
+        def story_list(query, start_date, end_date, *args, pagination_token=None, **kwargs):
+            return [{'id': 'undated', 'publish_date': '', 'indexed_date': None}], None
+
+        with patch.object(search, "story_list", side_effect=story_list):
+            stories = list(search.iter_stories_sharded("weather", dt.date(2023, 1, 1), dt.date(2023, 1, 30),
+                                                       collection_ids=[1], shards=2))
+        self.assertEqual([s['id'] for s in stories], ['undated'])
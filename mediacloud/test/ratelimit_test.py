@@ -0,0 +1,116 @@
+import asyncio
+import datetime as dt
+import email.utils
+import unittest
+from unittest.mock import patch
+
+import mediacloud.api
+from mediacloud.error import APIResponseError
+from mediacloud.ratelimit import (AdaptiveRateLimiter, RateLimiter,
+                                  retry_after_secs)
+from mediacloud.retry import RetryPolicy
+from mediacloud.test.util import fake_response
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_burst_then_wait(self):
+        limiter = RateLimiter(per_minute=60, burst=2)
+        self.assertEqual(limiter.reserve(), 0)
+        self.assertEqual(limiter.reserve(), 0)
+        # bucket is empty, so the third caller waits about one token's worth (1s at 60/min)
+        self.assertAlmostEqual(limiter.reserve(), 1.0, delta=0.05)
+        # and the fourth queues up behind it
+        self.assertAlmostEqual(limiter.reserve(), 2.0, delta=0.05)
+
+    def test_acquire_sleeps_for_reservation(self):
+        limiter = RateLimiter(per_minute=60, burst=1)
+        limiter.reserve()
+        with patch('mediacloud.ratelimit.time.sleep') as mock_sleep:
+            waited = limiter.acquire()
+        self.assertGreater(waited, 0)
+        mock_sleep.assert_called_once_with(waited)
+
+    def test_acquire_async(self):
+        limiter = RateLimiter(per_minute=6000, burst=1)
+
+        async def run():
+            return [await limiter.acquire_async() for _ in range(3)]
+        waits = asyncio.run(run())
+        self.assertEqual(waits[0], 0)
+        self.assertGreater(waits[1], 0)
+
+    def test_rejects_bad_rate(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(per_minute=0)
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(retry_after_secs({'Retry-After': '12'}), 12)
+
+    def test_http_date(self):
+        when = dt.datetime.now(dt.timezone.utc) + dt.timedelta(seconds=30)
+        secs = retry_after_secs({'Retry-After': email.utils.format_datetime(when)})
+        self.assertAlmostEqual(secs, 30, delta=2)
+
+    def test_missing_or_garbage(self):
+        self.assertIsNone(retry_after_secs({}))
+        self.assertIsNone(retry_after_secs({'Retry-After': 'soon'}))
+
+
+class AdaptiveRateLimiterTest(unittest.TestCase):
+
+    def test_additive_increase_multiplicative_decrease(self):
+        limiter = AdaptiveRateLimiter(per_minute=10, increase=1, decrease_factor=0.5)
+        for _ in range(4):
+            limiter.update(200, {})
+        self.assertEqual(limiter.rate, 14)
+        limiter.update(429, {})
+        self.assertEqual(limiter.rate, 7)
+
+    def test_bounds(self):
+        limiter = AdaptiveRateLimiter(per_minute=2, min_per_minute=1, max_per_minute=3, increase=5)
+        limiter.update(200, {})
+        self.assertEqual(limiter.rate, 3)
+        for _ in range(5):
+            limiter.update(429, {})
+        self.assertEqual(limiter.rate, 1)
+
+    def test_server_quota_caps_rate(self):
+        limiter = AdaptiveRateLimiter(per_minute=2, increase=100)
+        limiter.update(200, {'X-RateLimit-Limit': '30'})
+        self.assertEqual(limiter.rate, 30)
+        limiter.update(200, {'RateLimit-Limit': '10', 'RateLimit-Policy': '10;w=1'})
+        self.assertEqual(limiter.server_limit, 600)
+        self.assertEqual(limiter.rate, 130)
+
+    def test_retry_after_pauses(self):
+        limiter = AdaptiveRateLimiter(per_minute=600, burst=5)
+        limiter.update(429, {'Retry-After': '20'})
+        self.assertAlmostEqual(limiter.reserve(), 20, delta=0.5)
+        # everyone after the first request is spaced out at the reduced rate
+        self.assertAlmostEqual(limiter.reserve(), 20 + 60 / 300, delta=0.5)
+
+    def test_exhausted_remaining_pauses_until_reset(self):
+        limiter = AdaptiveRateLimiter(per_minute=600, burst=5)
+        limiter.update(200, {'RateLimit-Remaining': '0', 'RateLimit-Reset': '7'})
+        self.assertAlmostEqual(limiter.reserve(), 7, delta=0.5)
+
+
+class BaseApiRateLimiterTest(unittest.TestCase):
+
+    def test_limiter_sees_every_response(self):
+        limiter = AdaptiveRateLimiter(per_minute=600, increase=1)
+        directory = mediacloud.api.DirectoryApi("test-token", rate_limiter=limiter,
+                                                retry_policy=RetryPolicy(max_retries=0))
+        self.assertNotIsInstance(directory._session, mediacloud.api.LimiterSession)
+        page = {'count': 0, 'next': None, 'previous': None, 'results': []}
+        with patch.object(directory._session, 'get', return_value=fake_response(200, page)):
+            directory.source_list()
+        self.assertEqual(limiter.rate, 601)
+        with patch.object(directory._session, 'get', return_value=fake_response(429, body=b'')):
+            with self.assertRaises(APIResponseError):
+                directory.source_list()
+        self.assertLess(limiter.rate, 601)
@@ -0,0 +1,93 @@
+"""
+Offline tests for the retry policy and its use in BaseApi._query.
+"""
+import unittest
+from typing import Any, Dict
+from unittest.mock import patch
+
+import requests
+
+import mediacloud.api
+from mediacloud.error import APIResponseError
+from mediacloud.mgmt import DirectoryManagementApi
+from mediacloud.retry import RetryBudget, RetryPolicy
+from mediacloud.test.util import fake_response
+
+PAGE: Dict[str, Any] = {'count': 0, 'next': None, 'previous': None, 'results': []}
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def test_full_jitter_is_bounded(self):
+        policy = RetryPolicy(backoff_base=1, backoff_max=10)
+        for attempt in range(8):
+            delay = policy.backoff(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(10, 2 ** attempt))
+
+    def test_retry_after_is_a_floor(self):
+        self.assertGreaterEqual(RetryPolicy(backoff_max=1).backoff(0, retry_after=30), 30)
+
+    def test_non_idempotent_methods(self):
+        policy = RetryPolicy()
+        self.assertFalse(policy.should_retry_status('POST', 502, 0))
+        self.assertTrue(policy.should_retry_status('POST', 429, 0))
+        self.assertFalse(policy.should_retry_exception('PATCH', requests.ReadTimeout(), 0))
+        self.assertTrue(RetryPolicy(retry_non_idempotent=True).should_retry_status('POST', 502, 0))
+
+    def test_per_call_limit(self):
+        policy = RetryPolicy(max_retries=2)
+        self.assertTrue(policy.should_retry_status('GET', 503, 1))
+        self.assertFalse(policy.should_retry_status('GET', 503, 2))
+        self.assertFalse(policy.should_retry_status('GET', 404, 0))
+
+    def test_budget(self):
+        budget = RetryBudget(ratio=0.5, minimum=1)
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+        self.assertEqual(budget.retries, 2)
+
+
+@patch('mediacloud.api.time.sleep')
+class BaseApiRetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = mediacloud.api.DirectoryApi("test-token")
+
+    def test_retries_then_succeeds(self, mock_sleep):
+        responses = [fake_response(502, body=b'<html>bad gateway</html>'),
+                     fake_response(429, body=b'', headers={'Retry-After': '3'}),
+                     fake_response(200, PAGE)]
+        with patch.object(self._directory._session, 'get', side_effect=responses) as mock_get:
+            self.assertEqual(self._directory.source_list(), PAGE)
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertGreaterEqual(mock_sleep.call_args_list[1].args[0], 3)
+
+    def test_retries_timeouts(self, mock_sleep):
+        with patch.object(self._directory._session, 'get',
+                          side_effect=[requests.ReadTimeout(), fake_response(200, PAGE)]):
+            self.assertEqual(self._directory.source_list(), PAGE)
+
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        directory = mediacloud.api.DirectoryApi("test-token", retry_policy=RetryPolicy(max_retries=2))
+        with patch.object(directory._session, 'get', return_value=fake_response(503, {'note': 'down'})) as mock_get:
+            with self.assertRaises(APIResponseError):
+                directory.source_list()
+        self.assertEqual(mock_get.call_count, 3)
+
+    def test_client_errors_not_retried(self, mock_sleep):
+        with patch.object(self._directory._session, 'get', return_value=fake_response(400, {'note': 'bad'})) as mock_get:
+            with self.assertRaises(APIResponseError):
+                self._directory.source_list()
+        mock_get.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    def test_mgmt_post_not_retried_by_default(self, mock_sleep):
+        mgmt = DirectoryManagementApi("test-token")
+        with patch.object(mgmt._session, 'post', return_value=fake_response(502, {'note': 'gateway'})) as mock_post:
+            with self.assertRaises(APIResponseError):
+                mgmt.collection_create(name="x")
+        mock_post.assert_called_once()
@@ -0,0 +1,112 @@
+"""
+Offline tests for the shared Transport (a local HTTP server stands in for the API).
+"""
+import datetime as dt
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import mediacloud.api
+from mediacloud.mgmt import DirectoryManagementApi
+from mediacloud.ratelimit import AdaptiveRateLimiter, RateLimiter
+from mediacloud.test.util import fake_response
+from mediacloud.transport import Transport
+
+START_DATE = dt.date(2023, 11, 1)
+COUNT = {'count': {'relevant': 3, 'total': 9}}
+
+
+class _CountHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.client_ports.append(self.client_address[1])
+        self.server.tokens.append(self.headers['Authorization'])
+        body = json.dumps(COUNT).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TransportTest(unittest.TestCase):
+
+    def test_one_limiter_per_token(self):
+        transport = Transport(rate_limit_per_minute=120)
+        search = transport.search("token-a")
+        directory = transport.directory("token-a")
+        management = transport.management("token-a")
+        other = mediacloud.api.SearchApi("token-b", transport=transport)
+        self.assertIsInstance(management, DirectoryManagementApi)
+        self.assertIs(search._rate_limiter, directory._rate_limiter)
+        self.assertIs(search._rate_limiter, management._rate_limiter)
+        self.assertIsNot(search._rate_limiter, other._rate_limiter)
+        self.assertEqual(search._rate_limiter.rate, 120)
+
+    def test_requests_share_the_quota(self):
+        transport = Transport()
+        search, directory = transport.search("token-a"), transport.directory("token-a")
+        page = {'count': 0, 'next': None, 'previous': None, 'results': []}
+        with patch.object(transport.limiter("token-a"), 'acquire') as acquire, \
+                patch.object(search._session, 'get', return_value=fake_response(200, COUNT)), \
+                patch.object(directory._session, 'get', return_value=fake_response(200, page)):
+            search.story_count("weather", START_DATE, START_DATE, collection_ids=[1])
+            directory.source_list()
+        self.assertEqual(acquire.call_count, 2)
+
+    def test_explicit_limiter_wins(self):
+        limiter = RateLimiter(per_minute=30)
+        search = Transport().search("token-a", rate_limiter=limiter)
+        self.assertIs(search._rate_limiter, limiter)
+
+    def test_limiter_factory(self):
+        transport = Transport(rate_limit_per_minute=10, limiter_factory=lambda rate: AdaptiveRateLimiter(rate))
+        self.assertIsInstance(transport.limiter("token-a"), AdaptiveRateLimiter)
+
+    def test_sessions_share_the_pool(self):
+        transport = Transport(pool_maxsize=3)
+        a, b = transport.search("token-a"), transport.directory("token-b")
+        url = mediacloud.api.BaseApi.BASE_API_URL
+        self.assertIs(a._session.get_adapter(url), b._session.get_adapter(url))
+        self.assertEqual(a._session.get_adapter(url)._pool_maxsize, 3)
+        self.assertEqual(a._session.headers['Authorization'], 'Token token-a')
+        self.assertEqual(b._session.headers['Authorization'], 'Token token-b')
+
+
+class TransportConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _CountHandler)
+        self.server.client_ports = []
+        self.server.tokens = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/api/"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count_twice_each(self, transport):
+        clients = [transport.search("token-a"), transport.search("token-b")]
+        for client in clients * 2:
+            client.BASE_API_URL = self.base_url
+            client.story_count("weather", START_DATE, START_DATE, collection_ids=[1])
+
+    def test_connection_reused_across_clients(self):
+        with Transport(rate_limit_per_minute=6000) as transport:
+            self._count_twice_each(transport)
+        self.assertEqual(len(self.server.client_ports), 4)
+        self.assertEqual(len(set(self.server.client_ports)), 1)
+        self.assertEqual(self.server.tokens, ['Token token-a', 'Token token-b'] * 2)
+
+    def test_no_keep_alive(self):
+        with Transport(keep_alive=False, rate_limit_per_minute=6000) as transport:
+            self._count_twice_each(transport)
+        self.assertEqual(len(set(self.server.client_ports)), 4)
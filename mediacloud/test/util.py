@@ -0,0 +1,30 @@
+"""
+Shared helpers for the offline unit tests.
+"""
+import io
+import json
+from typing import Any, Dict, Optional
+
+import requests
+
+
+def fake_response(status_code: int = 200, payload: Any = None, headers: Optional[Dict[str, str]] = None,
+                  body: Optional[bytes] = None, stream: bool = False) -> requests.Response:
+    """
+    Build a real requests.Response without touching the network. With stream=True the body
+    is left unread on `raw`, like a response fetched with stream=True.
+    """
+    r = requests.Response()
+    r.status_code = status_code
+    r.headers.update(headers or {})
+    if body is None:
+        body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+    if stream:
+        r.raw = io.BytesIO(body)
+        r._content = False  # type: ignore[assignment]  # requests' own 'not read yet' marker
+    else:
+        r._content = body
+        r._content_consumed = True  # type: ignore[attr-defined]
+    r.encoding = 'utf-8'
+    r.url = 'https://search.mediacloud.org/api/test'
+    return r
@@ -0,0 +1,98 @@
+"""
+One connection pool and one rate limiter per API key, shared by many client objects.
+
+Each client object normally sets up its own HTTP session and its own rate limiter, so two of
+them in one process hold two connection pools and together spend twice the per-key quota.
+Build clients from a Transport instead and they share both:
+
+    transport = Transport(pool_maxsize=16)
+    search = transport.search(MY_TOKEN)
+    directory = transport.directory(MY_TOKEN)   # same pool, same request budget as `search`
+
+Requests from every client built with the same key go through one RateLimiter, so quota
+accounting is right process-wide. Passing `transport=` to a client constructor does the same
+thing as the factory methods. The asyncio clients in mediacloud.aio accept it too; they keep
+their own httpx pool but share the per-key limiter.
+"""
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import requests
+import requests.adapters
+
+from mediacloud.api import BaseApi, DirectoryApi, SearchApi
+from mediacloud.mgmt import DirectoryManagementApi
+from mediacloud.ratelimit import RateLimiter
+
+
+class Transport:
+    """
+    Shared HTTP connection pool (a requests HTTPAdapter mounted on every client's session)
+    plus a registry of rate limiters keyed by API key. `pool_maxsize` defaults to POOL_MAXSIZE
+    and `rate_limit_per_minute` to RATE_LIMIT_PER_MINUTE; with `keep_alive=False` connections
+    are closed after each request. `limiter_factory` builds each key's limiter from the rate,
+    e.g. `AdaptiveRateLimiter` to follow the server's rate-limit headers. Thread-safe.
+    """
+
+    # Connections kept open per host. Size it to the most requests you run at once, e.g.
+    # DirectoryApi.LIST_MAX_WORKERS or SearchApi.BATCH_MAX_WORKERS; more than that just idle.
+    POOL_MAXSIZE = 16
+
+    # Hosts to keep a pool for, e.g. the API plus a staging server
+    POOL_CONNECTIONS = 4
+
+    # Default rate limit applied to each API key
+    RATE_LIMIT_PER_MINUTE = BaseApi.RATE_LIMIT_PER_MINUTE
+
+    def __init__(self, pool_maxsize: Optional[int] = None, keep_alive: bool = True,
+                 rate_limit_per_minute: Optional[float] = None,
+                 limiter_factory: Optional[Callable[[float], RateLimiter]] = None):
+        self.keep_alive = keep_alive
+        self.rate_limit_per_minute = rate_limit_per_minute or self.RATE_LIMIT_PER_MINUTE
+        self._limiter_factory = limiter_factory or (lambda per_minute: RateLimiter(per_minute=per_minute))
+        # retries are the clients' job (see mediacloud.retry), so the adapter makes one attempt
+        self._adapter = requests.adapters.HTTPAdapter(pool_connections=self.POOL_CONNECTIONS,
+                                                      pool_maxsize=pool_maxsize or self.POOL_MAXSIZE,
+                                                      max_retries=0)
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, auth_token: str) -> RateLimiter:
+        """
+        The rate limiter every client using this API key shares
+        """
+        with self._lock:
+            limiter = self._limiters.get(auth_token)
+            if limiter is None:
+                limiter = self._limiters[auth_token] = self._limiter_factory(self.rate_limit_per_minute)
+            return limiter
+
+    def mount(self, session: requests.Session) -> None:
+        """
+        Route a session's requests through the shared connection pool
+        """
+        session.mount('https://', self._adapter)
+        session.mount('http://', self._adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+
+    def search(self, auth_token: str, **kwargs: Any) -> SearchApi:
+        return SearchApi(auth_token, transport=self, **kwargs)
+
+    def directory(self, auth_token: str, **kwargs: Any) -> DirectoryApi:
+        return DirectoryApi(auth_token, transport=self, **kwargs)
+
+    def management(self, auth_token: str, **kwargs: Any) -> DirectoryManagementApi:
+        return DirectoryManagementApi(auth_token, transport=self, **kwargs)
+
+    def close(self) -> None:
+        """
+        Close the pooled connections; clients built from this transport can't be used after this
+        """
+        self._adapter.close()
+
+    def __enter__(self) -> "Transport":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -58,6 +58,21 @@ class SourceIntervalAttention(TypedDict, total=False):
     ratio: float
 
 
+class QuerySpec(TypedDict, total=False):
+    query: str
+    start_date: dt.date
+    end_date: dt.date
+    collection_ids: list[int]
+    source_ids: list[int]
+    platform: str | None
+
+
+class BatchResult(TypedDict, total=False):
+    spec: QuerySpec
+    result: Any
+    error: Exception | None
+
+
 class Collection(TypedDict, total=False):
     id: int
     name: str
@@ -89,6 +104,21 @@ class Feed(TypedDict, total=False):
     modified_at: str
 
 
+class ReconcileFailure(TypedDict):
+    source_id: int
+    action: str
+    error: Exception
+
+
+class ReconcileReport(TypedDict, total=False):
+    collection_id: int
+    dry_run: bool
+    unchanged: list[int]
+    added: list[int]
+    removed: list[int]
+    failed: list[ReconcileFailure]
+
+
 class OffsetPage(TypedDict, total=False):
     count: int
     next: str | None
@@ -96,6 +126,24 @@ class OffsetPage(TypedDict, total=False):
     results: JSONList
 
 
+class RequestMetrics(TypedDict, total=False):
+    method: str
+    endpoint: str
+    status: int | None              # None if no response arrived
+    attempts: int                   # HTTP requests made, including retries
+    cached: bool                    # answered from the ResponseCache without a request
+    limiter_wait_secs: float        # waiting for the rate limiter
+    retry_wait_secs: float          # sleeping between retries
+    server_secs: float              # from sending the request to having the response headers
+    download_secs: float | None     # reading the body (None when not measured separately)
+    decode_secs: float | None       # parsing the JSON (None when interleaved with reading it)
+    total_secs: float
+    response_bytes: int             # body size after decompression
+    wire_bytes: int | None          # body size as transferred (None if the transport can't tell)
+    content_encoding: str           # the response's Content-Encoding, 'identity' if none
+    error: str | None               # exception class name if the call failed
+
+
 class VersionInfo(TypedDict, total=False):
     GIT_REV: str
     now: float